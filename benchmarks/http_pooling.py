@@ -0,0 +1,72 @@
+"""
+Compares requests/sec for unpooled `requests.request` calls (one new connection
+per request) against a `BaseHttpClient`, which keeps connections alive in a
+pooled session.
+
+Runs against a local stand-in server, so no network access is needed:
+
+    python benchmarks/http_pooling.py --requests 500
+"""
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+# Add repo root path for imports
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from dpytools.http.base import BaseHttpClient  # noqa: E402
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that the server honours keep-alive
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid delayed-ack stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _requests_per_second(send, url: str, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        send(url)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    try:
+        unpooled = _requests_per_second(
+            lambda u: requests.request("GET", u), url, args.requests
+        )
+        with BaseHttpClient() as client:
+            pooled = _requests_per_second(client.get, url, args.requests)
+    finally:
+        server.shutdown()
+
+    print(f"unpooled: {unpooled:8.1f} requests/sec")
+    print(f"pooled:   {pooled:8.1f} requests/sec ({pooled / unpooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
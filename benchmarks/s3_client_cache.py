@@ -0,0 +1,67 @@
+"""
+Compares reading many small JSON objects with `read_s3_file_content_as_dict` when
+a new S3 client is built for every call (the cache reset each time) against the
+cached, shared client.
+
+Runs against moto's in-memory S3, so no AWS access is needed:
+
+    python benchmarks/s3_client_cache.py --objects 1000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import boto3
+from moto import mock_aws
+
+# Add repo root path for imports
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from dpytools.s3.basic import (  # noqa: E402
+    read_s3_file_content_as_dict,
+    reset_s3_client_cache,
+)
+
+
+def _objects_per_second(read, names) -> float:
+    start = time.perf_counter()
+    for name in names:
+        read(name)
+    return len(names) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(
+            Bucket="benchmark",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+        )
+        names = []
+        for i in range(args.objects):
+            s3_client.put_object(
+                Bucket="benchmark", Key=f"{i}.json", Body=b'{"key": "value"}'
+            )
+            names.append(f"benchmark/{i}.json")
+
+        def read_uncached(name):
+            reset_s3_client_cache()
+            return read_s3_file_content_as_dict(name)
+
+        uncached = _objects_per_second(read_uncached, names)
+        reset_s3_client_cache()
+        cached = _objects_per_second(read_s3_file_content_as_dict, names)
+
+    print(f"new client per call: {uncached:8.1f} objects/sec")
+    print(f"cached client:       {cached:8.1f} objects/sec ({cached / uncached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures `UploadClient` throughput for different numbers of parallel chunk
+uploads against a local resumable.js stand-in server. The server adds a fixed
+delay to every chunk to stand in for the round-trip latency of a real upload.
+
+    python benchmarks/upload_throughput.py --size-mb 64 --latency-ms 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add repo root path for imports
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from dpytools.http.upload import UploadClient  # noqa: E402
+
+
+def _make_handler(latency: float):
+    class ResumableStandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            # Consume the chunk, wait out the simulated latency then acknowledge it
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return ResumableStandInHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=5242880)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), _make_handler(args.latency_ms / 1000)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/upload"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / "benchmark.csv"
+        csv_path.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+
+        try:
+            for max_workers in args.workers:
+                with UploadClient(url, pool_maxsize=max(max_workers, 10)) as client:
+                    result = client.upload_csv(
+                        csv_path,
+                        "benchmark-bucket",
+                        "benchmark-token",
+                        chunk_size=args.chunk_size,
+                        max_workers=max_workers,
+                    )
+                latencies = sorted(chunk.latency for chunk in result.chunks)
+                print(
+                    f"max_workers={max_workers:<3} {result.throughput / 1048576:8.1f} MB/s"
+                    f" ({result.elapsed:.2f}s, median chunk latency"
+                    f" {latencies[len(latencies) // 2] * 1000:.0f}ms)"
+                )
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+import backoff
+from aiohttp import ClientResponseError
+
+from dpytools.http.base import log_retry
+
+
+class AsyncHttpClient:
+    # Initialize AsyncHttpClient with a backoff_max value and connection limits
+    def __init__(
+        self,
+        backoff_max=30,
+        max_concurrency: int = 10,
+        limit: int = 100,
+        limit_per_host: int = 10,
+    ):
+        """
+        Creates an asyncio client that owns a pooled `aiohttp` connector.
+
+        The connector (and the semaphore bounding concurrency) are created on first
+        use, so the client can be constructed outside of a running event loop.
+
+        Args:
+            backoff_max (int): Maximum time in seconds to keep retrying a request.
+            max_concurrency (int): Maximum number of requests in flight at once.
+            limit (int): Maximum number of pooled connections in total.
+            limit_per_host (int): Maximum number of pooled connections per host.
+        """
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def close(self):
+        """
+        Closes the underlying session and any pooled connections it holds.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # GET request method with exponential backoff
+    @backoff.on_exception(
+        backoff.expo, ClientResponseError, max_time=30, on_backoff=log_retry
+    )
+    async def get(self, url, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Sends a GET request to the specified URL with optional extra arguments.
+
+        This method is a thin wrapper around `aiohttp.ClientSession.get()`. Any
+        additional keyword arguments are passed directly to it. For more information
+        on the available arguments, refer to the `aiohttp` documentation:
+        https://docs.aiohttp.org/en/stable/client_reference.html
+
+        Args:
+            url (str): The URL to send the GET request to.
+            **kwargs: Optional keyword arguments passed to `aiohttp`.
+
+        Returns:
+            ClientResponse: The response, with its body already read so that
+            `await response.json()` etc. can be used after it is returned.
+        Raises:
+            ClientResponseError: If the server responds with an error status.
+        """
+        return await self._handle_request("GET", url, **kwargs)
+
+    # POST request method with exponential backoff
+    @backoff.on_exception(
+        backoff.expo,
+        ClientResponseError,
+        max_time=30,
+        on_backoff=log_retry,
+    )
+    async def post(self, url, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Sends a POST request to the specified URL with optional extra arguments.
+
+        This method is a thin wrapper around `aiohttp.ClientSession.post()`. Any
+        additional keyword arguments are passed directly to it. For more information
+        on the available arguments, refer to the `aiohttp` documentation:
+        https://docs.aiohttp.org/en/stable/client_reference.html
+
+        Args:
+            url (str): The URL to send the POST request to.
+            **kwargs: Optional keyword arguments passed to `aiohttp`.
+
+        Returns:
+            ClientResponse: The response, with its body already read so that
+            `await response.json()` etc. can be used after it is returned.
+
+        Raises:
+            ClientResponseError: If the server responds with an error status.
+        """
+        return await self._handle_request("POST", url, **kwargs)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    # Method to handle requests for GET and POST
+    async def _handle_request(self, method, url, **kwargs) -> aiohttp.ClientResponse:
+        logging.info(f"Sending {method} request to {url}")
+        session = self._get_session()
+        try:
+            async with self._semaphore:
+                async with session.request(method, url, **kwargs) as response:
+                    # Read the body before the connection is released to the pool
+                    await response.read()
+                    response.raise_for_status()
+                    return response
+
+        except ClientResponseError as http_err:
+            logging.error(
+                f"HTTP error occurred: {http_err} when sending a {method} to {url} with headers {kwargs.get('headers')}"
+            )
+            raise http_err
+        except Exception as err:
+            logging.error(
+                f"Other error occurred: {err} when sending a {method} to {url} with headers {kwargs.get('headers')}"
+            )
+            raise err
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+from math import ceil
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import aiohttp
+import backoff
+from aiohttp import ClientResponseError
+
+from dpytools.http.async_base import AsyncHttpClient
+from dpytools.http.base import log_retry
+from dpytools.http.upload import _generate_upload_new_params, _generate_upload_params
+
+
+class AsyncUploadClient(AsyncHttpClient):
+    def __init__(self, upload_url: str, **kwargs):
+        # Inherit backoff_max value and pooled connector from AsyncHttpClient.__init__,
+        # any keyword arguments (e.g. `max_concurrency`) are passed through to it.
+        super().__init__(**kwargs)
+        self.upload_url = upload_url
+
+    async def upload_csv(
+        self,
+        csv_path: Union[Path, str],
+        s3_bucket: str,
+        florence_access_token: str,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Asyncio equivalent of `UploadClient.upload_csv()`. Chunks are posted concurrently,
+        up to the client's `max_concurrency`.
+
+        Returns the S3 Object key and S3 URL of the uploaded file.
+        """
+        return await self._upload(
+            csv_path, s3_bucket, florence_access_token, "text/csv", chunk_size
+        )
+
+    async def upload_sdmx(
+        self,
+        sdmx_path: Union[Path, str],
+        s3_bucket: str,
+        florence_access_token: str,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Asyncio equivalent of `UploadClient.upload_sdmx()`. Chunks are posted concurrently,
+        up to the client's `max_concurrency`.
+
+        Returns the S3 Object key and S3 URL of the uploaded file.
+        """
+        return await self._upload(
+            sdmx_path, s3_bucket, florence_access_token, "application/xml", chunk_size
+        )
+
+    async def upload_new_csv(
+        self,
+        csv_path: Union[Path, str],
+        florence_access_token: str,
+        s3_bucket: str,
+        title: str,
+        collection_id: Optional[str],
+        is_publishable: bool = False,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Asyncio equivalent of `UploadClient.upload_new_csv()`. Chunks are posted concurrently,
+        up to the client's `max_concurrency`.
+
+        Returns the S3 Object key and S3 URL of the uploaded file.
+        """
+        return await self._upload_new(
+            csv_path,
+            s3_bucket,
+            florence_access_token,
+            title,
+            "text/csv",
+            collection_id,
+            is_publishable,
+            chunk_size,
+        )
+
+    async def upload_new_sdmx(
+        self,
+        sdmx_path: Union[Path, str],
+        florence_access_token: str,
+        s3_bucket: str,
+        title: str,
+        collection_id: Optional[str],
+        is_publishable: bool = False,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Asyncio equivalent of `UploadClient.upload_new_sdmx()`. Chunks are posted concurrently,
+        up to the client's `max_concurrency`.
+
+        Returns the S3 Object key and S3 URL of the uploaded file.
+        """
+        return await self._upload_new(
+            sdmx_path,
+            s3_bucket,
+            florence_access_token,
+            title,
+            "application/xml",
+            collection_id,
+            is_publishable,
+            chunk_size,
+        )
+
+    async def _upload(
+        self,
+        file_path: Union[Path, str],
+        s3_bucket: str,
+        florence_access_token: str,
+        mimetype: str,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Upload files to the DP Upload Service `upload` endpoint.
+        """
+        # Convert file_path string to Path
+        if isinstance(file_path, str):
+            file_path = Path(file_path).absolute()
+
+        # Generate upload request params
+        upload_params = _generate_upload_params(file_path, mimetype, chunk_size)
+
+        # Upload file chunks to S3
+        await self._upload_file_chunks(
+            file_path, upload_params, florence_access_token, chunk_size
+        )
+
+        s3_key = upload_params["resumableIdentifier"]
+        s3_uri = f"s3://{s3_bucket}/{s3_key}"
+        logging.info(f"Upload to s3 complete: {s3_uri}")
+        return s3_key, s3_uri
+
+    async def _upload_new(
+        self,
+        file_path: Union[Path, str],
+        s3_bucket: str,
+        florence_access_token: str,
+        title: str,
+        mimetype: str,
+        collection_id: Optional[str],
+        is_publishable: bool = False,
+        chunk_size: int = 5242880,
+    ) -> Tuple[str, str]:
+        """
+        Upload files to the DP Upload Service `upload-new` endpoint.
+        """
+        # Convert file_path string to Path
+        if isinstance(file_path, str):
+            file_path = Path(file_path).absolute()
+
+        # Generate upload request params
+        upload_params = _generate_upload_new_params(
+            file_path,
+            f"s3://{s3_bucket}",
+            title,
+            mimetype,
+            collection_id,
+            is_publishable,
+            chunk_size=chunk_size,
+        )
+
+        # Upload file chunks to S3
+        await self._upload_file_chunks(
+            file_path, upload_params, florence_access_token, chunk_size
+        )
+
+        s3_key = upload_params["resumableFilename"]
+        s3_uri = f"s3://{s3_bucket}/{s3_key}"
+        logging.info(f"Upload to s3 complete: {s3_uri}")
+        return s3_key, s3_uri
+
+    async def _upload_file_chunks(
+        self,
+        file_path: Path,
+        upload_params: dict,
+        florence_access_token: str,
+        chunk_size: int,
+    ) -> None:
+        """
+        Upload file chunks to DP Upload Service with the specified upload parameters.
+
+        Each chunk is read from `file_path` by offset only once a slot is free, so at most
+        `max_concurrency` chunks are held in memory. The first failure cancels the rest.
+        """
+        total_chunks = ceil(os.path.getsize(file_path) / chunk_size)
+        slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def upload_chunk(chunk_number: int):
+            async with slots:
+                data = await asyncio.to_thread(
+                    _read_chunk, file_path, (chunk_number - 1) * chunk_size, chunk_size
+                )
+                # aiohttp only accepts str/int/float query values
+                params = {k: str(v) for k, v in upload_params.items() if v is not None}
+                params["resumableChunkNumber"] = str(chunk_number)
+                await self._post_chunk(
+                    data, file_path.name, params, florence_access_token
+                )
+                logging.info(f"File chunk {chunk_number} of {total_chunks} posted")
+
+        tasks = [
+            asyncio.ensure_future(upload_chunk(chunk_number))
+            for chunk_number in range(1, total_chunks + 1)
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    # Retries build a new form each attempt, as aiohttp forms can only be sent once
+    @backoff.on_exception(
+        backoff.expo, ClientResponseError, max_time=30, on_backoff=log_retry
+    )
+    async def _post_chunk(
+        self, data: bytes, filename: str, params: dict, florence_access_token: str
+    ):
+        form = aiohttp.FormData()
+        form.add_field("file", data, filename=filename)
+        return await self._handle_request(
+            "POST",
+            self.upload_url,
+            headers={"X-Florence-Token": florence_access_token},
+            params=params,
+            data=form,
+        )
+
+
+def _read_chunk(file_path: Path, offset: int, chunk_size: int) -> bytes:
+    """
+    Reads `chunk_size` bytes of `file_path` starting at `offset`.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(chunk_size)
@@ -2,6 +2,7 @@ import logging
 
 import backoff
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 
@@ -11,9 +12,46 @@ def log_retry(details):
 
 
 class BaseHttpClient:
-    # Initialize HttpClient with a backoff_max value
-    def __init__(self, backoff_max=30):
+    # Initialize HttpClient with a backoff_max value and a pooled session
+    def __init__(
+        self,
+        backoff_max=30,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+    ):
+        """
+        Creates a client that owns a `requests.Session`, so that connections
+        (and TLS handshakes) are kept alive and reused between requests.
+
+        Args:
+            backoff_max (int): Maximum time in seconds to keep retrying a request.
+            pool_connections (int): Number of per-host connection pools to cache.
+            pool_maxsize (int): Maximum number of connections kept open per host.
+            pool_block (bool): If True, never open more than `pool_maxsize`
+                connections to a host at once; callers wait for a free connection.
+        """
         self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """
+        Closes the underlying session and any pooled connections it holds.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     # GET request method with exponential backoff
     @backoff.on_exception(backoff.expo, HTTPError, max_time=30, on_backoff=log_retry)
@@ -71,7 +109,7 @@ class BaseHttpClient:
     def _handle_request(self, method, url, *args, **kwargs):
         logging.info(f"Sending {method} request to {url}")
         try:
-            response = requests.request(method, url, *args, **kwargs)
+            response = self.session.request(method, url, *args, **kwargs)
             response.raise_for_status()
             return response
 
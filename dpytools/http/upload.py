@@ -1,71 +1,289 @@
 import datetime
-from math import ceil
+import hashlib
+import io
+import json
+import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import count
+from math import ceil
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Optional, Tuple, Union
+from typing import (
+    BinaryIO,
+    Container,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import backoff
+from requests.exceptions import HTTPError, RequestException
+
+from dpytools.http.base import BaseHttpClient, log_retry
+from dpytools.s3.basic import head_s3_object, iter_s3_object_ranges
+
+# Default location of the progress manifests kept for uploads made with `resume=True`
+DEFAULT_MANIFEST_DIR = Path.home() / ".cache" / "dpytools" / "uploads"
+
+# Digests computed for clients created with `checksums=True`
+CHECKSUM_ALGORITHMS = ("md5", "sha256")
+
+
+def _is_fatal_error(err: HTTPError) -> bool:
+    """
+    Client errors (other than timeouts and rate limiting) will fail however many
+    times they are retried.
+    """
+    status = err.response.status_code if err.response is not None else None
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+@dataclass
+class ChunkResult:
+    """
+    What it took to send a single chunk: its size in bytes, the latency in seconds of
+    the request that succeeded and how many times it was retried. `skipped` is True if
+    the server already had the chunk (see `UploadClient(probe_server=True)`).
+
+    `md5` and `sha256` are hex digests of the chunk, for clients created with `checksums=True`.
+    """
 
-from dpytools.http.base import BaseHttpClient
+    chunk_number: int
+    bytes: int
+    latency: float
+    retries: int = 0
+    skipped: bool = False
+    md5: Optional[str] = None
+    sha256: Optional[str] = None
+
+
+@dataclass
+class UploadResult:
+    """
+    The outcome of an upload, with a `ChunkResult` for every chunk sent.
+
+    Unpacks as `s3_key, s3_uri = result`, so it can be used as the (S3 Object key, S3 URL)
+    tuple documented by the upload methods.
+
+    `md5` and `sha256` are hex digests of the whole file, for clients created with
+    `checksums=True`.
+    """
+
+    s3_key: str
+    s3_uri: str
+    chunk_size: int
+    total_size: int
+    elapsed: float
+    chunks: List[ChunkResult] = field(default_factory=list)
+    md5: Optional[str] = None
+    sha256: Optional[str] = None
+
+    def __iter__(self):
+        return iter((self.s3_key, self.s3_uri))
+
+    @property
+    def bytes_sent(self) -> int:
+        return sum(chunk.bytes for chunk in self.chunks if not chunk.skipped)
+
+    @property
+    def retries(self) -> int:
+        return sum(chunk.retries for chunk in self.chunks)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes sent per second of the upload's wall-clock time.
+        """
+        return self.bytes_sent / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class BatchUploadResult:
+    """
+    The outcome of `UploadClient.upload_many()`, keyed by each file's absolute path: the
+    `UploadResult` of every file that was uploaded and the error raised by every file
+    that was not.
+    """
+
+    results: Dict[str, UploadResult] = field(default_factory=dict)
+    failures: Dict[str, Exception] = field(default_factory=dict)
+
+
+@dataclass
+class UploadSource:
+    """
+    Data to upload that is not a local file: `bytes`, a binary file-like object (anything
+    with a `read()` method, e.g. an S3 object's streaming body) or an iterator of `bytes`.
+    It can be passed to any of the upload methods in place of a file path.
+
+    `filename` is the name given to the uploaded file. `total_size` is the number of bytes
+    that will be uploaded; it must be given for an iterator or a stream that can't seek,
+    and the upload fails if the data turns out to be a different size. A file-like object
+    is uploaded from its current position.
+
+    Each chunk is read only when it is about to be posted, so the data is never held in
+    memory (or written to disk) as a whole. A stream or iterator can only be uploaded once.
+    """
+
+    data: Union[bytes, bytearray, BinaryIO, Iterable[bytes]]
+    filename: str
+    total_size: Optional[int] = None
+
+    def __post_init__(self):
+        if isinstance(self.data, (bytes, bytearray)):
+            self.data = io.BytesIO(self.data)
+        if self.total_size is None:
+            seekable = getattr(self.data, "seekable", None)
+            if seekable is None or not seekable():
+                raise ValueError(
+                    f"total_size must be given to upload {self.filename} from an iterator "
+                    "or a stream that can't seek"
+                )
+            position = self.data.tell()
+            self.total_size = self.data.seek(0, os.SEEK_END) - position
+            self.data.seek(position)
+
+    def reader(self) -> BinaryIO:
+        """
+        A file-like object to read the data from.
+        """
+        if hasattr(self.data, "read"):
+            return self.data
+        return _IterableReader(self.data)
 
 
 class UploadClient(BaseHttpClient):
-    def __init__(self, upload_url: str):
-        # Inherit backoff_max value from BaseHTTPClient.__init__
-        super().__init__()
+    def __init__(
+        self,
+        upload_url: str,
+        manifest_dir: Optional[Union[Path, str]] = None,
+        probe_server: bool = False,
+        min_chunk_size: int = 5242880,
+        max_chunk_size: int = 104857600,
+        checksums: bool = False,
+        send_checksums: bool = False,
+        **kwargs,
+    ):
+        # Inherit backoff_max value and pooled session from BaseHTTPClient.__init__,
+        # any keyword arguments (e.g. `pool_maxsize`) are passed through to it.
+        super().__init__(**kwargs)
         self.upload_url = upload_url
+        # Where progress manifests are kept for uploads made with `resume=True`
+        self.manifest_dir = (
+            Path(manifest_dir) if manifest_dir is not None else DEFAULT_MANIFEST_DIR
+        )
+        # Whether resumed uploads ask the server which chunks it already has
+        self.probe_server = probe_server
+        # Bounds for chunk sizes picked by uploads made with `chunk_size=None`
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        # Moving average of the upload rate (bytes/second) of a single chunk request
+        self._chunk_rate: Optional[float] = None
+        self._chunk_rate_lock = threading.Lock()
+        # Whether to compute md5/sha256 digests of each chunk and file as they are read,
+        # and whether to send them to the server as upload params
+        self.checksums = checksums or send_checksums
+        self.send_checksums = send_checksums
 
     def upload_csv(
         self,
-        csv_path: Union[Path, str],
+        csv_path: Union[Path, str, UploadSource],
         s3_bucket: str,
         florence_access_token: str,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
         """
         Upload csv files to the DP Upload Service `upload` endpoint. The file to be uploaded (located at `csv_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket.
 
         The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        `max_workers` sets how many chunks are posted concurrently (default 1, one after another). With `resume=True`, progress is recorded in a local manifest so that a failed upload of the same file can be retried without re-sending the chunks already posted.
+
+        Pass `chunk_size=None` to have the chunk size picked from the size of the file and the upload rate seen by earlier uploads, within the client's `min_chunk_size` and `max_chunk_size`.
+
+        To upload bytes, a file-like object or an iterator of bytes rather than a local file, pass an `UploadSource` in place of the path (`resume` is not supported for these).
+
+        Returns an `UploadResult` with the bytes, latency and retries of each chunk, which unpacks as the S3 Object key and S3 URL of the uploaded file.
         """
-        self._upload(csv_path, s3_bucket, florence_access_token, "text/csv", chunk_size)
+        return self._upload(
+            csv_path,
+            s3_bucket,
+            florence_access_token,
+            "text/csv",
+            chunk_size,
+            max_workers,
+            resume,
+        )
 
     def upload_sdmx(
         self,
-        sdmx_path: Union[Path, str],
+        sdmx_path: Union[Path, str, UploadSource],
         s3_bucket: str,
         florence_access_token: str,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
         """
         Upload sdmx files to the DP Upload Service `upload` endpoint. The file to be uploaded (located at `sdmx_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket.
 
         The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        `max_workers` sets how many chunks are posted concurrently (default 1, one after another). With `resume=True`, progress is recorded in a local manifest so that a failed upload of the same file can be retried without re-sending the chunks already posted.
+
+        Pass `chunk_size=None` to have the chunk size picked from the size of the file and the upload rate seen by earlier uploads, within the client's `min_chunk_size` and `max_chunk_size`.
+
+        To upload bytes, a file-like object or an iterator of bytes rather than a local file, pass an `UploadSource` in place of the path (`resume` is not supported for these).
+
+        Returns an `UploadResult` with the bytes, latency and retries of each chunk, which unpacks as the S3 Object key and S3 URL of the uploaded file.
         """
-        self._upload(
-            sdmx_path, s3_bucket, florence_access_token, "application/xml", chunk_size
+        return self._upload(
+            sdmx_path,
+            s3_bucket,
+            florence_access_token,
+            "application/xml",
+            chunk_size,
+            max_workers,
+            resume,
         )
 
     def upload_new_csv(
         self,
-        csv_path: Union[Path, str],
+        csv_path: Union[Path, str, UploadSource],
         florence_access_token: str,
         s3_bucket: str,
         title: str,
         collection_id: Optional[str],
         is_publishable: bool = False,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
         """
         Upload csv files to the DP Upload Service `upload-new` endpoint. The file to be uploaded (located at `csv_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket.
 
         The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        `max_workers` sets how many chunks are posted concurrently (default 1, one after another). With `resume=True`, progress is recorded in a local manifest so that a failed upload of the same file can be retried without re-sending the chunks already posted.
+
+        Pass `chunk_size=None` to have the chunk size picked from the size of the file and the upload rate seen by earlier uploads, within the client's `min_chunk_size` and `max_chunk_size`.
+
+        To upload bytes, a file-like object or an iterator of bytes rather than a local file, pass an `UploadSource` in place of the path (`resume` is not supported for these).
+
+        Returns an `UploadResult` with the bytes, latency and retries of each chunk, which unpacks as the S3 Object key and S3 URL of the uploaded file.
         """
-        self._upload_new(
+        return self._upload_new(
             csv_path,
             s3_bucket,
             florence_access_token,
@@ -74,26 +292,36 @@ class UploadClient(BaseHttpClient):
             collection_id,
             is_publishable,
             chunk_size,
+            max_workers,
+            resume,
         )
 
     def upload_new_sdmx(
         self,
-        sdmx_path: Union[Path, str],
+        sdmx_path: Union[Path, str, UploadSource],
         florence_access_token: str,
         s3_bucket: str,
         title: str,
         collection_id: Optional[str],
         is_publishable: bool = False,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
         """
         Upload sdmx files to the DP Upload Service `upload-new` endpoint. The file to be uploaded (located at `sdmx_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket.
 
         The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        `max_workers` sets how many chunks are posted concurrently (default 1, one after another). With `resume=True`, progress is recorded in a local manifest so that a failed upload of the same file can be retried without re-sending the chunks already posted.
+
+        Pass `chunk_size=None` to have the chunk size picked from the size of the file and the upload rate seen by earlier uploads, within the client's `min_chunk_size` and `max_chunk_size`.
+
+        To upload bytes, a file-like object or an iterator of bytes rather than a local file, pass an `UploadSource` in place of the path (`resume` is not supported for these).
+
+        Returns an `UploadResult` with the bytes, latency and retries of each chunk, which unpacks as the S3 Object key and S3 URL of the uploaded file.
         """
-        self._upload_new(
+        return self._upload_new(
             sdmx_path,
             s3_bucket,
             florence_access_token,
@@ -102,132 +330,498 @@ class UploadClient(BaseHttpClient):
             collection_id,
             is_publishable,
             chunk_size,
+            max_workers,
+            resume,
         )
 
-    def _upload(
+    def upload_many(
         self,
-        file_path: Union[Path, str],
+        files: Iterable[
+            Union[Path, str, UploadSource, Tuple[Union[Path, str, UploadSource], str]]
+        ],
         s3_bucket: str,
         florence_access_token: str,
-        mimetype: str,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        upload_new: bool = False,
+        collection_id: Optional[str] = None,
+        is_publishable: bool = False,
+        chunk_size: Optional[int] = 5242880,
+        max_in_flight: int = 4,
+        resume: bool = False,
+    ) -> "BatchUploadResult":
         """
-        Upload files to the DP Upload Service `upload` endpoint. The file to be uploaded (located at `file_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket. The file type should be specified as `mimetype`.
+        Upload many csv and/or sdmx files to the DP Upload Service, sharing one pool of workers.
 
-        The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
+        Chunks from all of the files are interleaved in turn, with at most `max_in_flight` chunks
+        being posted (or held in memory) at once across every file. The file type is taken from
+        each file's extension (`.csv`, `.xml` or `.sdmx`).
+
+        Files are uploaded to the `upload` endpoint, or to the `upload-new` endpoint if
+        `upload_new` is True. For `upload-new`, each entry of `files` can be a (path, title) pair;
+        a plain path is given its file name as its title. `chunk_size` and `resume` behave as
+        they do for the single file upload methods. An `UploadSource` can be given in place of
+        a path, and is keyed by its `filename` in the result.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        A file that fails does not stop the others. Returns a `BatchUploadResult` with the
+        `UploadResult` (which unpacks as the S3 Object key and S3 URL) of each file that
+        was uploaded, and the error raised by each file that was not.
         """
-        # Convert file_path string to Path
-        if isinstance(file_path, str):
-            file_path = Path(file_path).absolute()
+        batch = BatchUploadResult()
+        uploads = []
+        for entry in files:
+            file_path, title = entry if isinstance(entry, tuple) else (entry, None)
+            file_path = _as_upload_source(file_path)
+            name = _upload_name(file_path)
+            try:
+                uploads.append(
+                    self._prepare_upload(
+                        file_path,
+                        s3_bucket,
+                        _mimetype_for(name),
+                        chunk_size,
+                        resume,
+                        upload_new=upload_new,
+                        title=title if title is not None else name.name,
+                        collection_id=collection_id,
+                        is_publishable=is_publishable,
+                    )
+                )
+            except Exception as err:
+                logging.error(f"Could not start upload of {name}: {err}")
+                batch.failures[str(name)] = err
 
-        # Create file chunks
-        file_chunks = _create_temp_chunks(file_path, chunk_size)
+        self._post_uploads(uploads, florence_access_token, max_in_flight)
 
-        # Generate upload request params
-        upload_params = _generate_upload_params(file_path, mimetype, chunk_size)
+        for upload in uploads:
+            try:
+                batch.results[str(upload.file_path)] = upload.result()
+            except Exception as err:
+                batch.failures[str(upload.file_path)] = err
+        return batch
+
+    def upload_s3_object(
+        self,
+        object_name: str,
+        s3_bucket: str,
+        florence_access_token: str,
+        mimetype: Optional[str] = None,
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 4,
+        upload_new: bool = False,
+        title: Optional[str] = None,
+        collection_id: Optional[str] = None,
+        is_publishable: bool = False,
+        profile_name: Optional[str] = None,
+    ) -> UploadResult:
+        """
+        Upload an object that is already in S3, i.e "my-bucket/things/file.csv", to the DP Upload
+        Service without downloading it to local disk first.
+
+        Each chunk is fetched with its own ranged S3 GET. Up to `max_workers` chunks are fetched
+        concurrently while up to `max_workers` are posted, so no more than twice that many chunks
+        are held in memory at once. `profile_name` is the AWS profile used to read the object.
+
+        The file type is taken from the object's extension (`.csv`, `.xml` or `.sdmx`) unless
+        `mimetype` is given. Files are uploaded to the `upload` endpoint, or to the `upload-new`
+        endpoint if `upload_new` is True, titled `title` (default: the object's file name).
+
+        Returns an `UploadResult`, which unpacks as the S3 Object key and S3 URL of the uploaded file.
+        """
+        head = head_s3_object(object_name, profile_name=profile_name)
+        total_size = head["ContentLength"]
+        filename = object_name.split("/")[-1]
+        if mimetype is None:
+            mimetype = _mimetype_for(Path(filename))
+        # Fix the chunk size here, so each chunk maps to exactly one ranged GET
+        if chunk_size is None:
+            chunk_size = self._choose_chunk_size(total_size)
+
+        source = UploadSource(
+            iter_s3_object_ranges(
+                object_name,
+                chunk_size,
+                max_workers,
+                profile_name=profile_name,
+                total_size=total_size,
+                if_match=head["ETag"],
+            ),
+            filename,
+            total_size,
+        )
+        upload = self._prepare_upload(
+            source,
+            s3_bucket,
+            mimetype,
+            chunk_size,
+            upload_new=upload_new,
+            title=title if title is not None else filename,
+            collection_id=collection_id,
+            is_publishable=is_publishable,
+        )
 
         # Upload file chunks to S3
-        self._upload_file_chunks(file_chunks, upload_params, florence_access_token)
+        self._post_uploads([upload], florence_access_token, max_workers)
+        return upload.result()
 
-        s3_key = upload_params["resumableIdentifier"]
-        s3_uri = f"s3://{s3_bucket}/{s3_key}"
+    def _upload(
+        self,
+        file_path: Union[Path, str, UploadSource],
+        s3_bucket: str,
+        florence_access_token: str,
+        mimetype: str,
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
+        """
+        Upload files to the DP Upload Service `upload` endpoint. The file to be uploaded (located at `file_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket. The file type should be specified as `mimetype`.
 
-        # Delete temporary files
-        _delete_temp_chunks(file_chunks)
+        The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        # TODO Replace print statements with logging
-        print("Upload to s3 complete")
+        Returns an `UploadResult`, which unpacks as the S3 Object key and S3 URL of the uploaded file.
+        """
+        upload = self._prepare_upload(
+            _as_upload_source(file_path), s3_bucket, mimetype, chunk_size, resume
+        )
 
-        return s3_key, s3_uri
+        # Upload file chunks to S3
+        self._post_uploads([upload], florence_access_token, max_workers)
+        return upload.result()
 
     def _upload_new(
         self,
-        file_path: Union[Path, str],
+        file_path: Union[Path, str, UploadSource],
         s3_bucket: str,
         florence_access_token: str,
         title: str,
         mimetype: str,
         collection_id: Optional[str],
         is_publishable: bool = False,
-        chunk_size: int = 5242880,
-    ) -> Tuple[str, str]:
+        chunk_size: Optional[int] = 5242880,
+        max_workers: int = 1,
+        resume: bool = False,
+    ) -> UploadResult:
         """
         Upload files to the DP Upload Service `upload-new` endpoint. The file to be uploaded (located at `file_path`) is chunked (default chunk size 5242880 bytes) and uploaded to an S3 bucket. The file type should be specified as `mimetype`.
 
         The `s3_bucket` argument should be set as an environment variable and accessed via os.getenv() or similar. `florence_access_token` should be generated via the DP Identity API and passed as a string argument.
 
-        Returns the S3 Object key and S3 URL of the uploaded file.
+        Returns an `UploadResult`, which unpacks as the S3 Object key and S3 URL of the uploaded file.
         """
-        # Convert file_path string to Path
-        if isinstance(file_path, str):
-            file_path = Path(file_path).absolute()
+        upload = self._prepare_upload(
+            _as_upload_source(file_path),
+            s3_bucket,
+            mimetype,
+            chunk_size,
+            resume,
+            upload_new=True,
+            title=title,
+            collection_id=collection_id,
+            is_publishable=is_publishable,
+        )
+
+        # Upload file chunks to S3
+        self._post_uploads([upload], florence_access_token, max_workers)
+        return upload.result()
 
-        # Create file chunks
-        file_chunks = _create_temp_chunks(file_path, chunk_size)
+    def _prepare_upload(
+        self,
+        file_path: Union[Path, UploadSource],
+        s3_bucket: str,
+        mimetype: str,
+        chunk_size: Optional[int],
+        resume: bool = False,
+        upload_new: bool = False,
+        title: Optional[str] = None,
+        collection_id: Optional[str] = None,
+        is_publishable: bool = False,
+    ) -> "_FileUpload":
+        """
+        Generate the upload params for `file_path` (for the `upload-new` endpoint if `upload_new`
+        is True) and set up the chunks to send, ready to be passed to `_post_uploads()`.
+
+        When resuming an earlier attempt at the same upload, the params (and so the S3 key and
+        chunk size) of that attempt are reused and only the chunks it didn't post are sent.
+        Only local files can be resumed, not an `UploadSource`.
+        """
+        source = None
+        if isinstance(file_path, UploadSource):
+            if resume:
+                raise ValueError(
+                    f"Cannot resume the upload of {file_path.filename}, only uploads of "
+                    "local files can be resumed"
+                )
+            source, file_path = file_path, Path(file_path.filename)
+            total_size = source.total_size
+        else:
+            total_size = os.path.getsize(file_path)
+
+        if chunk_size is None:
+            chunk_size = self._choose_chunk_size(total_size)
 
         # Generate upload request params
-        upload_params = _generate_upload_new_params(
+        if upload_new:
+            upload_params = _generate_upload_new_params(
+                file_path,
+                f"s3://{s3_bucket}",
+                title,
+                mimetype,
+                collection_id,
+                is_publishable,
+                chunk_size=chunk_size,
+                total_size=total_size,
+            )
+            s3_key_param = "resumableFilename"
+        else:
+            upload_params = _generate_upload_params(
+                file_path, mimetype, chunk_size, total_size=total_size
+            )
+            s3_key_param = "resumableIdentifier"
+
+        manifest = None
+        skip = ()
+        digests = _new_digests() if self.checksums else None
+        if resume:
+            manifest = _UploadManifest.load_or_create(
+                self.manifest_dir, file_path, self.upload_url, upload_params
+            )
+            upload_params = manifest.upload_params
+            skip = manifest.completed
+
+        if source is not None:
+            file_chunks = _iter_source_chunks(source, chunk_size, digests)
+        else:
+            file_chunks = _iter_file_chunks(
+                file_path, upload_params["resumableChunkSize"], skip, digests
+            )
+
+        return _FileUpload(
             file_path,
-            f"s3://{s3_bucket}",
-            title,
-            mimetype,
-            collection_id,
-            is_publishable,
+            file_chunks,
+            upload_params,
+            s3_bucket,
+            s3_key_param,
+            manifest,
+            # Only a resumed upload can have chunks the server already holds
+            probe=manifest is not None and manifest.resumed and self.probe_server,
+            digests=digests,
         )
 
-        # Upload file chunks to S3
-        self._upload_file_chunks(file_chunks, upload_params, florence_access_token)
+    def _choose_chunk_size(self, total_size: int, target_seconds: float = 5) -> int:
+        """
+        Pick a chunk size for a file of `total_size` bytes, within `min_chunk_size` and
+        `max_chunk_size`.
+
+        Chunks are made large enough to keep the file within 10,000 chunks (the S3 multipart
+        upload limit) and, once earlier chunks have given an upload rate, large enough that
+        each request takes around `target_seconds`, so per-request latency is a small share
+        of the upload time. Sizes are rounded up to a whole MiB.
+        """
+        chunk_size = ceil(total_size / 10000)
+        with self._chunk_rate_lock:
+            if self._chunk_rate is not None:
+                chunk_size = max(chunk_size, int(self._chunk_rate * target_seconds))
+        mib = 1048576
+        chunk_size = ceil(chunk_size / mib) * mib
+        return min(max(chunk_size, self.min_chunk_size), self.max_chunk_size)
+
+    def _record_chunk_rate(self, chunk: ChunkResult):
+        """
+        Fold the rate of a sent chunk into the moving average used by `_choose_chunk_size()`.
+        """
+        if chunk.skipped or chunk.latency <= 0:
+            return
+        rate = chunk.bytes / chunk.latency
+        with self._chunk_rate_lock:
+            if self._chunk_rate is None:
+                self._chunk_rate = rate
+            else:
+                self._chunk_rate = 0.8 * self._chunk_rate + 0.2 * rate
 
-        s3_key = upload_params["resumableFilename"]
-        s3_uri = f"s3://{s3_bucket}/{s3_key}"
+    def _post_uploads(
+        self,
+        uploads: List["_FileUpload"],
+        florence_access_token: str,
+        max_workers: int = 1,
+    ):
+        """
+        Post the chunks of each upload to DP Upload Service, with each upload's params.
 
-        # Delete temporary files
-        _delete_temp_chunks(file_chunks)
+        Chunks are posted through a pool of up to `max_workers` threads, taking a chunk from
+        each upload in turn. The next chunk is only read once a worker is free, so at most
+        `max_workers` chunks are held in memory at once. Each chunk is retried on its own.
+        The first chunk of an upload to fail outright stops any further chunks of that upload
+        being posted, and the error is kept on the upload (see `_FileUpload.result()`), as is
+        any error raised while reading the upload's data.
+        """
+        slots = threading.BoundedSemaphore(max_workers)
 
-        # TODO Replace print statements with logging
-        print("Upload to s3 complete")
+        def chunk_done(upload: _FileUpload, future: Future):
+            try:
+                if future.exception() is not None:
+                    if upload.error is None:
+                        upload.error = future.exception()
+                else:
+                    chunk = future.result()
+                    upload.chunks.append(chunk)
+                    self._record_chunk_rate(chunk)
+                    if upload.manifest is not None:
+                        upload.manifest.mark_done(chunk.chunk_number)
+                    logging.info(
+                        f"File chunk {chunk.chunk_number} of {upload.total_chunks} of "
+                        f"{upload.file_path.name} posted ({chunk.bytes} bytes in "
+                        f"{chunk.latency:.3f}s, {chunk.retries} retries)"
+                    )
+            except Exception as err:
+                # Errors raised in a done callback are only logged by the executor, so
+                # are kept on the upload to stop it
+                logging.error(
+                    f"Could not record a chunk of {upload.file_path.name}: {err}"
+                )
+                if upload.error is None:
+                    upload.error = err
+            finally:
+                # Always free the worker, or the rotation waits for it forever
+                slots.release()
 
-        return s3_key, s3_uri
+        # Uploads take turns to send a chunk, leaving the rotation once they have no more
+        in_rotation = deque(uploads)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while in_rotation:
+                # Wait for a free worker before reading the next chunk
+                slots.acquire()
+                upload = in_rotation.popleft()
+                try:
+                    next_chunk = (
+                        None if upload.error else next(upload.file_chunks, None)
+                    )
+                except Exception as err:
+                    logging.error(f"Could not read {upload.file_path.name}: {err}")
+                    upload.error = err
+                    next_chunk = None
+                if next_chunk is None:
+                    slots.release()
+                    continue
+                in_rotation.append(upload)
 
-    def _upload_file_chunks(
-        self, file_chunks: list[str], upload_params: dict, florence_access_token: str
-    ) -> None:
+                chunk_number, file_chunk = next_chunk
+                # Each chunk gets its own copy of the params with its chunk number
+                chunk_params = {
+                    **upload.upload_params,
+                    "resumableChunkNumber": chunk_number,
+                }
+                # The last chunk is read last, so the whole file has been digested
+                if self.send_checksums and chunk_number == upload.total_chunks:
+                    chunk_params.update(upload.file_checksum_params())
+                future = executor.submit(
+                    self._send_chunk,
+                    file_chunk,
+                    chunk_params,
+                    florence_access_token,
+                    upload.probe,
+                )
+                future.add_done_callback(partial(chunk_done, upload))
+
+    def _send_chunk(
+        self,
+        file_chunk: bytes,
+        chunk_params: dict,
+        florence_access_token: str,
+        probe: bool = False,
+    ) -> ChunkResult:
         """
-        Upload file chunks to DP Upload Service with the specified upload parameters.
+        Post a single file chunk unless `probe` is set and the server already has it.
+
+        Only this chunk is retried if the post fails, giving up straight away on errors
+        that a retry can't fix.
         """
-        chunk_number = 1
-        for file_chunk in file_chunks:
-            with open(file_chunk, "rb") as f:
-                # Load file chunk as binary data
-                file = {"file": f}
+        chunk_number = chunk_params["resumableChunkNumber"]
+        digests = {}
+        if self.checksums:
+            digests = {
+                name: hashlib.new(name, file_chunk).hexdigest()
+                for name in CHECKSUM_ALGORITHMS
+            }
+            if self.send_checksums:
+                chunk_params = {
+                    **chunk_params,
+                    "chunkMd5": digests["md5"],
+                    "chunkSha256": digests["sha256"],
+                }
 
-                # Add chunk number to upload request params
-                upload_params["resumableChunkNumber"] = chunk_number
+        if probe and self._server_has_chunk(chunk_params, florence_access_token):
+            return ChunkResult(
+                chunk_number, len(file_chunk), 0.0, skipped=True, **digests
+            )
 
-                # Submit `POST` request to `self.upload_url`
-                self.post(
-                    self.upload_url,
-                    headers={"X-Florence-Token": florence_access_token},
-                    params=upload_params,
-                    files=file,
-                    verify=True,
-                )
-                # TODO Replace print statements with logging
-                print(f"File chunk {chunk_number} of {len(file_chunks)} posted")
-                chunk_number += 1
+        retries = 0
+        latency = 0.0
+
+        def count_retry(details):
+            nonlocal retries
+            retries += 1
 
+        @backoff.on_exception(
+            backoff.expo,
+            HTTPError,
+            max_time=30,
+            giveup=_is_fatal_error,
+            on_backoff=[log_retry, count_retry],
+        )
+        def post_with_retries():
+            nonlocal latency
+            start = time.perf_counter()
+            self._post_chunk(file_chunk, chunk_params, florence_access_token)
+            latency = time.perf_counter() - start
 
-def _generate_upload_params(file_path: Path, mimetype: str, chunk_size: int) -> dict:
+        post_with_retries()
+        return ChunkResult(chunk_number, len(file_chunk), latency, retries, **digests)
+
+    def _server_has_chunk(self, chunk_params: dict, florence_access_token: str) -> bool:
+        """
+        Ask the server whether it already has a chunk, using a resumable.js test-chunk `GET`.
+
+        The server responds `200` if it has the chunk. Any other response (or no response)
+        is taken to mean the chunk needs posting.
+        """
+        try:
+            response = self.session.get(
+                self.upload_url,
+                headers={"X-Florence-Token": florence_access_token},
+                params=chunk_params,
+                verify=True,
+            )
+        except RequestException:
+            return False
+        return response.status_code == 200
+
+    def _post_chunk(
+        self, file_chunk: bytes, chunk_params: dict, florence_access_token: str
+    ):
+        """
+        Post a single file chunk.
+        """
+        # Submit `POST` request to `self.upload_url`
+        self._handle_request(
+            "POST",
+            self.upload_url,
+            headers={"X-Florence-Token": florence_access_token},
+            params=chunk_params,
+            files={"file": (chunk_params["resumableFilename"], file_chunk)},
+            verify=True,
+        )
+
+
+def _generate_upload_params(
+    file_path: Path, mimetype: str, chunk_size: int, total_size: Optional[int] = None
+) -> dict:
     """
     Generate request parameters that do not change when iterating through the list of file chunks.
 
-    To be used with the `upload` endpoint.
+    To be used with the `upload` endpoint. `total_size` defaults to the size of the file at `file_path`.
     """
     # Get total size of file to be uploaded
-    total_size = os.path.getsize(file_path)
+    if total_size is None:
+        total_size = os.path.getsize(file_path)
 
     # Get filename from csv filepath
     filename = str(file_path).split("/")[-1]
@@ -256,14 +850,17 @@ def _generate_upload_new_params(
     is_publishable: bool = False,
     licence: str = "Open Government Licence v3.0",
     licence_url: str = "http://www.nationalarchives.gov.uk/doc/open-government-licence/version/3/",
+    chunk_size: int = 5242880,
+    total_size: Optional[int] = None,
 ) -> dict:
     """
     Generate request parameters that do not change when iterating through the list of file chunks.
 
-    To be used with the `upload-new` endpoint.
+    To be used with the `upload-new` endpoint. `total_size` defaults to the size of the file at `file_path`.
     """
     # Get total size of file to be uploaded
-    total_size = os.path.getsize(file_path)
+    if total_size is None:
+        total_size = os.path.getsize(file_path)
 
     # Get filename from csv filepath
     filename = str(file_path).split("/")[-1]
@@ -281,7 +878,8 @@ def _generate_upload_new_params(
         "resumableType": mimetype,
         "licence": licence,
         "licenceUrl": licence_url,
-        "resumableTotalChunks": ceil(total_size / 5242880),
+        "resumableTotalChunks": ceil(total_size / chunk_size),
+        "resumableChunkSize": chunk_size,
     }
 
     if collection_id is not None:
@@ -290,37 +888,317 @@ def _generate_upload_new_params(
     return upload_params
 
 
-def _create_temp_chunks(
-    csv_path: Path,
-    chunk_size: int = 5242880,
-) -> list[str]:
+def _mimetype_for(file_path: Path) -> str:
     """
-    Chunks up the data into text files, saves them to a temporary directory and returns list of temp filenames
+    The mimetype to upload a file as, from its extension.
     """
-    chunk_number = 1
-    temp_file_paths_list = []
+    mimetypes = {
+        ".csv": "text/csv",
+        ".xml": "application/xml",
+        ".sdmx": "application/xml",
+    }
+    try:
+        return mimetypes[file_path.suffix.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Cannot tell the type of {file_path}, expected one of {list(mimetypes)}"
+        )
+
+
+def _as_upload_source(
+    file_path: Union[Path, str, UploadSource]
+) -> Union[Path, UploadSource]:
+    """
+    An `UploadSource` as it is, or a file path as an absolute `Path`.
+    """
+    if isinstance(file_path, UploadSource):
+        return file_path
+    return Path(file_path).absolute()
+
 
-    # Create TemporaryDirectory to store temporary file chunks
-    with TemporaryDirectory() as output_path:
-        with open(csv_path, "rb") as f:
-            # Read chunk according to specified chunk size
+def _upload_name(file_path: Union[Path, UploadSource]) -> Path:
+    """
+    The path an upload is known by: a file's path, or an `UploadSource`'s filename.
+    """
+    if isinstance(file_path, UploadSource):
+        return Path(file_path.filename)
+    return file_path
+
+
+def _new_digests() -> dict:
+    return {name: hashlib.new(name) for name in CHECKSUM_ALGORITHMS}
+
+
+def _iter_file_chunks(
+    file_path: Path,
+    chunk_size: int = 5242880,
+    skip: Container[int] = (),
+    digests: Optional[dict] = None,
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Reads the file sequentially, yielding (chunk number, chunk) pairs of `chunk_size` bytes.
+
+    Nothing is written to disk, and only the chunk being yielded is held in memory. Chunks
+    whose numbers are in `skip` are not yielded, and are seeked past rather than read
+    unless `digests` are given. Each of the (hashlib) `digests` is updated with every
+    chunk of the file as it is read.
+    """
+    with open(file_path, "rb") as f:
+        for chunk_number in count(start=1):
+            if chunk_number in skip and digests is None:
+                f.seek(chunk_size, os.SEEK_CUR)
+                continue
             chunk = f.read(chunk_size)
-            while chunk:
-                # Create temporary filepath
-                temp_file_path = f"{output_path}-temp-file-part-{str(chunk_number)}"
-                # Write chunk to temporary filepath and append filename to list
-                with open(temp_file_path, "wb") as temp_file:
-                    temp_file.write(chunk)
-                    temp_file_paths_list.append(temp_file_path)
-                chunk_number += 1
-                chunk = f.read(chunk_size)
-    # Return list of temporary filepaths
-    return temp_file_paths_list
+            if not chunk:
+                return
+            if digests is not None:
+                for digest in digests.values():
+                    digest.update(chunk)
+            if chunk_number not in skip:
+                yield chunk_number, chunk
+
+
+def _iter_source_chunks(
+    source: UploadSource,
+    chunk_size: int = 5242880,
+    digests: Optional[dict] = None,
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Reads an `UploadSource` sequentially, yielding (chunk number, chunk) pairs of `chunk_size`
+    bytes, as `_iter_file_chunks()` does for a file.
+
+    Raises a ValueError if the source holds more or fewer bytes than its `total_size`.
+    """
+    reader = source.reader()
+    size_read = 0
+    for chunk_number in count(start=1):
+        chunk = _read_exactly(reader, chunk_size)
+        if not chunk:
+            break
+        size_read += len(chunk)
+        if size_read > source.total_size:
+            raise ValueError(
+                f"{source.filename} holds more than its total_size of {source.total_size} bytes"
+            )
+        if digests is not None:
+            for digest in digests.values():
+                digest.update(chunk)
+        yield chunk_number, chunk
+
+    if size_read != source.total_size:
+        raise ValueError(
+            f"{source.filename} holds {size_read} bytes, not its total_size of {source.total_size}"
+        )
+
+
+def _read_exactly(reader: BinaryIO, size: int) -> bytes:
+    """
+    Read `size` bytes, or up to the end of the data if there are fewer. Streams (e.g.
+    sockets) may return less than asked for from a single `read()` before they end.
+    """
+    data = reader.read(size)
+    if len(data) == size or not data:
+        return data
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        data = reader.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+class _IterableReader:
+    """
+    A minimal file-like wrapper that reads from an iterator of bytes, holding at most one of
+    its items beyond what has been read.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            data = next(self._chunks, None)
+            if data is None:
+                break
+            self._buffer += data
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class _FileUpload:
+    """
+    One file's upload in progress: the chunks still to send, the params to send them with
+    and the chunk results (or error) so far.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        file_chunks: Iterable[Tuple[int, bytes]],
+        upload_params: dict,
+        s3_bucket: str,
+        s3_key_param: str,
+        manifest: Optional["_UploadManifest"] = None,
+        probe: bool = False,
+        digests: Optional[dict] = None,
+    ):
+        self.file_path = file_path
+        self.file_chunks = iter(file_chunks)
+        self.upload_params = upload_params
+        self.total_chunks = upload_params["resumableTotalChunks"]
+        self.s3_bucket = s3_bucket
+        # The upload param holding the S3 key, which differs between endpoints
+        self.s3_key_param = s3_key_param
+        self.manifest = manifest
+        self.probe = probe
+        # Whole file digests, updated as `file_chunks` reads the file
+        self.digests = digests
+        self.chunks: List[ChunkResult] = []
+        self.error: Optional[Exception] = None
+        self.start = time.perf_counter()
 
+    def result(self) -> UploadResult:
+        """
+        Returns the `UploadResult` of a completed upload, or raises the error that stopped it.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.manifest is not None:
+            self.manifest.delete()
+
+        s3_key = self.upload_params[self.s3_key_param]
+        s3_uri = f"s3://{self.s3_bucket}/{s3_key}"
+        logging.info(f"Upload to s3 complete: {s3_uri}")
+
+        return UploadResult(
+            s3_key=s3_key,
+            s3_uri=s3_uri,
+            chunk_size=self.upload_params["resumableChunkSize"],
+            total_size=self.upload_params["resumableTotalSize"],
+            elapsed=time.perf_counter() - self.start,
+            chunks=sorted(self.chunks, key=lambda chunk: chunk.chunk_number),
+            **self._hexdigests(),
+        )
+
+    def file_checksum_params(self) -> dict:
+        """
+        Upload params carrying the whole file digests, once the whole file has been read.
+        """
+        digests = self._hexdigests()
+        return {"fileMd5": digests["md5"], "fileSha256": digests["sha256"]}
 
-def _delete_temp_chunks(temp_file_paths_list: list):
+    def _hexdigests(self) -> dict:
+        if self.digests is None:
+            return {}
+        return {name: digest.hexdigest() for name, digest in self.digests.items()}
+
+
+class _UploadManifest:
     """
-    Deletes the temporary chunks that were uploaded
+    A small local record of an upload in progress: the upload params used (which fix
+    the S3 key) and the chunk numbers posted so far. Kept as json in `manifest_dir`,
+    named by a hash of the file's identity and the upload settings.
     """
-    for file in temp_file_paths_list:
-        os.remove(file)
+
+    def __init__(self, path: Path, upload_params: dict, completed=(), resumed=False):
+        self.path = path
+        self.upload_params = upload_params
+        self.completed = set(completed)
+        # True if this manifest was left behind by an earlier attempt
+        self.resumed = resumed
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load_or_create(
+        manifest_dir: Path,
+        file_path: Path,
+        upload_url: str,
+        upload_params: dict,
+    ) -> "_UploadManifest":
+        """
+        Load the manifest of an earlier attempt at this upload, or start a new one.
+        """
+        # Params that are timestamped, or that depend on a (possibly adaptively picked)
+        # chunk size, differ between attempts so don't identify an upload. A resumed
+        # upload carries on with the chunk size of the earlier attempt.
+        settings = {
+            k: v
+            for k, v in upload_params.items()
+            if k
+            not in (
+                "resumableIdentifier",
+                "resumableFilename",
+                "resumableChunkSize",
+                "resumableTotalChunks",
+            )
+        }
+        key = json.dumps(
+            [_file_identity(file_path), upload_url, settings], sort_keys=True
+        )
+        path = manifest_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+        if path.exists():
+            with open(path) as f:
+                saved = json.load(f)
+            return _UploadManifest(
+                path, saved["upload_params"], saved["completed"], resumed=True
+            )
+
+        manifest = _UploadManifest(path, upload_params)
+        manifest._save()
+        return manifest
+
+    def mark_done(self, chunk_number: int):
+        """
+        Record a chunk as posted.
+        """
+        with self._lock:
+            self.completed.add(chunk_number)
+            self._save()
+
+    def delete(self):
+        """
+        Remove the manifest once the upload is complete.
+        """
+        self.path.unlink(missing_ok=True)
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so an interrupted write never leaves a corrupt manifest
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "upload_params": self.upload_params,
+                    "completed": sorted(self.completed),
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def _file_identity(file_path: Path, sample_size: int = 1048576) -> dict:
+    """
+    Identifies a file by its path, size, modification time and a hash of its first
+    and last `sample_size` bytes (hashing the whole file would mean an extra full read).
+    """
+    stat = os.stat(file_path)
+    sample_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        sample_hash.update(f.read(sample_size))
+        f.seek(max(stat.st_size - sample_size, 0))
+        sample_hash.update(f.read(sample_size))
+    return {
+        "path": str(Path(file_path).absolute()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sample_sha256": sample_hash.hexdigest(),
+    }
@@ -0,0 +1,271 @@
+import codecs
+import json
+import re
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Union
+
+# The next character that isn't whitespace
+_NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+# The next whole string, or character that opens or closes an array or object. A string
+# cut off by the end of the buffer matches without its closing quote (group 1).
+_CONTAINER_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*(")?|[\[\]{}]', re.DOTALL)
+# A whole string
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# The next character that could end (or escape) a string
+_STRING_SPECIAL = re.compile(r'["\\]')
+# The next character that ends a number, true, false or null
+_SCALAR_END = re.compile(r"[,\]} \t\r\n]")
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_items(
+    source: Union[BinaryIO, Iterable[bytes]],
+    pointer: str = "",
+    chunk_size: int = 65536,
+) -> Iterator[Any]:
+    """
+    Incrementally parse a JSON document, yielding each item of the array found at the
+    JSON pointer `pointer` (RFC 6901, e.g. "/dimensions/0/options"; "" is the whole
+    document) as it is parsed. If the pointer leads to an object rather than an array,
+    (key, value) pairs are yielded.
+
+    `source` is a binary file-like object or an iterator of bytes of UTF-8 encoded JSON,
+    read `chunk_size` bytes at a time, so peak memory is proportional to the largest
+    single item rather than the whole document. The rest of the document is not read
+    once the last item is yielded.
+
+    Raises a KeyError if the pointer isn't found in the document, and a ValueError if
+    the document is not valid JSON.
+    """
+    if hasattr(source, "read"):
+        read = lambda: source.read(chunk_size)  # noqa: E731
+    else:
+        chunks = iter(source)
+        read = lambda: next(chunks, b"")  # noqa: E731
+
+    scanner = _Scanner(read)
+    for token in _parse_pointer(pointer):
+        _descend(scanner, token, pointer)
+
+    start = scanner.peek()
+    if start == "[":
+        for _ in _iter_array(scanner):
+            yield scanner.capture_value()
+    elif start == "{":
+        for key in _iter_object(scanner):
+            yield key, scanner.capture_value()
+    else:
+        raise ValueError(f"Expected an array or object at '{pointer}'")
+
+
+def _parse_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"JSON pointers must start with '/', got '{pointer}'")
+    return [t.replace("~1", "/").replace("~0", "~") for t in pointer[1:].split("/")]
+
+
+def _descend(scanner: "_Scanner", token: str, pointer: str):
+    """
+    Move the scanner to the start of the value at `token` within the current value.
+    """
+    start = scanner.peek()
+    if start == "{":
+        for key in _iter_object(scanner):
+            if key == token:
+                return
+            scanner.skip_value()
+    elif start == "[" and token.isdigit():
+        for index, _ in enumerate(_iter_array(scanner)):
+            if index == int(token):
+                return
+            scanner.skip_value()
+    raise KeyError(f"'{pointer}' was not found in the JSON document")
+
+
+def _iter_array(scanner: "_Scanner") -> Iterator[None]:
+    """
+    Step through an array, yielding once for each item. The caller must consume exactly
+    one value (via `skip_value()` or `capture_value()`) each time.
+    """
+    scanner.expect("[")
+    if scanner.peek() == "]":
+        scanner.advance()
+        return
+    while True:
+        yield
+        separator = scanner.peek()
+        scanner.advance()
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError("Invalid JSON, expected ',' or ']' in an array")
+
+
+def _iter_object(scanner: "_Scanner") -> Iterator[str]:
+    """
+    Step through an object, yielding each key. The caller must consume exactly one value
+    (via `skip_value()` or `capture_value()`) each time.
+    """
+    scanner.expect("{")
+    if scanner.peek() == "}":
+        scanner.advance()
+        return
+    while True:
+        key = scanner.read_string()
+        scanner.expect(":")
+        yield key
+        separator = scanner.peek()
+        scanner.advance()
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError("Invalid JSON, expected ',' or '}' in an object")
+
+
+class _Scanner:
+    """
+    Moves through a JSON document held in a sliding buffer of decoded text, skipping or
+    capturing whole values. Only the value being captured (or the current chunk) is held
+    in memory.
+    """
+
+    def __init__(self, read: Callable[[], bytes]):
+        self._read = read
+        # Handles characters split between chunks, and skips any byte order mark
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.position = 0
+        # Where the value being captured starts, which must be kept in the buffer
+        self._mark = None
+
+    def _fill(self) -> bool:
+        """
+        Read the next chunk into the buffer, dropping what has been consumed. Returns
+        False at the end of the document.
+        """
+        data = self._read()
+        if not data:
+            return False
+        data = self._text_decoder.decode(data)
+        keep = self.position if self._mark is None else self._mark
+        keep = min(keep, len(self.buffer))
+        self.buffer = self.buffer[keep:] + data
+        self.position -= keep
+        if self._mark is not None:
+            self._mark -= keep
+        return True
+
+    def _search(self, pattern: "re.Pattern") -> "re.Match":
+        while True:
+            match = pattern.search(self.buffer, self.position)
+            if match is not None:
+                return match
+            self.position = max(self.position, len(self.buffer))
+            if not self._fill():
+                return None
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character, without consuming it ("" at the
+        end).
+        """
+        match = self._search(_NON_WHITESPACE)
+        if match is None:
+            return ""
+        self.position = match.start()
+        return match.group()
+
+    def advance(self):
+        self.position += 1
+
+    def expect(self, character: str):
+        if self.peek() != character:
+            raise ValueError(f"Invalid JSON, expected '{character}'")
+        self.advance()
+
+    def read_string(self) -> str:
+        if self.peek() != '"':
+            raise ValueError("Invalid JSON, expected a string")
+        self._mark = self.position
+        self._skip_string()
+        text = self.buffer[self._mark : self.position]
+        self._mark = None
+        return json.loads(text)
+
+    def capture_value(self) -> Any:
+        """
+        Parse and return the next value.
+        """
+        start = self.peek()
+        # Parse in place where the value ends within the buffer. A value reaching the
+        # end of the buffer may continue in the next chunk, so is scanned to its end
+        # first. So is any number, true, false or null, as one cut short by the end of
+        # the buffer ("12." or "1e") can still parse, and end before the buffer does.
+        if start in ('"', "[", "{"):
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer):
+                    self.position = end
+                    return value
+            except ValueError:
+                pass
+        self._mark = self.position
+        self.skip_value()
+        text = self.buffer[self._mark : self.position]
+        self._mark = None
+        return json.loads(text)
+
+    def skip_value(self):
+        """
+        Move past the next value without parsing it.
+        """
+        start = self.peek()
+        if start == '"':
+            self._skip_string()
+        elif start in ("[", "{"):
+            self._skip_container()
+        elif start == "":
+            raise ValueError("Invalid JSON, unexpected end of document")
+        else:
+            match = self._search(_SCALAR_END)
+            self.position = match.start() if match is not None else len(self.buffer)
+
+    def _skip_string(self):
+        match = _STRING.match(self.buffer, self.position)
+        if match is not None:
+            self.position = match.end()
+            return
+        # The string continues past the buffer
+        self.advance()
+        while True:
+            match = self._search(_STRING_SPECIAL)
+            if match is None:
+                raise ValueError("Invalid JSON, unterminated string")
+            if match.group() == '"':
+                self.position = match.end()
+                return
+            # Skip the escaped character, which may not have been read yet
+            self.position = match.end()
+            if self.position >= len(self.buffer) and not self._fill():
+                raise ValueError("Invalid JSON, unterminated string")
+            self.advance()
+
+    def _skip_container(self):
+        self.advance()
+        depth = 1
+        while depth:
+            match = self._search(_CONTAINER_TOKEN)
+            if match is None:
+                raise ValueError("Invalid JSON, unexpected end of document")
+            token = match.group()
+            if token[:1] == '"':
+                if match.group(1) is None:
+                    self.position = match.start()
+                    self._skip_string()
+                else:
+                    self.position = match.end()
+                continue
+            depth += 1 if token in ("[", "{") else -1
+            self.position = match.end()
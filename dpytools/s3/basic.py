@@ -1,17 +1,141 @@
+import base64
+import bz2
+import codecs
+import gzip
+import hashlib
+import io
 import json
+import logging
+import lzma
+import os
+import re
+import shutil
 import tarfile
 import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from math import ceil
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+import backoff
 import boto3
+from botocore.client import BaseClient
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
+from dpytools.json.stream import iter_json_items
 
-def _get_s3_client(profile_name):
-    client = boto3.Session(profile_name=profile_name).client("s3")
+# S3 clients shared by every function in this module, keyed by profile, region and
+# endpoint. Building a session and client (and resolving its credentials) costs far
+# more than most of the requests made with it. boto3 clients are thread-safe once
+# built, but sessions are not, so clients are built one at a time under the lock.
+_s3_clients: Dict[Tuple[Optional[str], ...], BaseClient] = {}
+_s3_clients_lock = threading.Lock()
+_s3_client_config: Optional[Config] = None
+
+# Object metadata (from HEAD requests and listings) keyed by bucket and key, then by
+# profile, with when it was fetched. See dpytools.s3.bulk.head_s3_objects().
+_s3_metadata: Dict[Tuple[str, str], Dict[Optional[str], Tuple[float, dict]]] = {}
+_s3_metadata_lock = threading.Lock()
+_S3_METADATA_MAX_ENTRIES = 100000
+
+
+def _get_s3_client(
+    profile_name: Optional[str] = None,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+) -> BaseClient:
+    # Region and endpoint can also be set by the environment, so changing them there
+    # also gets a new client
+    region_name = (
+        region_name
+        or os.environ.get("AWS_REGION")
+        or os.environ.get("AWS_DEFAULT_REGION")
+    )
+    endpoint_url = (
+        endpoint_url
+        or os.environ.get("AWS_ENDPOINT_URL_S3")
+        or os.environ.get("AWS_ENDPOINT_URL")
+    )
+    key = (profile_name, region_name, endpoint_url)
+    with _s3_clients_lock:
+        client = _s3_clients.get(key)
+        if client is None:
+            client = boto3.Session(profile_name=profile_name).client(
+                "s3",
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=_s3_client_config,
+            )
+            _s3_clients[key] = client
     return client
 
 
+def set_s3_client_config(config: Optional[Config]):
+    """
+    Set the botocore `Config` (e.g. `max_pool_connections`, `retries`) used by the
+    S3 clients of this module. Clients already built are discarded, so that the
+    config applies to every request from now on.
+    """
+    global _s3_client_config
+    with _s3_clients_lock:
+        _s3_client_config = config
+        _s3_clients.clear()
+
+
+def reset_s3_client_cache():
+    """
+    Discard the cached S3 clients, so the next request builds a new client and
+    resolves its credentials afresh (e.g. after credentials have been rotated).
+    """
+    with _s3_clients_lock:
+        _s3_clients.clear()
+
+
+def clear_s3_metadata_cache():
+    """
+    Discard the object metadata cached by `dpytools.s3.bulk.head_s3_objects()` and
+    `dpytools.s3.bulk.list_s3_objects()`.
+    """
+    with _s3_metadata_lock:
+        _s3_metadata.clear()
+
+
+def _cache_s3_metadata(
+    profile_name: Optional[str], bucket_name: str, key: str, metadata: dict
+):
+    with _s3_metadata_lock:
+        # Re-inserted, so the dict stays in the order objects were fetched
+        by_profile = _s3_metadata.pop((bucket_name, key), {})
+        by_profile[profile_name] = (time.monotonic(), metadata)
+        _s3_metadata[(bucket_name, key)] = by_profile
+        while len(_s3_metadata) > _S3_METADATA_MAX_ENTRIES:
+            del _s3_metadata[next(iter(_s3_metadata))]
+
+
+def _cached_s3_metadata(
+    profile_name: Optional[str], bucket_name: str, key: str, max_age: float
+) -> Optional[dict]:
+    with _s3_metadata_lock:
+        entry = _s3_metadata.get((bucket_name, key), {}).get(profile_name)
+    if entry is None or time.monotonic() - entry[0] > max_age:
+        return None
+    return entry[1]
+
+
+def _forget_s3_metadata(bucket_name: str, key: str):
+    """
+    Drop any cached metadata for an object, once it has been written.
+    """
+    with _s3_metadata_lock:
+        _s3_metadata.pop((bucket_name, key), None)
+
+
 def get_s3_object(object_name: str, profile_name: Optional[str] = None) -> dict:
     """
     Given an s3 object identifier, i.e "my-bucket/things/file.txt" returns a dictionary which
@@ -25,44 +149,371 @@ def get_s3_object(object_name: str, profile_name: Optional[str] = None) -> dict:
     return client.get_object(Bucket=bucket_name, Key=key)
 
 
-def read_s3_file_content(object_name: str, profile_name: Optional[str] = None) -> bytes:
+def head_s3_object(object_name: str, profile_name: Optional[str] = None) -> dict:
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.txt" returns the boto3 aws
+    representation of the object's metadata (size, ETag etc.), without fetching its content.
+
+    Please see "Response Syntax" here:
+    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3/client/head_object.html
+    """
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    return client.head_object(Bucket=bucket_name, Key=key)
+
+
+def iter_s3_object_ranges(
+    object_name: str,
+    range_size: int = 5242880,
+    max_workers: int = 4,
+    profile_name: Optional[str] = None,
+    total_size: Optional[int] = None,
+    if_match: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.txt" yields the content of the
+    object in order, in pieces of `range_size` bytes (the last piece may be smaller).
+
+    Each piece is fetched with its own ranged GET. Up to `max_workers` pieces are fetched
+    concurrently ahead of the one being yielded, so no more than that are held in memory
+    at once.
+
+    `total_size` and `if_match` (the object's ETag) are looked up with a HEAD request unless
+    given. Every range is fetched on condition that the ETag still matches, so the pieces
+    can't come from different versions of an object that is overwritten part way through.
+    """
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    if total_size is None:
+        head = client.head_object(Bucket=bucket_name, Key=key)
+        total_size = head["ContentLength"]
+        if if_match is None:
+            if_match = head["ETag"]
+    conditions = {"IfMatch": if_match} if if_match is not None else {}
+
+    def fetch_range(start: int) -> bytes:
+        end = min(start + range_size, total_size) - 1
+        response = client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}", **conditions
+        )
+        return response["Body"].read()
+
+    starts = iter(range(0, total_size, range_size))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = deque(
+            executor.submit(fetch_range, start) for start in islice(starts, max_workers)
+        )
+        while pending:
+            data = pending.popleft().result()
+            # Top the prefetch back up before handing over the piece
+            for start in islice(starts, 1):
+                pending.append(executor.submit(fetch_range, start))
+            yield data
+    finally:
+        # Stop fetching if the consumer stops early or a fetch fails
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_s3_file_content(
+    object_name: str,
+    profile_name: Optional[str] = None,
+    cache=None,
+    decompress: bool = False,
+) -> bytes:
     """
     Given an s3 object identifer, i.e "my-bucket/things/file.txt" fetches then read()'s
     the body (content) of s3 object (file).
+
+    With `decompress=True`, the content is decompressed as it downloads, as for
+    `iter_s3_chunks()`, so only the decompressed content is held in memory.
+
+    Pass a `dpytools.s3.cache.S3DiskCache` as `cache` to read the content through it.
+    """
+    if cache is not None:
+        content = cache.read(object_name, profile_name=profile_name)
+        if not decompress:
+            return content
+        # The cache holds the content as stored, so it is decompressed by extension
+        with _decompressing_reader(io.BytesIO(content), object_name) as reader:
+            return reader.read()
+    if not decompress:
+        s3_object = get_s3_object(object_name, profile_name=profile_name)
+        return s3_object["Body"].read()
+    with _open_s3_body(object_name, profile_name, decompress=True) as reader:
+        return reader.read()
+
+
+def read_s3_range(
+    object_name: str,
+    start: int,
+    end: Optional[int] = None,
+    profile_name: Optional[str] = None,
+) -> bytes:
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.txt" returns the bytes of the
+    object from `start` up to, but not including, `end` (like slicing `content[start:end]`),
+    fetched with a single ranged GET. Without an `end`, reads to the end of the object.
+    """
+    if end is not None and end <= start:
+        return b""
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    byte_range = f"bytes={start}-{end - 1}" if end is not None else f"bytes={start}-"
+    response = client.get_object(Bucket=bucket_name, Key=key, Range=byte_range)
+    return response["Body"].read()
+
+
+def iter_s3_chunks(
+    object_name: str,
+    chunk_size: int = 1048576,
+    profile_name: Optional[str] = None,
+    decompress: bool = False,
+) -> Iterator[bytes]:
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.csv.gz" yields its content
+    as it downloads, in chunks of up to `chunk_size` bytes, so only one chunk is held in
+    memory at a time.
+
+    With `decompress=True`, the content is decompressed as it is read: according to the
+    object's extension (.gz, .tgz, .bz2, .xz or .zst), or as gzip if the object has a
+    `Content-Encoding` of gzip. Reading .zst objects needs the `zstandard` package.
+    """
+    with _open_s3_body(object_name, profile_name, decompress=decompress) as reader:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _open_s3_body(
+    object_name: str, profile_name: Optional[str], decompress: bool
+) -> BinaryIO:
+    """
+    GET an object, returning its body as a stream, decompressed as it is read if
+    `decompress` is True (see `iter_s3_chunks()`).
+    """
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    response = client.get_object(Bucket=bucket_name, Key=key)
+    if not decompress:
+        return response["Body"]
+    name = key
+    if response.get("ContentEncoding") == "gzip" and not key.endswith(".gz"):
+        name = key + ".gz"
+    return _decompressing_reader(response["Body"], name)
+
+
+def iter_s3_lines(
+    object_name: str,
+    encoding: str = "utf-8",
+    profile_name: Optional[str] = None,
+    decompress: bool = False,
+    chunk_size: int = 1048576,
+) -> Iterator[str]:
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.csv" yields each line of
+    its content (without the line ending) as it downloads, decoded with `encoding`.
+
+    The content is read `chunk_size` bytes at a time, so memory use is bounded by the
+    chunk size and the longest line. `decompress` is as for `iter_s3_chunks()`.
     """
-    s3_object = get_s3_object(object_name, profile_name=profile_name)
-    return s3_object["Body"].read()
+    decoder = codecs.getincrementaldecoder(encoding)()
+    partial_line = ""
+    for chunk in iter_s3_chunks(
+        object_name, chunk_size, profile_name=profile_name, decompress=decompress
+    ):
+        lines = (partial_line + decoder.decode(chunk)).split("\n")
+        partial_line = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+
+    partial_line += decoder.decode(b"", final=True)
+    if partial_line:
+        yield partial_line[:-1] if partial_line.endswith("\r") else partial_line
 
 
 def read_s3_file_content_as_dict(
-    object_name: str, profile_name: Optional[str] = None
+    object_name: str, profile_name: Optional[str] = None, cache=None
 ) -> dict:
     """
     Given an s3 object identifer for a json file, i.e "my-bucket/things/file.json"
     fetches the content of the file as a python dictionary.
+
+    Compressed json files, i.e "my-bucket/things/file.json.gz" (or .bz2, .xz or .zst), and
+    those with a `Content-Encoding` of gzip, are decompressed as they download.
+
+    Pass a `dpytools.s3.cache.S3DiskCache` as `cache` to read the content through it.
+    """
+    name = object_name
+    if name.endswith(COMPRESSED_EXTENSIONS):
+        name = name.rsplit(".", 1)[0]
+    if not name.endswith(".json"):
+        raise ValueError(
+            "Object name must end with '.json' (or a compressed '.json', i.e '.json.gz')"
+        )
+    if cache is not None:
+        s3_file_content = read_s3_file_content(
+            object_name, profile_name=profile_name, cache=cache, decompress=True
+        )
+        return json.loads(s3_file_content.decode("utf-8"))
+    with _open_s3_body(object_name, profile_name, decompress=True) as reader:
+        return json.load(reader)
+
+
+def iter_s3_json_items(
+    object_name: str,
+    pointer: str = "",
+    profile_name: Optional[str] = None,
+    decompress: bool = False,
+    chunk_size: int = 1048576,
+) -> Iterator[Any]:
+    """
+    Given an s3 object identifier for a json file, i.e "my-bucket/things/file.json"
+    yields each item of the array at the JSON pointer `pointer` (e.g "/observations";
+    "" for a document that is an array) as it downloads and is parsed, rather than
+    loading the whole document. For an object rather than an array, (key, value) pairs
+    are yielded.
+
+    Peak memory is bounded by `chunk_size` and the largest single item. `decompress` is
+    as for `iter_s3_chunks()`. See `dpytools.json.stream.iter_json_items()`.
     """
-    if not object_name.endswith(".json"):
-        raise ValueError("Object name must end with '.json'")
-    s3_file_content = read_s3_file_content(object_name, profile_name=profile_name)
-    return json.loads(s3_file_content.decode("utf-8"))
+    yield from iter_json_items(
+        iter_s3_chunks(
+            object_name, chunk_size, profile_name=profile_name, decompress=decompress
+        ),
+        pointer=pointer,
+    )
 
 
 def download_s3_file_content_to_local(
-    object_name: str, local_file: str, profile_name: Optional[str] = None
+    object_name: str,
+    local_file: Union[str, Path],
+    profile_name: Optional[str] = None,
+    part_size: int = 8388608,
+    max_workers: int = 8,
+    multipart_threshold: int = 16777216,
+    buffer_size: int = 1048576,
+    verify: bool = False,
 ):
     """
-    Download the file represented by a given s3 object to the local path provided
+    Download the file represented by a given s3 object to the local path provided.
+
+    The content is written as it arrives, `buffer_size` bytes at a time, in binary mode,
+    so memory use does not grow with the size of the object. Objects larger than
+    `multipart_threshold` bytes are downloaded as parts of `part_size` bytes, up to
+    `max_workers` of them at once, each with its own ranged GET written at its offset
+    in the file. The content is written to a temporary file next to `local_file`, which
+    replaces it once the download is complete, so a failed download leaves any existing
+    `local_file` as it was.
+
+    With `verify=True`, the content is checked against the object's ETag (when that is
+    an md5 of the content) and any additional checksum (SHA256, SHA1, CRC32 etc.) it was
+    uploaded with. The checksums are computed as the content arrives, so the file is
+    never read back; a mismatch raises a ValueError. Parts are checked in order, so up to
+    `2 * max_workers` of them may be held in memory.
     """
-    s3_file_content = read_s3_file_content(object_name, profile_name=profile_name)
-    with open(local_file, "w") as f:
-        f.write(s3_file_content.decode("utf-8"))
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    local_file = Path(local_file)
+
+    # Every request must get the same version of the object
+    extra_args = {"ChecksumMode": "ENABLED"} if verify else {}
+    head = client.head_object(Bucket=bucket_name, Key=key, **extra_args)
+    total_size = head["ContentLength"]
+    etag = head["ETag"]
+    checksums = _checksums_to_verify(client, object_name, head) if verify else []
+
+    tmp_file = local_file.with_name(
+        f"{local_file.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        if total_size <= multipart_threshold:
+            response = client.get_object(Bucket=bucket_name, Key=key, IfMatch=etag)
+            with open(tmp_file, "wb") as f:
+                for data in response["Body"].iter_chunks(buffer_size):
+                    f.write(data)
+                    for checksum in checksums:
+                        checksum.update(data)
+        else:
+
+            def download_part(start: int) -> Optional[bytes]:
+                end = min(start + part_size, total_size) - 1
+                part = client.get_object(
+                    Bucket=bucket_name,
+                    Key=key,
+                    Range=f"bytes={start}-{end}",
+                    IfMatch=etag,
+                )
+                received = []
+                with open(tmp_file, "r+b") as f:
+                    f.seek(start)
+                    for data in part["Body"].iter_chunks(buffer_size):
+                        f.write(data)
+                        if verify:
+                            received.append(data)
+                # Returned to be checksummed in order, with the parts before it
+                return b"".join(received) if verify else None
+
+            # Size the file up front so each part can be written in place
+            with open(tmp_file, "wb") as f:
+                f.truncate(total_size)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                starts = iter(range(0, total_size, part_size))
+                pending = deque(
+                    executor.submit(download_part, start)
+                    for start in islice(starts, max_workers * 2)
+                )
+                try:
+                    while pending:
+                        data = pending.popleft().result()
+                        for checksum in checksums:
+                            checksum.update(data)
+                        for start in islice(starts, 1):
+                            pending.append(executor.submit(download_part, start))
+                finally:
+                    for future in pending:
+                        future.cancel()
+        if verify:
+            _verify_checksums(object_name, checksums)
+        os.replace(tmp_file, local_file)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
 
 
 def upload_local_file_to_s3(
-    local_file: Union[str, Path], object_name: str, profile_name: Optional[str] = None
+    local_file: Union[str, Path],
+    object_name: str,
+    profile_name: Optional[str] = None,
+    part_size: int = 8388608,
+    max_workers: int = 8,
+    multipart_threshold: int = 16777216,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    verify: bool = False,
+    checksum_algorithm: Optional[str] = None,
 ):
     """
     Uploads the provided file from local to s3 as the provided object name.
+
+    Files of up to `multipart_threshold` bytes are streamed by a single PUT. Larger files
+    are sent as a multipart upload in parts of `part_size` bytes, up to `max_workers` at
+    once, so at most `max_workers` parts are held in memory. A part that fails is retried
+    on its own; if it can't be sent, the multipart upload is aborted and the error raised.
+
+    With `verify=True`, every request is sent with the md5 of its content (Content-MD5),
+    so S3 rejects (and the upload retries) any request corrupted on the way, and the
+    object's ETag is checked against the md5s once it is uploaded, raising a ValueError
+    if they don't match. The md5s are computed from the content as it is sent, so the
+    file is read only once (a file sent by a single PUT is read into memory to do so).
+
+    `checksum_algorithm` ("CRC32", "CRC32C", "SHA1" or "SHA256") has S3 check, and keep,
+    an additional checksum of the content, which botocore computes as it is sent, and a
+    download with `verify=True` checks again.
+
+    `progress_callback`, if given, is called with the number of bytes sent each time
+    the file, or one of its parts, has been uploaded.
     """
     if not isinstance(local_file, Path):
         local_file = Path(local_file)
@@ -70,23 +521,353 @@ def upload_local_file_to_s3(
     assert local_file.exists(), f"The file {local_file.absolute()} does not exist."
     client = _get_s3_client(profile_name)
 
-    boto3.setup_default_session(profile_name=profile_name)
     bucket_name, key = object_name.split("/", 1)
-    with open(local_file) as f:
-        client.put_object(Body=f.read(), Bucket=bucket_name, Key=key)
+    extra_args = {"ChecksumAlgorithm": checksum_algorithm} if checksum_algorithm else {}
+    total_size = local_file.stat().st_size
+    if total_size <= multipart_threshold:
+        with open(local_file, "rb") as f:
+            if verify:
+                data = f.read()
+                md5 = hashlib.md5(data)
+                response = client.put_object(
+                    Body=data,
+                    Bucket=bucket_name,
+                    Key=key,
+                    ContentMD5=base64.b64encode(md5.digest()).decode(),
+                    **extra_args,
+                )
+            else:
+                response = client.put_object(
+                    Body=f, Bucket=bucket_name, Key=key, **extra_args
+                )
+        _forget_s3_metadata(bucket_name, key)
+        if verify:
+            _verify_uploaded_etag(object_name, response, md5.hexdigest())
+        if progress_callback is not None:
+            progress_callback(total_size)
+        return
+
+    # S3 allows at most 10,000 parts
+    part_size = max(part_size, ceil(total_size / 10000))
+
+    def read_and_upload_part(part_number: int) -> Tuple[dict, int]:
+        with open(local_file, "rb") as f:
+            f.seek((part_number - 1) * part_size)
+            data = f.read(part_size)
+        part_args = dict(extra_args)
+        if verify:
+            md5s[part_number] = hashlib.md5(data).digest()
+            part_args["ContentMD5"] = base64.b64encode(md5s[part_number]).decode()
+        part = _upload_part(
+            client, bucket_name, key, upload_id, part_number, data, **part_args
+        )
+        return part, len(data)
+
+    upload_id = client.create_multipart_upload(
+        Bucket=bucket_name, Key=key, **extra_args
+    )["UploadId"]
+    md5s: Dict[int, bytes] = {}
+    try:
+        parts = []
+        # Parts are only read once a worker is free, to bound memory use
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            part_numbers = iter(range(1, ceil(total_size / part_size) + 1))
+            pending = {
+                executor.submit(read_and_upload_part, part_number)
+                for part_number in islice(part_numbers, max_workers)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    part, bytes_sent = future.result()
+                    parts.append(part)
+                    if progress_callback is not None:
+                        progress_callback(bytes_sent)
+                    for part_number in islice(part_numbers, 1):
+                        pending.add(executor.submit(read_and_upload_part, part_number))
+
+        response = client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+        )
+        _forget_s3_metadata(bucket_name, key)
+    except BaseException:
+        # An incomplete upload would otherwise keep its parts (and their storage costs)
+        logging.error(f"Upload of {local_file} to {object_name} failed, aborting")
+        client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+
+    if verify:
+        # A multipart ETag is the md5 of the parts' md5s, and the number of parts
+        combined = hashlib.md5(b"".join(md5s[n] for n in sorted(md5s)))
+        _verify_uploaded_etag(
+            object_name, response, f"{combined.hexdigest()}-{len(md5s)}"
+        )
+
+
+def _is_fatal_s3_error(err: Exception) -> bool:
+    """
+    Client errors (other than timeouts and throttling) will fail however many
+    times they are retried.
+    """
+    if not isinstance(err, ClientError):
+        return False
+    # A body corrupted on its way to S3 fails its checksum, and can be sent again
+    if err.response.get("Error", {}).get("Code") == "BadDigest":
+        return False
+    status = err.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def _log_retry(details):
+    logging.error(f"Request failed, retrying... Attempt #{details['tries']}")
+
+
+@backoff.on_exception(
+    backoff.expo,
+    (BotoCoreError, ClientError),
+    max_time=30,
+    giveup=_is_fatal_s3_error,
+    on_backoff=_log_retry,
+)
+def _upload_part(
+    client: BaseClient,
+    bucket_name: str,
+    key: str,
+    upload_id: str,
+    part_number: int,
+    data: bytes,
+    **extra_args,
+) -> dict:
+    """
+    Upload one part of a multipart upload, retrying transient failures. Returns the
+    part as it is listed when completing the upload.
+    """
+    response = client.upload_part(
+        Body=data,
+        Bucket=bucket_name,
+        Key=key,
+        PartNumber=part_number,
+        UploadId=upload_id,
+        **extra_args,
+    )
+    part = {"ETag": response["ETag"], "PartNumber": part_number}
+    checksum_algorithm = extra_args.get("ChecksumAlgorithm")
+    if checksum_algorithm:
+        # Completing the upload needs the additional checksum of every part
+        name = f"Checksum{checksum_algorithm}"
+        part[name] = response[name]
+    return part
+
+
+# Additional checksums S3 can keep for an object. CRC32C and CRC64NVME are only
+# computed if the optional awscrt package is installed (pip install "boto3[crt]").
+CHECKSUM_ALGORITHMS = ("SHA256", "SHA1", "CRC32", "CRC32C", "CRC64NVME")
+
+
+def _checksums_to_verify(
+    client: BaseClient, object_name: str, response: dict
+) -> List["_StreamedChecksum"]:
+    """
+    The checksums of an object (given the response to a HEAD or GET of all of it) that
+    can be computed from its content as it streams: its ETag, if that is the md5 of its
+    content (it isn't for objects encrypted with SSE-KMS or SSE-C), and any additional
+    checksum.
+    """
+    # Checksums of a multipart upload are composite (see below), unless S3 says not
+    etag = response["ETag"].strip('"')
+    composite = "-" in etag and response.get("ChecksumType") != "FULL_OBJECT"
+    expected = {}
+    encryption = response.get("ServerSideEncryption", "")
+    if not encryption.startswith("aws:kms") and "SSECustomerAlgorithm" not in response:
+        expected["MD5"] = etag
+    for algorithm in CHECKSUM_ALGORITHMS:
+        value = response.get(f"Checksum{algorithm}")
+        if value is None:
+            continue
+        try:
+            _new_digest(algorithm)
+        except ImportError:
+            logging.warning(
+                f"The {algorithm} checksum of {object_name} can't be checked without "
+                "the awscrt package"
+            )
+            continue
+        if composite and "-" not in value:
+            # Some responses leave off the number of parts, which the ETag has too
+            value = f"{value}-{etag.rpartition('-')[2]}"
+        expected[algorithm] = value
+
+    # Checksums of multipart uploads are made from a checksum of each part uploaded
+    # (their value ends "-" and the number of parts), so need to know the part size
+    part_size = None
+    if any("-" in value for value in expected.values()):
+        bucket_name, key = object_name.split("/", 1)
+        part_size = client.head_object(Bucket=bucket_name, Key=key, PartNumber=1)[
+            "ContentLength"
+        ]
+    checksums = []
+    for algorithm, value in expected.items():
+        if "-" in value and ceil(response["ContentLength"] / part_size) != int(
+            value.rsplit("-", 1)[1]
+        ):
+            logging.warning(
+                f"The {algorithm} checksum of {object_name} can't be checked, as its "
+                "parts weren't uploaded at a single size"
+            )
+            continue
+        checksums.append(_StreamedChecksum(algorithm, value, part_size))
+
+    if not checksums:
+        logging.warning(f"{object_name} has no checksums that can be checked")
+    return checksums
+
+
+def _verify_checksums(object_name: str, checksums: List["_StreamedChecksum"]):
+    mismatches = [
+        f"{checksum.algorithm} {checksum.result()} (expected {checksum.expected})"
+        for checksum in checksums
+        if checksum.result() != checksum.expected
+    ]
+    if mismatches:
+        raise ValueError(
+            f"The content received for {object_name} does not match its checksums: "
+            f"{', '.join(mismatches)}"
+        )
+
+
+def _verify_uploaded_etag(object_name: str, response: dict, expected: str):
+    if response.get("ServerSideEncryption", "").startswith("aws:kms"):
+        # Objects encrypted with SSE-KMS don't have md5 based ETags
+        return
+    etag = response["ETag"].strip('"')
+    if etag != expected:
+        raise ValueError(
+            f"The ETag of {object_name} ({etag}) does not match the md5 of the content "
+            f"uploaded ({expected})"
+        )
+
+
+class _StreamedChecksum:
+    """
+    A checksum of an object's content, updated in order as the content streams, to
+    compare with the `expected` value S3 has for it: the ETag ("MD5", as hex) or an
+    additional checksum (base64).
+
+    If the expected value is of a multipart upload, i.e ends "-3", it is the checksum of
+    the checksums of each `part_size` part, followed by "-" and the number of parts.
+    """
+
+    def __init__(self, algorithm: str, expected: str, part_size: Optional[int] = None):
+        self.algorithm = algorithm
+        self.expected = expected
+        self._part_size = part_size if "-" in expected else None
+        self._part_remaining = self._part_size
+        self._part_digests: List[bytes] = []
+        self._digest = _new_digest(algorithm)
+
+    def update(self, data: bytes):
+        if self._part_size is None:
+            self._digest.update(data)
+            return
+        view = memoryview(data)
+        while view:
+            taken = view[: self._part_remaining]
+            self._digest.update(taken)
+            view = view[len(taken) :]
+            self._part_remaining -= len(taken)
+            if self._part_remaining == 0:
+                self._part_digests.append(self._digest.digest())
+                self._digest = _new_digest(self.algorithm)
+                self._part_remaining = self._part_size
+
+    def result(self) -> str:
+        if self._part_size is None:
+            return self._encode(self._digest.digest())
+        part_digests = list(self._part_digests)
+        if self._part_remaining != self._part_size:
+            part_digests.append(self._digest.digest())
+        combined = _new_digest(self.algorithm)
+        combined.update(b"".join(part_digests))
+        return f"{self._encode(combined.digest())}-{len(part_digests)}"
+
+    def _encode(self, digest: bytes) -> str:
+        if self.algorithm == "MD5":
+            return digest.hex()
+        return base64.b64encode(digest).decode()
+
+
+def _new_digest(algorithm: str):
+    """
+    A hashlib style digest for the checksum algorithm, raising an ImportError if it
+    needs the awscrt package and that isn't installed.
+    """
+    if algorithm in ("MD5", "SHA1", "SHA256"):
+        return hashlib.new(algorithm.lower())
+    return _CrcDigest(algorithm)
+
+
+class _CrcDigest:
+    """
+    The CRC checksums used by S3, with the interface of a hashlib digest.
+    """
+
+    def __init__(self, algorithm: str):
+        if algorithm == "CRC32":
+            self._crc = zlib.crc32
+        else:
+            from awscrt import checksums
+
+            if algorithm == "CRC32C":
+                self._crc = checksums.crc32c
+            else:
+                self._crc = checksums.crc64nvme
+        self._size = 8 if algorithm == "CRC64NVME" else 4
+        self._value = 0
+
+    def update(self, data: bytes):
+        self._value = self._crc(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(self._size, "big")
+
+
+# Extensions of the compressed files that can be decompressed as they are read
+COMPRESSED_EXTENSIONS = (".gz", ".tgz", ".bz2", ".xz", ".zst")
+
+# Archive extensions that decompress_s3_tar() can extract
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
 
 
 def decompress_s3_tar(
-    object_name: str, directory: Union[str, Path], profile_name: Optional[str] = None
+    object_name: str,
+    directory: Union[str, Path],
+    profile_name: Optional[str] = None,
+    stream: bool = False,
+    pattern: Optional[str] = None,
+    max_workers: int = 1,
 ):
     """
-    Given a url to an s3 object that is a tar file, decompress it
-    to the provided directory path.
+    Given a url to an s3 object that is a tar file (optionally compressed with gzip, bzip2
+    or xz), decompress it to the provided directory path.
+
+    With `stream=True` the archive is extracted as it is downloaded, without first being
+    written to a temporary file.
+
+    If a regex `pattern` is given, only the members whose names match it (via re.search)
+    are extracted. With `max_workers` above 1, files are written by a pool of that many
+    threads while the archive continues to be read.
+
+    Raises a ValueError, before writing it, for any member that would be extracted (or
+    link) outside of `directory`.
     """
 
-    if not object_name.endswith(".tar"):
+    if not object_name.endswith(TAR_EXTENSIONS):
         raise NotImplementedError(
-            f"This function currently only handles archives using the tar extension. Got {object_name}"
+            "This function currently only handles archives using the tar extension "
+            f"({', '.join(TAR_EXTENSIONS)}). Got {object_name}"
         )
 
     if isinstance(directory, str):
@@ -95,12 +876,147 @@ def decompress_s3_tar(
 
     bucket_name = object_name.split("/")[0]
     object_key = "/".join(object_name.split("/")[1:])
+    client = _get_s3_client(profile_name)
+
+    if stream:
+        body = client.get_object(Bucket=bucket_name, Key=object_key)["Body"]
+        # Members are extracted in the order they arrive, reading the body sequentially
+        with _decompressing_reader(body, object_name) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                _extract_members(tar, directory, pattern, max_workers)
+        return
 
     tmp_file = tempfile.NamedTemporaryFile()
     with open(tmp_file.name, "wb") as f:
-        client = _get_s3_client(profile_name)
         client.download_fileobj(bucket_name, object_key, f)
 
     # Decompress all the files to the directory specified.
     with tarfile.open(tmp_file.name, mode="r:*") as tar:
-        tar.extractall(directory.absolute())
+        _extract_members(tar, directory, pattern, max_workers)
+
+
+def _extract_members(
+    tar: tarfile.TarFile,
+    directory: Path,
+    pattern: Optional[str] = None,
+    max_workers: int = 1,
+    pooled_write_limit: int = 8388608,
+):
+    """
+    Extract the members of `tar` matching `pattern` to `directory`, in one pass over the
+    archive (so it works for archives opened in stream mode too).
+
+    The content of each file is read from the archive in turn, then files of up to
+    `pooled_write_limit` bytes are handed to a pool of `max_workers` threads to write.
+    At most twice `max_workers` files are held in memory waiting to be written. Larger
+    files are copied straight from the archive to disk.
+
+    As with `TarFile.extractall()`, the modes and times of directories are set once
+    everything has been written, so a read-only directory can still be extracted into.
+    """
+    root = directory.resolve()
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    directories = []
+
+    def write_file(target: Path, data: bytes, member: tarfile.TarInfo):
+        try:
+            with open(target, "wb") as f:
+                f.write(data)
+            _set_file_attributes(target, member)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        writes = deque()
+        for member in tar:
+            if pattern is not None and not re.search(pattern, member.name):
+                continue
+            target = _extraction_target(root, member)
+
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+                directories.append((target, member))
+                continue
+            if not member.isfile():
+                # Links etc. are created by tarfile. A hard link needs its target on
+                # disk (or tarfile seeks back to it, which a stream can't), so every
+                # pending write is finished first.
+                while writes:
+                    writes.popleft().result()
+                tar.extract(member, root)
+                continue
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            source = tar.extractfile(member)
+            if max_workers > 1 and member.size <= pooled_write_limit:
+                slots.acquire()
+                writes.append(
+                    executor.submit(write_file, target, source.read(), member)
+                )
+            else:
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(source, f)
+                _set_file_attributes(target, member)
+
+            # Raise a failed write without waiting for the whole archive
+            while writes and writes[0].done():
+                writes.popleft().result()
+        for write in writes:
+            write.result()
+
+    # Deepest first, so setting a directory's time isn't undone by setting a child's
+    for target, member in sorted(directories, key=lambda d: d[1].name, reverse=True):
+        _set_file_attributes(target, member)
+
+
+def _extraction_target(root: Path, member: tarfile.TarInfo) -> Path:
+    """
+    Where `member` would be extracted to under `root`, raising a ValueError if that (or,
+    for a link, what it links to) is outside `root`. Paths are resolved, so a member
+    can't escape through a link extracted before it either.
+    """
+    target = (root / member.name).resolve()
+    if target != root and root not in target.parents:
+        raise ValueError(
+            f"Refusing to extract {member.name}, it would be written outside of {root}"
+        )
+    if member.issym() or member.islnk():
+        # Symlinks are relative to their own directory, hard links to the archive root
+        base = target.parent if member.issym() else root
+        link_target = (base / member.linkname).resolve()
+        if link_target != root and root not in link_target.parents:
+            raise ValueError(
+                f"Refusing to extract {member.name}, it links outside of {root}"
+            )
+    return target
+
+
+def _set_file_attributes(target: Path, member: tarfile.TarInfo):
+    os.chmod(target, member.mode & 0o777)
+    os.utime(target, (member.mtime, member.mtime))
+
+
+def _decompressing_reader(fileobj: BinaryIO, name: str) -> BinaryIO:
+    """
+    Wraps a readable binary stream so that reading it returns the content decompressed,
+    picking the compression from the extension of `name` (the stream is returned as it
+    is if uncompressed). The stream is only read sequentially, so it needn't be seekable,
+    and data made up of several concatenated members (or frames) is read in full.
+    """
+    if name.endswith((".gz", ".tgz")):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if name.endswith(".bz2"):
+        return bz2.BZ2File(fileobj, mode="rb")
+    if name.endswith(".xz"):
+        return lzma.LZMAFile(fileobj, mode="rb")
+    if name.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                f"Reading {name} needs the zstandard package: pip install zstandard"
+            ) from None
+        return zstandard.ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True
+        )
+    return fileobj
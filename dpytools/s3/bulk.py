@@ -0,0 +1,427 @@
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from math import ceil
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+
+from dpytools.s3.basic import (
+    _cache_s3_metadata,
+    _cached_s3_metadata,
+    _get_s3_client,
+    download_s3_file_content_to_local,
+    upload_local_file_to_s3,
+)
+
+# The thread pool shared by every bulk operation. Its default size matches the default
+# connection pool of a botocore client, so that workers don't wait on connections.
+_BULK_MAX_WORKERS = 10
+_bulk_executor: Optional[ThreadPoolExecutor] = None
+_bulk_executor_lock = threading.Lock()
+
+
+@dataclass
+class SyncResult:
+    """
+    The outcome of a sync: the S3 keys of the objects that were copied, and of those
+    that were skipped because they were already up to date.
+    """
+
+    transferred: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+
+def set_s3_bulk_max_workers(max_workers: int):
+    """
+    Set the number of threads shared by the bulk operations (default 10). For more than
+    10, also raise `max_pool_connections` with `dpytools.s3.basic.set_s3_client_config()`.
+    """
+    global _BULK_MAX_WORKERS, _bulk_executor
+    with _bulk_executor_lock:
+        _BULK_MAX_WORKERS = max_workers
+        # Operations already running keep the old pool, whose threads exit once it is
+        # no longer used, rather than it being shut down under them
+        _bulk_executor = None
+
+
+def list_s3_objects(
+    prefix_name: str, profile_name: Optional[str] = None, page_size: int = 1000
+) -> Iterator[dict]:
+    """
+    Given an s3 bucket, or a bucket and key prefix, i.e "my-bucket/things/" yields the
+    boto3 aws representation of every object under it (its `Key`, `Size`, `ETag` etc.).
+
+    Objects are listed a page of `page_size` at a time as the generator is consumed, so
+    listing a large prefix doesn't wait for (or hold) the whole listing.
+
+    The size, ETag etc. of each object listed is also cached, for `head_s3_objects()`.
+
+    Please see "Response Syntax" here:
+    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3/client/list_objects_v2.html
+    """
+    bucket_name, prefix = _split_prefix_name(prefix_name)
+    client = _get_s3_client(profile_name)
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}
+    ):
+        for s3_object in page.get("Contents", []):
+            _cache_s3_metadata(
+                profile_name, bucket_name, s3_object["Key"], _listed_metadata(s3_object)
+            )
+            yield s3_object
+
+
+def head_s3_objects(
+    object_names: Iterable[str],
+    profile_name: Optional[str] = None,
+    max_age: float = 60,
+) -> Dict[str, Optional[dict]]:
+    """
+    Given s3 object identifiers, i.e ["my-bucket/things/file.txt", ...] returns a dictionary
+    of each to the boto3 aws representation of the object's metadata (as for
+    `head_s3_object()`), or to None if the object doesn't exist.
+
+    Metadata fetched (or listed by `list_s3_objects()`) within the last `max_age` seconds
+    is reused, and the rest is fetched by HEAD requests made concurrently on the shared
+    thread pool. Metadata from a listing only has the `ContentLength`, `ETag`,
+    `LastModified` and `StorageClass` of the object. Pass `max_age=0` to always make
+    the requests.
+    """
+    object_names = list(dict.fromkeys(object_names))
+    client = _get_s3_client(profile_name)
+    results: Dict[str, Optional[dict]] = {}
+
+    def head(
+        object_name: str, bucket_name: str, key: str
+    ) -> Tuple[str, Optional[dict]]:
+        try:
+            response = client.head_object(Bucket=bucket_name, Key=key)
+        except ClientError as err:
+            if err.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return object_name, None
+            raise
+        response.pop("ResponseMetadata", None)
+        _cache_s3_metadata(profile_name, bucket_name, key, response)
+        return object_name, response
+
+    def tasks():
+        for object_name in object_names:
+            bucket_name, key = object_name.split("/", 1)
+            metadata = _cached_s3_metadata(profile_name, bucket_name, key, max_age)
+            if metadata is not None:
+                results[object_name] = metadata
+                continue
+            yield head, (object_name, bucket_name, key)
+
+    results.update(_run_on_bulk_pool(tasks()))
+    return {object_name: results[object_name] for object_name in object_names}
+
+
+def download_prefix(
+    prefix_name: str,
+    directory: Union[str, Path],
+    profile_name: Optional[str] = None,
+) -> List[Path]:
+    """
+    Given an s3 bucket, or a bucket and key prefix, i.e "my-bucket/things/" downloads every
+    object under it to `directory`, concurrently on the shared thread pool.
+
+    Each object is written to its key's path relative to the prefix. Returns the paths of
+    the files written.
+    """
+    root = Path(directory).resolve()
+    _, prefix = _split_prefix_name(prefix_name)
+    result = sync_s3_prefix(
+        prefix_name, directory, profile_name=profile_name, skip_unchanged=False
+    )
+    return [_local_path_for(root, prefix, key) for key in result.transferred]
+
+
+def upload_directory(
+    directory: Union[str, Path],
+    prefix_name: str,
+    profile_name: Optional[str] = None,
+) -> List[str]:
+    """
+    Uploads every file in `directory` (and its subdirectories) to under an s3 bucket, or a
+    bucket and key prefix, i.e "my-bucket/things/", concurrently on the shared thread pool.
+
+    Each file is uploaded with its path relative to `directory` as its key under the prefix.
+    Returns the keys uploaded.
+    """
+    return sync_directory_to_s3(
+        directory, prefix_name, profile_name=profile_name, skip_unchanged=False
+    ).transferred
+
+
+def sync_s3_prefix(
+    prefix_name: str,
+    directory: Union[str, Path],
+    profile_name: Optional[str] = None,
+    skip_unchanged: bool = True,
+) -> SyncResult:
+    """
+    Download the objects under an s3 bucket, or a bucket and key prefix, i.e
+    "my-bucket/things/" to `directory`, skipping those that already have an up to date
+    local copy (one of the same size, whose md5 matches the object's ETag).
+
+    Each object is downloaded a request at a time, so the size of the shared thread pool
+    bounds the requests made at once, and with `download_s3_file_content_to_local()`, so
+    a failed download leaves any existing local file as it was.
+    """
+    directory = Path(directory)
+    bucket_name, prefix = _split_prefix_name(prefix_name)
+    root = directory.resolve()
+    result = SyncResult()
+
+    def download(s3_object: dict, local_file: Path) -> Tuple[str, bool]:
+        # Comparing is done here, on the pool, as it reads the whole file
+        if skip_unchanged and _is_unchanged(local_file, s3_object):
+            return s3_object["Key"], False
+        local_file.parent.mkdir(parents=True, exist_ok=True)
+        # One request at a time per file, so the shared pool bounds the requests made
+        download_s3_file_content_to_local(
+            f"{bucket_name}/{s3_object['Key']}",
+            local_file,
+            profile_name=profile_name,
+            max_workers=1,
+        )
+        return s3_object["Key"], True
+
+    def tasks():
+        for s3_object in list_s3_objects(prefix_name, profile_name=profile_name):
+            # Keys ending in "/" are folder placeholders, not files
+            if s3_object["Key"].endswith("/"):
+                continue
+            local_file = _local_path_for(root, prefix, s3_object["Key"])
+            yield download, (s3_object, local_file)
+
+    _sort_sync_results(result, _run_on_bulk_pool(tasks()))
+    logging.info(
+        f"Synced s3://{bucket_name}/{prefix} to {directory}: {len(result.transferred)} "
+        f"downloaded, {len(result.skipped)} up to date"
+    )
+    return result
+
+
+def sync_directory_to_s3(
+    directory: Union[str, Path],
+    prefix_name: str,
+    profile_name: Optional[str] = None,
+    skip_unchanged: bool = True,
+) -> SyncResult:
+    """
+    Upload the files in `directory` (and its subdirectories) to under an s3 bucket, or a
+    bucket and key prefix, i.e "my-bucket/things/", skipping those whose object is already
+    up to date (of the same size, with an ETag matching the file's md5).
+
+    Each file is uploaded a request at a time, so the size of the shared thread pool
+    bounds the requests made at once.
+    """
+    directory = Path(directory)
+    assert directory.is_dir(), f"The directory {directory.absolute()} does not exist."
+    bucket_name, prefix = _split_prefix_name(prefix_name)
+    result = SyncResult()
+
+    existing = {}
+    if skip_unchanged:
+        existing = {
+            s3_object["Key"]: s3_object
+            for s3_object in list_s3_objects(prefix_name, profile_name=profile_name)
+        }
+
+    def upload(local_file: Path, key: str) -> Tuple[str, bool]:
+        # Comparing is done here, on the pool, as it reads the whole file
+        if key in existing and _is_unchanged(local_file, existing[key]):
+            return key, False
+        # One request at a time per file, so the shared pool bounds the requests made
+        upload_local_file_to_s3(
+            local_file, f"{bucket_name}/{key}", profile_name=profile_name, max_workers=1
+        )
+        return key, True
+
+    def tasks():
+        for local_file in sorted(directory.rglob("*")):
+            if not local_file.is_file():
+                continue
+            key = prefix + local_file.relative_to(directory).as_posix()
+            yield upload, (local_file, key)
+
+    _sort_sync_results(result, _run_on_bulk_pool(tasks()))
+    logging.info(
+        f"Synced {directory} to s3://{bucket_name}/{prefix}: {len(result.transferred)} "
+        f"uploaded, {len(result.skipped)} up to date"
+    )
+    return result
+
+
+def _get_bulk_executor() -> Tuple[ThreadPoolExecutor, int]:
+    global _bulk_executor
+    with _bulk_executor_lock:
+        if _bulk_executor is None:
+            _bulk_executor = ThreadPoolExecutor(
+                max_workers=_BULK_MAX_WORKERS, thread_name_prefix="dpytools-s3-bulk"
+            )
+        return _bulk_executor, _BULK_MAX_WORKERS
+
+
+def _run_on_bulk_pool(tasks: Iterable[Tuple[Callable, tuple]]) -> list:
+    """
+    Run each (function, args) of `tasks` on the shared thread pool, taking tasks from the
+    iterable only as workers come free (so a long listing is consumed as it goes), and
+    return their results.
+
+    The first task to fail stops any more being started, and its error is raised once
+    the tasks already running have finished.
+    """
+    executor, max_workers = _get_bulk_executor()
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    running: deque = deque()
+    results = []
+
+    def collect_finished() -> bool:
+        # Returns False once a task has failed
+        while running and running[0].done():
+            if running[0].exception() is not None:
+                return False
+            results.append(running.popleft().result())
+        return True
+
+    for function, args in tasks:
+        slots.acquire()
+        future = executor.submit(function, *args)
+        future.add_done_callback(lambda _: slots.release())
+        running.append(future)
+        if not collect_finished():
+            break
+
+    for future in running:
+        if future.exception() is not None:
+            raise future.exception()
+        results.append(future.result())
+    return results
+
+
+def _sort_sync_results(result: SyncResult, outcomes: List[Tuple[str, bool]]):
+    """
+    Add each (key, transferred) outcome of a sync's tasks to its `SyncResult`.
+    """
+    for key, transferred in outcomes:
+        (result.transferred if transferred else result.skipped).append(key)
+
+
+def _listed_metadata(s3_object: dict) -> dict:
+    """
+    The metadata of an object from a listing, under the names a HEAD request gives it.
+    """
+    metadata = {
+        "ContentLength": s3_object["Size"],
+        "ETag": s3_object["ETag"],
+        "LastModified": s3_object["LastModified"],
+    }
+    if "StorageClass" in s3_object:
+        metadata["StorageClass"] = s3_object["StorageClass"]
+    return metadata
+
+
+def _split_prefix_name(prefix_name: str) -> Tuple[str, str]:
+    """
+    Splits "my-bucket/things" into the bucket name and a key prefix ending in "/" ("" for
+    a whole bucket), so that "my-bucket/things" doesn't also match "my-bucket/things2/".
+    """
+    bucket_name, _, prefix = prefix_name.partition("/")
+    prefix = prefix.strip("/")
+    return bucket_name, f"{prefix}/" if prefix else ""
+
+
+def _local_path_for(root: Path, prefix: str, key: str) -> Path:
+    """
+    The local path of an object under `root`, raising a ValueError for keys (i.e containing
+    "..") that would put it outside of `root`.
+    """
+    local_file = (root / key[len(prefix) :]).resolve()
+    if root not in local_file.parents:
+        raise ValueError(
+            f"Refusing to download {key}, it would be written outside of {root}"
+        )
+    return local_file
+
+
+def _is_unchanged(local_file: Path, s3_object: dict) -> bool:
+    """
+    Whether `local_file` has the same content as the object, going by its size and ETag.
+    """
+    return (
+        local_file.is_file()
+        and local_file.stat().st_size == s3_object["Size"]
+        and _matches_etag(local_file, s3_object["ETag"])
+    )
+
+
+def _matches_etag(local_file: Path, etag: str) -> bool:
+    """
+    Whether the md5 based ETag S3 would give `local_file` matches `etag`.
+
+    A single PUT's ETag is the md5 of the content. A multipart upload's ETag is the md5 of
+    the md5s of its parts followed by "-" and the number of parts, so depends on the part
+    size. Common part sizes (those of dpytools, boto3 and the AWS CLI among them) that give
+    the right number of parts are tried, as is the smallest whole number of MiB that does.
+    Objects encrypted with SSE-KMS don't have md5 based ETags, so never match.
+    """
+    etag = etag.strip('"')
+    size = local_file.stat().st_size
+    if "-" not in etag:
+        md5s = _part_md5s(local_file, [max(size, 1)])
+        return md5s[max(size, 1)][0].hexdigest() == etag
+
+    part_count = int(etag.split("-")[1])
+    mib = 1048576
+    candidates = [ceil(size / part_count / mib) * mib] + [
+        n * mib for n in (5, 8, 16, 32, 64, 100, 128, 256, 512)
+    ]
+    part_sizes = [
+        part_size
+        for part_size in dict.fromkeys(candidates)
+        if part_size and ceil(size / part_size) == part_count
+    ]
+    # Every part size that could match is hashed in one read of the file
+    for part_md5s in _part_md5s(local_file, part_sizes).values():
+        combined = hashlib.md5(b"".join(md5.digest() for md5 in part_md5s))
+        if f"{combined.hexdigest()}-{part_count}" == etag:
+            return True
+    return False
+
+
+def _part_md5s(
+    local_file: Path, part_sizes: List[int], buffer_size: int = 1048576
+) -> Dict[int, list]:
+    """
+    The (hashlib) md5 of each part of a file, for each of `part_sizes`, from a single
+    read of the file `buffer_size` at a time. An empty file has a single, empty, part.
+    """
+    md5s = {part_size: [hashlib.md5()] for part_size in part_sizes}
+    if not md5s:
+        return md5s
+    position = 0
+    with open(local_file, "rb") as f:
+        while True:
+            data = f.read(buffer_size)
+            if not data:
+                break
+            with memoryview(data) as view:
+                for part_size, part_md5s in md5s.items():
+                    offset = 0
+                    while offset < len(data):
+                        if position + offset and (position + offset) % part_size == 0:
+                            part_md5s.append(hashlib.md5())
+                        end = offset + part_size - (position + offset) % part_size
+                        part_md5s[-1].update(view[offset:end])
+                        offset = min(end, len(data))
+            position += len(data)
+    return md5s
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from botocore.exceptions import ClientError
+
+from dpytools.s3.basic import _get_s3_client
+
+# Default location of the cached objects
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "dpytools" / "s3"
+
+
+class S3DiskCache:
+    """
+    A local, size-bounded cache of the content of S3 objects, kept in `directory` so it
+    lasts between runs. Pass it as `cache=` to `read_s3_file_content()` or
+    `read_s3_file_content_as_dict()`.
+
+    Objects are stored by bucket, key and ETag. A cached object is revalidated with a
+    conditional GET (If-None-Match its ETag), which returns no content if the object is
+    unchanged. Within `ttl` seconds of the last revalidation the cached content is used
+    without a request at all. Once the cache holds more than `max_size` bytes, the least
+    recently used objects are removed.
+
+    `hits` and `misses` count the reads served from the cache and from S3 respectively.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[Path, str]] = None,
+        max_size: int = 1073741824,
+        ttl: float = 0,
+    ):
+        self.directory = Path(directory) if directory is not None else DEFAULT_CACHE_DIR
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def read(self, object_name: str, profile_name: Optional[str] = None) -> bytes:
+        """
+        Given an s3 object identifier, i.e "my-bucket/things/file.txt" returns its content,
+        from the cache if the cached copy is up to date.
+        """
+        bucket_name, key = object_name.split("/", 1)
+        entry_path = self._entry_path(bucket_name, key)
+        entry = self._load_entry(entry_path)
+
+        if entry is not None and time.time() - entry["validated_at"] < self.ttl:
+            content = self._read_content(entry_path, entry)
+            if content is not None:
+                self._count(hit=True)
+                return content
+
+        client = _get_s3_client(profile_name)
+        conditions = {"IfNoneMatch": entry["etag"]} if entry is not None else {}
+        try:
+            response = client.get_object(Bucket=bucket_name, Key=key, **conditions)
+        except ClientError as err:
+            not_modified = err.response["Error"]["Code"] in ("304", "NotModified")
+            if entry is None or not not_modified:
+                raise
+            content = self._read_content(entry_path, entry)
+            if content is not None:
+                entry["validated_at"] = time.time()
+                self._save_entry(entry_path, entry)
+                self._count(hit=True)
+                return content
+            # The content was evicted since; fetch it unconditionally
+            response = client.get_object(Bucket=bucket_name, Key=key)
+
+        content = response["Body"].read()
+        self._count(hit=False)
+        entry = {"etag": response["ETag"], "validated_at": time.time()}
+        self._store(entry_path, entry, content)
+        return content
+
+    def clear(self):
+        """
+        Remove every object from the cache.
+        """
+        for pattern in ("*.json", "*.bin"):
+            for path in self.directory.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry_path(self, bucket_name: str, key: str) -> Path:
+        name = hashlib.sha256(f"{bucket_name}/{key}".encode()).hexdigest()
+        return self.directory / f"{name}.json"
+
+    @staticmethod
+    def _content_path(entry_path: Path, etag: str) -> Path:
+        # Content is stored per ETag, so it is never overwritten with another version
+        etag_hash = hashlib.sha256(etag.encode()).hexdigest()[:16]
+        return entry_path.with_suffix(f".{etag_hash}.bin")
+
+    @staticmethod
+    def _load_entry(entry_path: Path) -> Optional[dict]:
+        try:
+            with open(entry_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_content(self, entry_path: Path, entry: dict) -> Optional[bytes]:
+        content_path = self._content_path(entry_path, entry["etag"])
+        try:
+            content = content_path.read_bytes()
+        except OSError:
+            return None
+        # Mark as recently used, for eviction
+        os.utime(content_path)
+        return content
+
+    def _save_entry(self, entry_path: Path, entry: dict):
+        _write_atomically(entry_path, json.dumps(entry).encode())
+
+    def _store(self, entry_path: Path, entry: dict, content: bytes):
+        if len(content) > self.max_size:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        old_entry = self._load_entry(entry_path)
+        _write_atomically(self._content_path(entry_path, entry["etag"]), content)
+        self._save_entry(entry_path, entry)
+        if old_entry is not None and old_entry["etag"] != entry["etag"]:
+            self._content_path(entry_path, old_entry["etag"]).unlink(missing_ok=True)
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used content until the cache is within `max_size`.
+        """
+        contents = []
+        for path in self.directory.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            contents.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in contents)
+        for _, size, path in sorted(contents):
+            if total_size <= self.max_size:
+                break
+            logging.info(f"Evicting {path.name} from the s3 cache")
+            path.unlink(missing_ok=True)
+            # The entry goes too, so the object isn't revalidated without content
+            path.with_name(path.name.split(".")[0] + ".json").unlink(missing_ok=True)
+            total_size -= size
+
+
+def _write_atomically(path: Path, data: bytes):
+    # Write then rename, so other readers never see a partly written file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
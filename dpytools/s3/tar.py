@@ -0,0 +1,345 @@
+import bz2
+import gzip
+import io
+import json
+import logging
+import lzma
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+
+from dpytools.s3.basic import TAR_EXTENSIONS, _get_s3_client
+from dpytools.s3.writer import open_s3_writer
+
+# Suffix of the sidecar object an archive's index is cached in
+INDEX_SUFFIX = ".index.json"
+
+
+@dataclass
+class S3TarIndex:
+    """
+    Where each file in an uncompressed tar archive in S3 starts and how large it is:
+    `members` maps each member's name to the (offset, size) in bytes of its content.
+
+    `etag` is the ETag of the archive the index was built from, so a stale index is
+    never used to read a different version of the archive.
+    """
+
+    etag: str
+    members: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+
+def build_s3_tar_index(
+    object_name: str,
+    profile_name: Optional[str] = None,
+    cache: bool = False,
+    buffer_size: int = 65536,
+) -> S3TarIndex:
+    """
+    Given an s3 object identifier for an uncompressed tar archive, i.e "my-bucket/data.tar",
+    returns an `S3TarIndex` of the files in it.
+
+    Only the archive's headers are read, with ranged GETs of `buffer_size` bytes, skipping
+    over the content of each file. With `cache=True` the index is also saved as a sidecar
+    object next to the archive (i.e "my-bucket/data.tar.index.json") and loaded from there
+    next time, as long as the archive hasn't changed since.
+    """
+    if not object_name.endswith(".tar"):
+        raise NotImplementedError(
+            f"Only uncompressed tar archives (.tar) can be indexed. Got {object_name}"
+        )
+
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    head = client.head_object(Bucket=bucket_name, Key=key)
+
+    if cache:
+        index = _load_cached_index(client, bucket_name, key, head["ETag"])
+        if index is not None:
+            return index
+
+    index = S3TarIndex(etag=head["ETag"])
+    reader = io.BufferedReader(
+        _S3RangeReader(client, bucket_name, key, head["ContentLength"], head["ETag"]),
+        buffer_size=buffer_size,
+    )
+    with tarfile.open(fileobj=reader, mode="r:") as tar:
+        for member in tar:
+            if member.isfile():
+                index.members[member.name] = (member.offset_data, member.size)
+
+    if cache:
+        client.put_object(
+            Bucket=bucket_name,
+            Key=key + INDEX_SUFFIX,
+            Body=json.dumps({"etag": index.etag, "members": index.members}).encode(),
+            ContentType="application/json",
+        )
+    return index
+
+
+def read_s3_tar_member(
+    object_name: str,
+    member_name: str,
+    profile_name: Optional[str] = None,
+    index: Optional[S3TarIndex] = None,
+    cache: bool = False,
+) -> bytes:
+    """
+    Given an s3 object identifier for an uncompressed tar archive, i.e "my-bucket/data.tar",
+    returns the content of the file `member_name` in it, fetched with a single ranged GET.
+
+    Pass an `index` (see `build_s3_tar_index()`) to read several files without indexing
+    the archive each time; otherwise one is built, using the sidecar cache if `cache=True`.
+    Raises a KeyError if the archive has no such file.
+    """
+    if index is None:
+        index = build_s3_tar_index(object_name, profile_name=profile_name, cache=cache)
+    offset, size = index.members[member_name]
+    if size == 0:
+        return b""
+
+    client = _get_s3_client(profile_name)
+    bucket_name, key = object_name.split("/", 1)
+    # The index only holds for the version of the archive it was built from
+    response = client.get_object(
+        Bucket=bucket_name,
+        Key=key,
+        Range=f"bytes={offset}-{offset + size - 1}",
+        IfMatch=index.etag,
+    )
+    return response["Body"].read()
+
+
+def compress_directory_to_s3(
+    directory: Union[str, Path],
+    object_name: str,
+    profile_name: Optional[str] = None,
+    compress_workers: int = 1,
+    compresslevel: int = 6,
+    block_size: int = 1048576,
+    part_size: int = 8388608,
+    max_workers: int = 4,
+):
+    """
+    Tar the contents of `directory` and upload the archive to s3 as the provided object
+    name, i.e "my-bucket/output.tar.gz", compressed with gzip, bzip2 or xz according to its
+    extension (or not at all for ".tar"). The reverse of `decompress_s3_tar()`.
+
+    The archive is streamed: it is compressed as it is written, and uploaded in parts of
+    `part_size` bytes, up to `max_workers` at once, as it is compressed, without being
+    written to local disk.
+
+    With `compress_workers` above 1, the archive is cut into blocks of `block_size` bytes
+    that are compressed by that many threads at once (as pigz does), each block becoming
+    its own gzip member (or bzip2/xz stream). Concatenated members are a valid compressed
+    file, which gzip, tar and `decompress_s3_tar()` read as one.
+    """
+    if not object_name.endswith(TAR_EXTENSIONS):
+        raise NotImplementedError(
+            "This function currently only handles archives using the tar extension "
+            f"({', '.join(TAR_EXTENSIONS)}). Got {object_name}"
+        )
+
+    directory = Path(directory)
+    assert directory.is_dir(), f"The directory {directory.absolute()} does not exist."
+
+    with open_s3_writer(
+        object_name,
+        profile_name=profile_name,
+        part_size=part_size,
+        max_workers=max_workers,
+    ) as writer:
+        with _compressing_writer(
+            writer, object_name, compress_workers, compresslevel, block_size
+        ) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                for path in sorted(directory.rglob("*")):
+                    tar.add(
+                        path,
+                        arcname=path.relative_to(directory).as_posix(),
+                        recursive=False,
+                    )
+    logging.info(f"Compressed {directory} to {object_name}")
+
+
+def _compressing_writer(
+    fileobj: BinaryIO,
+    name: str,
+    compress_workers: int,
+    compresslevel: int,
+    block_size: int,
+) -> BinaryIO:
+    """
+    Wraps `fileobj` so that what is written to it is compressed according to the
+    extension of `name`. Closing the wrapper doesn't close `fileobj`.
+    """
+    if name.endswith((".gz", ".tgz")):
+        compress = partial(gzip.compress, compresslevel=compresslevel, mtime=0)
+        open_stream = partial(
+            gzip.GzipFile,
+            fileobj=fileobj,
+            mode="wb",
+            compresslevel=compresslevel,
+            mtime=0,
+        )
+    elif name.endswith(".bz2"):
+        # bzip2 levels run from 1 (xz presets and gzip levels from 0)
+        level = max(compresslevel, 1)
+        compress = partial(bz2.compress, compresslevel=level)
+        open_stream = partial(bz2.BZ2File, fileobj, mode="wb", compresslevel=level)
+    elif name.endswith(".xz"):
+        compress = partial(lzma.compress, preset=compresslevel)
+        open_stream = partial(lzma.LZMAFile, fileobj, mode="wb", preset=compresslevel)
+    else:
+        return _Uncompressed(fileobj)
+
+    if compress_workers > 1:
+        return _BlockCompressor(fileobj, compress, compress_workers, block_size)
+    return open_stream()
+
+
+class _BlockCompressor(io.BufferedIOBase):
+    """
+    Compresses what is written to it in independent blocks, on a pool of threads (the
+    compressors release the GIL), writing the compressed blocks to `fileobj` in order.
+    At most two blocks per thread are held in memory at once.
+    """
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        compress: Callable[[bytes], bytes],
+        max_workers: int,
+        block_size: int,
+    ):
+        self._fileobj = fileobj
+        self._compress = compress
+        self._block_size = block_size
+        self._max_pending = max_workers * 2
+        self._buffer = bytearray()
+        self._pending: deque = deque()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dpytools-s3-compress"
+        )
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        with memoryview(data) as view:
+            size = view.nbytes
+            self._buffer += view.cast("B")
+        while len(self._buffer) >= self._block_size:
+            block = bytes(self._buffer[: self._block_size])
+            del self._buffer[: self._block_size]
+            self._pending.append(self._executor.submit(self._compress, block))
+            while len(self._pending) >= self._max_pending:
+                self._fileobj.write(self._pending.popleft().result())
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._pending.append(
+                    self._executor.submit(self._compress, bytes(self._buffer))
+                )
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+        finally:
+            self._buffer = bytearray()
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            super().close()
+
+
+class _Uncompressed(io.BufferedIOBase):
+    """
+    Passes writes through to `fileobj`, without closing it when closed.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self._fileobj.write(data)
+
+
+def _load_cached_index(
+    client, bucket_name: str, key: str, etag: str
+) -> Optional[S3TarIndex]:
+    """
+    The index cached in the archive's sidecar object, if there is one for this version
+    (`etag`) of the archive.
+    """
+    try:
+        response = client.get_object(Bucket=bucket_name, Key=key + INDEX_SUFFIX)
+    except ClientError as err:
+        if err.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    cached = json.loads(response["Body"].read())
+    if cached["etag"] != etag:
+        return None
+    return S3TarIndex(
+        etag=cached["etag"],
+        members={name: tuple(entry) for name, entry in cached["members"].items()},
+    )
+
+
+class _S3RangeReader(io.RawIOBase):
+    """
+    A read-only, seekable file-like view of an S3 object. Each read is a ranged GET, so
+    seeking past data costs nothing; wrap it in an `io.BufferedReader` to make small
+    reads efficient.
+    """
+
+    def __init__(self, client, bucket_name: str, key: str, size: int, etag: str):
+        self._client = client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._size = size
+        self._etag = etag
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self._size)
+        if end <= self._position:
+            return 0
+        response = self._client.get_object(
+            Bucket=self._bucket_name,
+            Key=self._key,
+            Range=f"bytes={self._position}-{end - 1}",
+            IfMatch=self._etag,
+        )
+        data = response["Body"].read()
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
@@ -0,0 +1,203 @@
+import io
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from dpytools.s3.basic import _forget_s3_metadata, _get_s3_client, _upload_part
+
+# S3's limits on multipart uploads: every part but the last must be at least 5 MiB, and
+# an upload can have at most 10,000 parts
+MIN_PART_SIZE = 5242880
+MAX_PARTS = 10000
+
+
+def open_s3_writer(
+    object_name: str,
+    profile_name: Optional[str] = None,
+    part_size: int = 8388608,
+    max_workers: int = 4,
+    content_type: Optional[str] = None,
+) -> "S3Writer":
+    """
+    Given an s3 object identifier, i.e "my-bucket/things/file.csv" returns a binary
+    file-like object that writes to it, without a local file.
+
+    Written bytes are buffered into parts of `part_size` bytes, which are sent as a
+    multipart upload in the background, up to `max_workers` at once, while writing
+    carries on. Once every worker is busy, writes wait for one to finish, so at most
+    `max_workers + 1` parts are held in memory. The object is created when the writer is
+    closed. Leaving its `with` block because of an error aborts the upload instead, so a
+    partly written object never appears.
+
+    With at most 10,000 parts, `part_size` bounds the size of the object (80 GB for the
+    default 8 MiB).
+    """
+    return S3Writer(
+        object_name,
+        profile_name=profile_name,
+        part_size=part_size,
+        max_workers=max_workers,
+        content_type=content_type,
+    )
+
+
+class S3Writer(io.BufferedIOBase):
+    """
+    A binary, write only, file-like object backed by an S3 multipart upload. See
+    `open_s3_writer()`.
+    """
+
+    def __init__(
+        self,
+        object_name: str,
+        profile_name: Optional[str] = None,
+        part_size: int = 8388608,
+        max_workers: int = 4,
+        content_type: Optional[str] = None,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(
+                f"The part size must be at least {MIN_PART_SIZE} bytes, got {part_size}"
+            )
+        self.object_name = object_name
+        self._bucket_name, self._key = object_name.split("/", 1)
+        self._client = _get_s3_client(profile_name)
+        self._part_size = part_size
+        self._max_workers = max_workers
+        self._extra_args = {"ContentType": content_type} if content_type else {}
+
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Held by each part being uploaded, so writes wait once every worker is busy
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._parts: List[Future] = []
+        self._error: Optional[BaseException] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._error is not None:
+            self.abort()
+            raise self._error
+
+        with memoryview(data) as view:
+            size = view.nbytes
+            self._buffer += view.cast("B")
+        self._position += size
+
+        while len(self._buffer) >= self._part_size:
+            part = bytes(self._buffer[: self._part_size])
+            del self._buffer[: self._part_size]
+            self._submit_part(part)
+        return size
+
+    def close(self):
+        """
+        Upload what is left of the buffer and create the object. If that fails, the
+        upload is aborted and the error raised.
+        """
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                # Everything fitted in one part, so a single PUT will do
+                self._client.put_object(
+                    Body=bytes(self._buffer),
+                    Bucket=self._bucket_name,
+                    Key=self._key,
+                    **self._extra_args,
+                )
+            else:
+                # The last part may be smaller than the minimum part size
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._parts]
+                self._client.complete_multipart_upload(
+                    Bucket=self._bucket_name,
+                    Key=self._key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            self.abort()
+            raise
+        _forget_s3_metadata(self._bucket_name, self._key)
+        self._shutdown()
+        logging.info(f"Wrote {self._position} bytes to {self.object_name}")
+
+    def abort(self):
+        """
+        Close the writer without creating the object, discarding any parts that have
+        been uploaded.
+        """
+        if self.closed:
+            return
+        self._shutdown()
+        if self._upload_id is not None:
+            logging.error(f"Aborting the upload to {self.object_name}")
+            self._client.abort_multipart_upload(
+                Bucket=self._bucket_name, Key=self._key, UploadId=self._upload_id
+            )
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        # A writer that is never closed is abandoned, rather than uploading what was
+        # written so far as though it were complete
+        try:
+            self.abort()
+        except Exception:
+            pass
+
+    def _submit_part(self, data: bytes):
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(
+                Bucket=self._bucket_name, Key=self._key, **self._extra_args
+            )["UploadId"]
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="dpytools-s3-writer"
+            )
+
+        part_number = len(self._parts) + 1
+        if part_number > MAX_PARTS:
+            raise ValueError(
+                f"{self.object_name} needs more than {MAX_PARTS} parts, "
+                "please use a larger part_size"
+            )
+
+        self._slots.acquire()
+        future = self._executor.submit(
+            _upload_part,
+            self._client,
+            self._bucket_name,
+            self._key,
+            self._upload_id,
+            part_number,
+            data,
+        )
+        future.add_done_callback(self._part_done)
+        self._parts.append(future)
+
+    def _part_done(self, future: Future):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self._error = self._error or future.exception()
+
+    def _shutdown(self):
+        self._buffer = bytearray()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        super().close()
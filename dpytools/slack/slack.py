@@ -1,14 +1,28 @@
 import logging
 
+from dpytools.http.async_base import AsyncHttpClient
 from dpytools.http.base import BaseHttpClient
 
 
 class SlackMessenger:
-    def __init__(self, webhook_url):
+    def __init__(self, webhook_url, **kwargs):
         if not webhook_url:
             raise ValueError("webhook_url is not set")
         self.webhook_url = webhook_url
-        self.http_client = BaseHttpClient()
+        # Any keyword arguments (e.g. `pool_maxsize`) are passed to BaseHttpClient
+        self.http_client = BaseHttpClient(**kwargs)
+
+    def close(self):
+        """
+        Closes the pooled connections held by the underlying http client.
+        """
+        self.http_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def msg(self, msg_dict: dict):
         """
@@ -30,3 +44,44 @@ class SlackMessenger:
         The msg parameter is wrapped into a dictionary before being sent.
         """
         self.msg({"text": msg})
+
+
+class AsyncSlackMessenger:
+    def __init__(self, webhook_url, **kwargs):
+        if not webhook_url:
+            raise ValueError("webhook_url is not set")
+        self.webhook_url = webhook_url
+        # Any keyword arguments (e.g. `max_concurrency`) are passed to AsyncHttpClient
+        self.http_client = AsyncHttpClient(**kwargs)
+
+    async def close(self):
+        """
+        Closes the pooled connections held by the underlying http client.
+        """
+        await self.http_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def msg(self, msg_dict: dict):
+        """
+        Send a message to the Slack webhook without blocking the event loop.
+
+        The msg_dict parameter should be a dictionary that matches the
+        structure documented at https://api.slack.com/messaging/webhooks
+        """
+        try:
+            await self.http_client.post(self.webhook_url, json=msg_dict)
+        except Exception as e:
+            logging.error(f"Failed to send notification: {e}")
+
+    async def msg_str(self, msg: str):
+        """
+        Send a string message to the Slack webhook.
+
+        The msg parameter is wrapped into a dictionary before being sent.
+        """
+        await self.msg({"text": msg})
@@ -4,8 +4,9 @@ import json
 import os
 import re
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Any, Iterator, List, Optional, Union
 
+from dpytools.json.stream import iter_json_items
 from dpytools.stores.directory.base import BaseWritableSingleDirectoryStore
 
 
@@ -140,6 +141,23 @@ class LocalDirectoryStore(BaseWritableSingleDirectoryStore):
                 json_dict = json.load(f)
             return json_dict
 
+    def iter_lone_matching_json_items(
+        self, pattern: str, pointer: str = ""
+    ) -> Iterator[Any]:
+        """
+        Asserts exactly 1 file matches pattern, then yields each item of the array at
+        the JSON pointer `pointer` (e.g "/observations"; "" for a document that is an
+        array) as it is parsed, rather than loading the whole file. For an object
+        rather than an array, (key, value) pairs are yielded.
+        """
+        if not self.has_lone_file_matching(pattern):
+            raise FileNotFoundError(
+                f"No matching files found for pattern {pattern} in directory {self.local_path}"
+            )
+        file_path = Path(self.local_path / self._files_that_match_pattern(pattern)[0])
+        with open(file_path, "rb") as f:
+            yield from iter_json_items(f, pointer=pointer)
+
     def get_file_names(self) -> List[str]:
         """
         Returns a list of the files in the store.
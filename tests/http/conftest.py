@@ -0,0 +1,103 @@
+import email
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+
+
+class StandInServer:
+    """
+    A local stand-in for the services the http clients talk to. Records every
+    request it receives and responds with `200` unless told otherwise via `statuses`.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/upload"
+
+    def next_status(self, request: dict) -> int:
+        with self.lock:
+            self.requests.append(request)
+            if self.statuses:
+                return self.statuses.pop(0)
+        return 200
+
+    def chunks(self) -> dict:
+        """
+        Returns {resumableChunkNumber: file bytes} for every successful POST
+        """
+        return {
+            int(r["params"]["resumableChunkNumber"]): r["files"]["file"]
+            for r in self.requests
+            if r["method"] == "POST" and r["status"] == 200
+        }
+
+
+def _parse_files(content_type: str, body: bytes) -> dict:
+    if not content_type.startswith("multipart/form-data"):
+        return {}
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(
+            decode=True
+        )
+        for part in message.get_payload()
+    }
+
+
+def _make_handler(server: StandInServer):
+    class Handler(BaseHTTPRequestHandler):
+        def _read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                body = b""
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return body
+                    body += self.rfile.read(size)
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _respond(self):
+            body = self._read_body()
+            url = urlparse(self.path)
+            request = {
+                "method": self.command,
+                "path": url.path,
+                "params": dict(parse_qsl(url.query)),
+                "headers": dict(self.headers),
+                "body": body,
+                "files": _parse_files(self.headers.get("Content-Type", ""), body),
+            }
+            status = server.next_status(request)
+            request["status"] = status
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def stand_in_server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError
+
+from dpytools.http.async_base import AsyncHttpClient
+from dpytools.http.async_upload import AsyncUploadClient
+
+
+def test_async_get(stand_in_server):
+    """
+    Test that the async get method returns a response with its body read
+    """
+
+    async def run():
+        async with AsyncHttpClient() as client:
+            response = await client.get(stand_in_server.url)
+            return response.status, await response.json()
+
+    status, body = asyncio.run(run())
+
+    assert status == 200
+    assert body == {}
+    assert stand_in_server.requests[0]["method"] == "GET"
+
+
+def test_async_post_sends_json(stand_in_server):
+    """
+    Test that the async post method passes keyword arguments through to aiohttp
+    """
+
+    async def run():
+        async with AsyncHttpClient() as client:
+            return await client.post(stand_in_server.url, json={"key": "value"})
+
+    response = asyncio.run(run())
+
+    assert response.status == 200
+    assert stand_in_server.requests[0]["body"] == b'{"key": "value"}'
+
+
+def test_async_backoff_on_exception(stand_in_server):
+    """
+    Test that the async get method retries on an error status
+    """
+    stand_in_server.statuses = [500]
+
+    async def run():
+        async with AsyncHttpClient() as client:
+            return await client.get(stand_in_server.url)
+
+    response = asyncio.run(run())
+
+    assert response.status == 200
+    assert len(stand_in_server.requests) == 2
+
+
+def test_async_client_error_is_raised(stand_in_server):
+    """
+    Test that an error status is raised as a ClientResponseError
+    """
+    stand_in_server.statuses = [404]
+
+    async def run():
+        async with AsyncHttpClient() as client:
+            await client._handle_request("GET", stand_in_server.url)
+
+    with pytest.raises(ClientResponseError):
+        asyncio.run(run())
+
+
+def test_async_upload_csv(stand_in_server, tmp_path):
+    """
+    Test that AsyncUploadClient posts every chunk with its resumableChunkNumber
+    """
+    csv_path = tmp_path / "data.csv"
+    content = b"a,b,c\n" * 1000
+    csv_path.write_bytes(content)
+
+    async def run():
+        async with AsyncUploadClient(stand_in_server.url, max_concurrency=3) as client:
+            return await client.upload_csv(csv_path, "my-bucket", "token", chunk_size=1000)
+
+    s3_key, s3_uri = asyncio.run(run())
+
+    chunks = stand_in_server.chunks()
+    assert sorted(chunks) == list(range(1, 7))
+    assert b"".join(chunks[n] for n in sorted(chunks)) == content
+    assert stand_in_server.requests[0]["headers"]["X-Florence-Token"] == "token"
+    assert s3_key.endswith("-data-csv")
+    assert s3_uri == f"s3://my-bucket/{s3_key}"
@@ -4,8 +4,8 @@ from requests import HTTPError, Response
 from dpytools.http.base import BaseHttpClient
 
 
-# Mock the requests.request method
-@patch("requests.request")
+# Mock the requests.Session.request method
+@patch("requests.Session.request")
 def test_get(mock_request):
     """
     Test that the get method returns a response object
@@ -27,7 +27,7 @@ def test_get(mock_request):
     mock_request.assert_called_once_with("GET", "http://example.com")
 
 
-@patch("requests.request")
+@patch("requests.Session.request")
 def test_post(mock_request):
     """
     Test that the post method returns a response object
@@ -49,7 +49,7 @@ def test_post(mock_request):
     mock_request.assert_called_once_with("POST", "http://example.com")
 
 
-@patch("requests.request")
+@patch("requests.Session.request")
 def test_backoff_on_exception(mock_request):
     """
     Test that the get method retries on HTTPError
@@ -69,3 +69,42 @@ def test_backoff_on_exception(mock_request):
     # Assertions to check the response status and the number of request calls
     assert response.status_code == 200
     assert mock_request.call_count == 2
+
+
+def test_session_pool_is_configurable():
+    """
+    Test that the client mounts a pooled adapter with the requested sizes
+    """
+    client = BaseHttpClient(pool_connections=3, pool_maxsize=7, pool_block=True)
+
+    adapter = client.session.get_adapter("https://example.com")
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 7
+    assert adapter._pool_block is True
+    assert client.session.get_adapter("http://example.com") is adapter
+
+
+@patch("requests.Session.request")
+def test_session_is_reused_between_requests(mock_request):
+    """
+    Test that every request made by a client goes through the same session
+    """
+    mock_request.return_value = MagicMock(Response)
+
+    client = BaseHttpClient()
+    session = client.session
+    client.get("http://example.com")
+    client.post("http://example.com")
+
+    assert client.session is session
+    assert mock_request.call_count == 2
+
+
+@patch("requests.Session.close")
+def test_context_manager_closes_session(mock_close):
+    """
+    Test that leaving the context manager closes the pooled session
+    """
+    with BaseHttpClient() as client:
+        assert isinstance(client, BaseHttpClient)
+    mock_close.assert_called_once()
@@ -1,25 +1,70 @@
+import hashlib
+import io
 import os
 from pathlib import Path
+import time
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+import pytest
+from requests import HTTPError
 
 from dpytools.http.upload import (
-    _create_temp_chunks,
-    _delete_temp_chunks,
+    ChunkResult,
+    UploadClient,
+    UploadSource,
+    _iter_file_chunks,
     _generate_upload_params,
     _generate_upload_new_params,
 )
 
 
-def test_create_and_delete_temp_chunks():
+def test_generate_upload_new_params_uses_chunk_size(tmp_path):
     """
-    Ensures that _create_temp_chunks() creates the correct number of file chunks and that _delete_temp_chunks() deletes the temporary files.
+    Ensures that _generate_upload_new_params() counts chunks using the chunk size it is given
     """
-    temp_file_paths_list = _create_temp_chunks(
-        csv_path="tests/test_cases/countries.csv"
+    file_path = tmp_path / "data.csv"
+    file_path.write_bytes(b"x" * 2500)
+
+    upload_params = _generate_upload_new_params(
+        file_path=file_path,
+        s3_path="s3-path",
+        title="title",
+        mimetype="text/csv",
+        collection_id=None,
+        chunk_size=1000,
     )
-    assert len(temp_file_paths_list) == 2
-    assert "temp-file-part-1" in temp_file_paths_list[0]
-    _delete_temp_chunks(temp_file_paths_list)
-    assert os.path.exists(Path(temp_file_paths_list[0]).absolute()) == False
+    assert upload_params["resumableChunkSize"] == 1000
+    assert upload_params["resumableTotalChunks"] == 3
+    assert "collectionId" not in upload_params
+
+
+def test_iter_file_chunks(tmp_path):
+    """
+    Ensures that _iter_file_chunks() yields the file in order in chunks of the requested size, without writing anything to disk.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_bytes(b"x" * 2500)
+
+    chunks = list(_iter_file_chunks(file_path, chunk_size=1000))
+
+    assert [chunk_number for chunk_number, _ in chunks] == [1, 2, 3]
+    assert [len(chunk) for _, chunk in chunks] == [1000, 1000, 500]
+    assert b"".join(chunk for _, chunk in chunks) == file_path.read_bytes()
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+def test_iter_file_chunks_skips_chunks(tmp_path):
+    """
+    Ensures that _iter_file_chunks() does not yield the chunks it is told to skip.
+    """
+    file_path = tmp_path / "data.csv"
+    file_path.write_bytes(b"a" * 1000 + b"b" * 1000 + b"c" * 500)
+
+    chunks = list(_iter_file_chunks(file_path, chunk_size=1000, skip={1, 3}))
+
+    assert chunks == [(2, b"b" * 1000)]
 
 
 def test_generate_upload_params():
@@ -56,3 +101,496 @@ def test_generate_upload_new_params():
     assert upload_params["resumableTotalSize"] == 6198846
     assert upload_params["resumableTotalChunks"] == 2
     assert "-countries-csv" in upload_params["resumableFilename"]
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """
+    A small csv file that chunks into 6 pieces with a chunk size of 1000 bytes
+    """
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_bytes(b"".join(f"{i:09d}\n".encode() for i in range(550)))
+    return csv_path
+
+
+def test_upload_csv_posts_chunks_in_parallel(stand_in_server, csv_file):
+    """
+    Ensures that every chunk is posted, with its own resumableChunkNumber, when using a pool of workers
+    """
+    client = UploadClient(stand_in_server.url)
+    client.upload_csv(
+        csv_file, "my-bucket", "token", chunk_size=1000, max_workers=4
+    )
+
+    chunks = stand_in_server.chunks()
+    assert sorted(chunks) == [1, 2, 3, 4, 5, 6]
+    assert b"".join(chunks[n] for n in sorted(chunks)) == csv_file.read_bytes()
+    assert {r["params"]["resumableTotalChunks"] for r in stand_in_server.requests} == {"6"}
+
+
+def test_upload_retries_only_the_failed_chunk(stand_in_server, csv_file):
+    """
+    Ensures that a chunk which fails with a retryable error is re-sent on its own
+    """
+    stand_in_server.statuses = [503]
+
+    client = UploadClient(stand_in_server.url)
+    client.upload_csv(
+        csv_file, "my-bucket", "token", chunk_size=1000, max_workers=2
+    )
+
+    assert len(stand_in_server.requests) == 7
+    assert sorted(stand_in_server.chunks()) == [1, 2, 3, 4, 5, 6]
+
+
+def test_upload_fails_fast_on_fatal_error(stand_in_server, csv_file):
+    """
+    Ensures that a client error is not retried and stops the remaining chunks being posted
+    """
+    stand_in_server.statuses = [403]
+
+    client = UploadClient(stand_in_server.url)
+    with pytest.raises(HTTPError):
+        client.upload_csv(
+            csv_file, "my-bucket", "token", chunk_size=1000, max_workers=1
+        )
+
+    assert len(stand_in_server.requests) == 1
+
+
+def test_upload_holds_at_most_max_workers_chunks(csv_file, monkeypatch):
+    """
+    Ensures that chunks are only read from the file once a worker is free to post them
+    """
+    read, posted = [], []
+    max_workers = 2
+
+    def counting_chunks(*args, **kwargs):
+        for chunk in _iter_file_chunks(*args, **kwargs):
+            read.append(chunk)
+            # Chunks read but not yet posted must never exceed the number of workers
+            assert len(read) - len(posted) <= max_workers
+            yield chunk
+
+    def slow_post_chunk(self, file_chunk, chunk_params, florence_access_token):
+        time.sleep(0.01)
+        posted.append(file_chunk)
+
+    monkeypatch.setattr("dpytools.http.upload._iter_file_chunks", counting_chunks)
+    monkeypatch.setattr(UploadClient, "_post_chunk", slow_post_chunk)
+
+    client = UploadClient("http://example.com/upload")
+    client.upload_csv(
+        csv_file, "my-bucket", "token", chunk_size=1000, max_workers=max_workers
+    )
+
+    assert len(posted) == 6
+
+
+def test_resumed_upload_only_posts_missing_chunks(stand_in_server, csv_file, tmp_path):
+    """
+    Ensures that retrying a failed upload with resume=True reuses the same identifier and only posts the chunks that were not posted before
+    """
+    client = UploadClient(stand_in_server.url, manifest_dir=tmp_path / "manifests")
+
+    # The third chunk fails, leaving the first two posted
+    stand_in_server.statuses = [200, 200, 403]
+    with pytest.raises(HTTPError):
+        client.upload_csv(
+            csv_file, "my-bucket", "token", chunk_size=1000, resume=True
+        )
+    assert len(list((tmp_path / "manifests").iterdir())) == 1
+    first_attempt = stand_in_server.requests[:]
+
+    stand_in_server.requests.clear()
+    client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000, resume=True)
+
+    assert sorted(stand_in_server.chunks()) == [3, 4, 5, 6]
+    identifiers = {
+        r["params"]["resumableIdentifier"]
+        for r in first_attempt + stand_in_server.requests
+    }
+    assert len(identifiers) == 1
+    assert list((tmp_path / "manifests").iterdir()) == []
+
+
+def test_resumed_upload_manifest_error_stops_upload(stand_in_server, csv_file, tmp_path):
+    """
+    Ensures that an error recording a posted chunk in the manifest stops the upload with that error, rather than leaving it waiting for a worker forever
+    """
+    client = UploadClient(stand_in_server.url, manifest_dir=tmp_path / "manifests")
+
+    with patch(
+        "dpytools.http.upload._UploadManifest.mark_done",
+        side_effect=OSError("No space left on device"),
+    ):
+        with pytest.raises(OSError, match="No space left on device"):
+            client.upload_csv(
+                csv_file,
+                "my-bucket",
+                "token",
+                chunk_size=1000,
+                resume=True,
+                max_workers=1,
+            )
+
+    assert len(stand_in_server.chunks()) == 1
+
+
+def test_resumed_upload_probes_server_for_chunks(stand_in_server, csv_file, tmp_path):
+    """
+    Ensures that, with probe_server=True, a resumed upload skips the chunks the server reports it already has
+    """
+    client = UploadClient(
+        stand_in_server.url, manifest_dir=tmp_path / "manifests", probe_server=True
+    )
+
+    stand_in_server.statuses = [200, 200, 403]
+    with pytest.raises(HTTPError):
+        client.upload_csv(
+            csv_file, "my-bucket", "token", chunk_size=1000, resume=True
+        )
+
+    # The server has chunks 3, 5 and 6 but responds 204 to the test for chunk 4
+    stand_in_server.requests.clear()
+    stand_in_server.statuses = [200, 204]
+    client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000, resume=True)
+
+    probed = [
+        int(r["params"]["resumableChunkNumber"])
+        for r in stand_in_server.requests
+        if r["method"] == "GET"
+    ]
+    assert probed == [3, 4, 5, 6]
+    assert sorted(stand_in_server.chunks()) == [4]
+
+
+def test_upload_returns_per_chunk_results(stand_in_server, csv_file):
+    """
+    Ensures that the upload result records each chunk's bytes, latency and retries, and unpacks as (s3_key, s3_uri)
+    """
+    stand_in_server.statuses = [503]
+
+    client = UploadClient(stand_in_server.url)
+    result = client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000)
+    s3_key, s3_uri = result
+
+    assert s3_key == result.s3_key and s3_key.endswith("-data-csv")
+    assert s3_uri == f"s3://my-bucket/{s3_key}"
+    assert [chunk.chunk_number for chunk in result.chunks] == [1, 2, 3, 4, 5, 6]
+    assert [chunk.bytes for chunk in result.chunks] == [1000] * 5 + [500]
+    assert result.chunks[0].retries == 1
+    assert result.retries == 1
+    assert result.bytes_sent == csv_file.stat().st_size
+    assert all(chunk.latency > 0 for chunk in result.chunks)
+    assert result.throughput > 0
+
+
+def test_choose_chunk_size():
+    """
+    Ensures that adaptive chunk sizes grow with file size and upload rate, within the client's bounds
+    """
+    mib = 1048576
+    client = UploadClient(
+        "http://example.com/upload", min_chunk_size=5 * mib, max_chunk_size=50 * mib
+    )
+
+    # Small files use the minimum, very large files are kept within 10,000 chunks
+    assert client._choose_chunk_size(10 * mib) == 5 * mib
+    assert client._choose_chunk_size(200000 * mib) == 20 * mib
+
+    # Once a rate is known, chunks are sized to take around 5 seconds each
+    client._record_chunk_rate(ChunkResult(1, 4 * mib, latency=1.0))
+    assert client._choose_chunk_size(10 * mib) == 20 * mib
+
+    # And never exceed the maximum
+    client._record_chunk_rate(ChunkResult(2, 1000 * mib, latency=1.0))
+    assert client._choose_chunk_size(10 * mib) == 50 * mib
+
+
+def test_adaptive_upload_sizes_chunks_from_file(stand_in_server, csv_file):
+    """
+    Ensures that chunk_size=None picks a chunk size and sends it in the upload params
+    """
+    client = UploadClient(stand_in_server.url, min_chunk_size=2000)
+    result = client.upload_csv(csv_file, "my-bucket", "token", chunk_size=None)
+
+    assert result.chunk_size == 1048576
+    assert stand_in_server.requests[0]["params"]["resumableChunkSize"] == "1048576"
+    assert len(result.chunks) == 1
+
+
+def test_upload_new_csv_returns_s3_key_and_uri(stand_in_server, csv_file):
+    """
+    Ensures that upload_new_csv() returns the documented (s3_key, s3_uri) rather than None
+    """
+    client = UploadClient(stand_in_server.url)
+    s3_key, s3_uri = client.upload_new_csv(
+        csv_file, "token", "my-bucket", "My title", None, chunk_size=1000
+    )
+
+    assert s3_key.endswith("-data-csv")
+    assert s3_uri == f"s3://my-bucket/{s3_key}"
+    assert stand_in_server.requests[0]["params"]["title"] == "My title"
+
+
+@pytest.fixture
+def three_chunk_files(tmp_path):
+    paths = []
+    for name in ("a.csv", "b.sdmx"):
+        path = tmp_path / name
+        path.write_bytes(name[0].encode() * 2500)
+        paths.append(path)
+    return paths
+
+
+def test_upload_many_interleaves_files(stand_in_server, three_chunk_files):
+    """
+    Ensures that upload_many() takes a chunk from each file in turn and returns each file's result
+    """
+    client = UploadClient(stand_in_server.url)
+    batch = client.upload_many(
+        three_chunk_files, "my-bucket", "token", chunk_size=1000, max_in_flight=1
+    )
+
+    posted = [
+        (r["params"]["resumableFilename"], r["params"]["resumableChunkNumber"])
+        for r in stand_in_server.requests
+    ]
+    assert posted == [
+        ("a.csv", "1"),
+        ("b.sdmx", "1"),
+        ("a.csv", "2"),
+        ("b.sdmx", "2"),
+        ("a.csv", "3"),
+        ("b.sdmx", "3"),
+    ]
+    assert batch.failures == {}
+    assert list(batch.results) == [str(path) for path in three_chunk_files]
+    s3_key, s3_uri = batch.results[str(three_chunk_files[1])]
+    assert s3_key.endswith("-b-sdmx")
+    assert stand_in_server.requests[1]["params"]["resumableType"] == "application/xml"
+
+
+def test_upload_many_reports_failures(stand_in_server, three_chunk_files, tmp_path):
+    """
+    Ensures that a file failing, or not existing, does not stop the other files being uploaded
+    """
+    missing = tmp_path / "missing.csv"
+    # The first chunk of a.csv succeeds, the first chunk of b.sdmx is rejected
+    stand_in_server.statuses = [200, 403]
+
+    client = UploadClient(stand_in_server.url)
+    batch = client.upload_many(
+        three_chunk_files + [missing],
+        "my-bucket",
+        "token",
+        chunk_size=1000,
+        max_in_flight=1,
+    )
+
+    assert list(batch.results) == [str(three_chunk_files[0])]
+    assert len(batch.results[str(three_chunk_files[0])].chunks) == 3
+    assert isinstance(batch.failures[str(three_chunk_files[1])], HTTPError)
+    assert isinstance(batch.failures[str(missing)], FileNotFoundError)
+
+
+def test_upload_computes_checksums_in_one_pass(stand_in_server, csv_file, monkeypatch):
+    """
+    Ensures that whole file and per chunk digests are computed from the bytes read for upload, reading the file only once
+    """
+    opened = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if file == csv_file:
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+
+    client = UploadClient(stand_in_server.url, checksums=True)
+    result = client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000)
+
+    content = csv_file.read_bytes()
+    assert result.md5 == hashlib.md5(content).hexdigest()
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+    assert result.chunks[1].sha256 == hashlib.sha256(content[1000:2000]).hexdigest()
+    assert result.chunks[5].md5 == hashlib.md5(content[5000:]).hexdigest()
+    # Checksums are not sent unless asked for
+    assert "chunkMd5" not in stand_in_server.requests[0]["params"]
+    # The file is only opened by the reader that produces the chunks
+    assert len(opened) == 1
+
+
+def test_upload_sends_checksums(stand_in_server, csv_file):
+    """
+    Ensures that send_checksums=True sends each chunk's digests, and the whole file's digests with the last chunk
+    """
+    client = UploadClient(stand_in_server.url, send_checksums=True)
+    client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000)
+
+    content = csv_file.read_bytes()
+    params = {
+        int(r["params"]["resumableChunkNumber"]): r["params"]
+        for r in stand_in_server.requests
+    }
+    assert params[1]["chunkMd5"] == hashlib.md5(content[:1000]).hexdigest()
+    assert params[1]["chunkSha256"] == hashlib.sha256(content[:1000]).hexdigest()
+    assert "fileSha256" not in params[5]
+    assert params[6]["fileMd5"] == hashlib.md5(content).hexdigest()
+    assert params[6]["fileSha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_resumed_upload_checksums_cover_whole_file(stand_in_server, csv_file, tmp_path):
+    """
+    Ensures that the whole file digest of a resumed upload includes the chunks that were skipped
+    """
+    client = UploadClient(
+        stand_in_server.url, manifest_dir=tmp_path / "manifests", checksums=True
+    )
+    stand_in_server.statuses = [200, 200, 403]
+    with pytest.raises(HTTPError):
+        client.upload_csv(csv_file, "my-bucket", "token", chunk_size=1000, resume=True)
+
+    result = client.upload_csv(
+        csv_file, "my-bucket", "token", chunk_size=1000, resume=True
+    )
+
+    assert [chunk.chunk_number for chunk in result.chunks] == [3, 4, 5, 6]
+    assert result.sha256 == hashlib.sha256(csv_file.read_bytes()).hexdigest()
+
+
+class ShortReadStream(io.RawIOBase):
+    """
+    A stream that can't seek and returns at most 300 bytes per read, like a socket
+    """
+
+    def __init__(self, content: bytes):
+        self.content = io.BytesIO(content)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.content.read(min(size, 300) if size >= 0 else 300)
+
+
+@pytest.mark.parametrize(
+    "make_source",
+    [
+        lambda content: UploadSource(content, "data.csv"),
+        lambda content: UploadSource(io.BytesIO(content), "data.csv"),
+        lambda content: UploadSource(ShortReadStream(content), "data.csv", len(content)),
+        lambda content: UploadSource(
+            (content[i : i + 700] for i in range(0, len(content), 700)),
+            "data.csv",
+            len(content),
+        ),
+    ],
+    ids=["bytes", "seekable-stream", "short-read-stream", "iterator"],
+)
+def test_upload_from_source(stand_in_server, csv_file, make_source):
+    """
+    Ensures that bytes, streams and iterators of bytes are uploaded in whole chunks without a local file
+    """
+    content = csv_file.read_bytes()
+    client = UploadClient(stand_in_server.url, checksums=True)
+    result = client.upload_csv(
+        make_source(content), "my-bucket", "token", chunk_size=1000, max_workers=2
+    )
+
+    chunks = stand_in_server.chunks()
+    assert [len(chunks[n]) for n in sorted(chunks)] == [1000] * 5 + [500]
+    assert b"".join(chunks[n] for n in sorted(chunks)) == content
+    params = stand_in_server.requests[0]["params"]
+    assert params["resumableFilename"] == "data.csv"
+    assert params["resumableTotalSize"] == str(len(content))
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+
+
+def test_upload_source_needs_total_size():
+    """
+    Ensures that the size of an iterator or a stream that can't seek must be declared
+    """
+    with pytest.raises(ValueError):
+        UploadSource(iter([b"abc"]), "data.csv")
+    with pytest.raises(ValueError):
+        UploadSource(ShortReadStream(b"abc"), "data.csv")
+
+
+def test_upload_source_of_wrong_size_fails(stand_in_server):
+    """
+    Ensures that an upload fails if its source doesn't hold the declared number of bytes
+    """
+    client = UploadClient(stand_in_server.url)
+    with pytest.raises(ValueError):
+        client.upload_csv(
+            UploadSource(iter([b"a" * 1500]), "data.csv", 2000),
+            "my-bucket",
+            "token",
+            chunk_size=1000,
+        )
+    with pytest.raises(ValueError):
+        client.upload_csv(
+            UploadSource(iter([b"a" * 2500]), "data.csv", 2000),
+            "my-bucket",
+            "token",
+            chunk_size=1000,
+        )
+
+
+def test_upload_many_accepts_sources(stand_in_server, csv_file):
+    """
+    Ensures that upload_many() uploads an UploadSource alongside files, keyed by its filename
+    """
+    client = UploadClient(stand_in_server.url)
+    batch = client.upload_many(
+        [csv_file, UploadSource(b"a,b\n1,2\n", "other.csv")],
+        "my-bucket",
+        "token",
+        chunk_size=1000,
+    )
+
+    assert not batch.failures
+    assert set(batch.results) == {str(csv_file), "other.csv"}
+
+
+@mock_aws
+def test_upload_s3_object(stand_in_server, csv_file):
+    """
+    Ensures that an object in S3 is uploaded chunk by chunk, each chunk fetched with a ranged GET
+    """
+    s3_client = boto3.client("s3", region_name="eu-west-1")
+    s3_client.create_bucket(
+        Bucket="source-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    content = csv_file.read_bytes()
+    s3_client.put_object(Bucket="source-bucket", Key="data/data.csv", Body=content)
+
+    ranges = []
+
+    def record_range(params, **kwargs):
+        ranges.append(params.get("Range"))
+
+    s3_client.meta.events.register("before-parameter-build.s3.GetObject", record_range)
+    client = UploadClient(stand_in_server.url)
+    with patch("dpytools.s3.basic._get_s3_client", return_value=s3_client):
+        result = client.upload_s3_object(
+            "source-bucket/data/data.csv",
+            "my-bucket",
+            "token",
+            chunk_size=1000,
+            max_workers=2,
+        )
+
+    chunks = stand_in_server.chunks()
+    assert b"".join(chunks[n] for n in sorted(chunks)) == content
+    assert stand_in_server.requests[0]["params"]["resumableFilename"] == "data.csv"
+    assert stand_in_server.requests[0]["params"]["resumableType"] == "text/csv"
+    assert sorted(ranges) == sorted(
+        f"bytes={start}-{min(start + 1000, len(content)) - 1}"
+        for start in range(0, len(content), 1000)
+    )
+    assert result.s3_uri.startswith("s3://my-bucket/")
@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+from dpytools.json.stream import iter_json_items
+
+DOCUMENT = {
+    "id": "cpih",
+    "dimensions": [
+        {"name": "time", "options": ["2023", "2024"]},
+        {"name": "geography", "options": [{"code": "K02", "label": "UK ]}\\"}]},
+    ],
+    "observations": [1, -2.5e3, "a \"quoted\" [string]", None, True, {}, [], "é€😀"],
+    "a/b": {"~key": [1]},
+}
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1048576])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_iter_json_items_across_chunk_boundaries(chunk_size, indent):
+    """
+    Items are parsed correctly however the document is split into chunks,
+    including within strings, escapes and multi-byte characters.
+    """
+    data = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+
+    items = list(iter_json_items(_chunks(data, chunk_size), "/observations"))
+
+    assert items == DOCUMENT["observations"]
+
+
+@pytest.mark.parametrize("value", ["12.25", "-0.5e-3", "1E+30", "true", "null"])
+def test_iter_json_items_scalars_at_every_chunk_offset(value):
+    """
+    A number split by a chunk boundary straight after its ".", "e" or "E" is still a
+    valid (shorter) number, so must be read in full before it is parsed.
+    """
+    chunk_size = 8
+    for offset in range(chunk_size + len(value)):
+        data = f'{" " * offset}[{value}, {{"a": {value}}}]'.encode()
+        expected = json.loads(data)
+
+        assert list(iter_json_items(_chunks(data, chunk_size))) == expected
+        assert list(iter_json_items(io.BytesIO(data), chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize(
+    "pointer, expected",
+    [
+        ("/dimensions", DOCUMENT["dimensions"]),
+        ("/dimensions/1/options", DOCUMENT["dimensions"][1]["options"]),
+        ("/a~1b/~0key", [1]),
+        ("", list(DOCUMENT.items())),
+        ("/dimensions/0", [("name", "time"), ("options", ["2023", "2024"])]),
+    ],
+)
+def test_iter_json_items_pointers(pointer, expected):
+    """
+    The pointer selects an array (yielding its items) or an object (yielding its
+    key, value pairs) anywhere in the document.
+    """
+    data = json.dumps(DOCUMENT).encode()
+
+    assert list(iter_json_items(io.BytesIO(data), pointer, chunk_size=5)) == expected
+
+
+def test_iter_json_items_top_level_array():
+    data = b' [ {"a": 1} , 2,"three" ] '
+    assert list(iter_json_items(io.BytesIO(data))) == [{"a": 1}, 2, "three"]
+    assert list(iter_json_items(io.BytesIO(b"[]"))) == []
+
+
+def test_iter_json_items_reads_incrementally():
+    """
+    Items are yielded before the rest of the document has been read.
+    """
+    read = []
+
+    def chunks():
+        for chunk in (b'[{"a": 1},', b'{"b": 2},', b'{"c": 3}]'):
+            read.append(chunk)
+            yield chunk
+
+    items = iter_json_items(chunks())
+    assert next(items) == {"a": 1}
+    assert len(read) <= 2
+
+
+@pytest.mark.parametrize("pointer", ["/missing", "/dimensions/5", "/dimensions/name"])
+def test_iter_json_items_pointer_not_found(pointer):
+    data = json.dumps(DOCUMENT).encode()
+    with pytest.raises(KeyError):
+        list(iter_json_items(io.BytesIO(data), pointer))
+
+
+@pytest.mark.parametrize(
+    "data, pointer",
+    [
+        (b'{"id": "cpih"}', "/id"),
+        (b"[1, 2", ""),
+        (b'[1 2]', ""),
+        (b'["unterminated', ""),
+        (b"[1, 2]", "no-slash"),
+    ],
+)
+def test_iter_json_items_invalid(data, pointer):
+    with pytest.raises(ValueError):
+        list(iter_json_items(io.BytesIO(data), pointer))
@@ -0,0 +1,56 @@
+import boto3
+from moto import mock_aws
+import pytest
+
+from dpytools.s3.basic import (
+    _get_s3_client,
+    clear_s3_metadata_cache,
+    reset_s3_client_cache,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_s3_clients():
+    """
+    S3 clients and object metadata are cached between calls, so each test starts
+    (and ends) without clients built against another test's mocked credentials, or
+    metadata from another test's mocked bucket
+    """
+    reset_s3_client_cache()
+    clear_s3_metadata_cache()
+    yield
+    reset_s3_client_cache()
+    clear_s3_metadata_cache()
+
+
+@pytest.fixture
+def s3_client():
+    """
+    A client for a mocked S3 holding one empty bucket, "mybucket"
+    """
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(
+            Bucket="mybucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+        )
+        yield s3_client
+
+
+@pytest.fixture
+def record_s3_requests():
+    """
+    Returns a function that records a parameter (e.g "Range") of every request for an
+    S3 operation (e.g "GetObject") made by the default client of dpytools.s3, into the
+    list it returns
+    """
+
+    def record(operation_name: str, param_name: str) -> list:
+        requests = []
+        _get_s3_client(None).meta.events.register(
+            f"before-parameter-build.s3.{operation_name}",
+            lambda params, **kwargs: requests.append(params.get(param_name)),
+        )
+        return requests
+
+    return record
@@ -0,0 +1,302 @@
+import threading
+
+import pytest
+
+from dpytools.s3 import basic, bulk
+from dpytools.s3.basic import (
+    _cache_s3_metadata,
+    _cached_s3_metadata,
+    _forget_s3_metadata,
+    _get_s3_client,
+    upload_local_file_to_s3,
+)
+from dpytools.s3.bulk import (
+    download_prefix,
+    head_s3_objects,
+    list_s3_objects,
+    set_s3_bulk_max_workers,
+    sync_directory_to_s3,
+    sync_s3_prefix,
+    upload_directory,
+    _matches_etag,
+    _run_on_bulk_pool,
+)
+
+
+@pytest.fixture
+def dataset_dir(tmp_path):
+    """
+    A dataset folder of nested files
+    """
+    dataset_dir = tmp_path / "dataset"
+    for i in range(25):
+        local_file = dataset_dir / f"part-{i % 3}" / f"{i}.csv"
+        local_file.parent.mkdir(parents=True, exist_ok=True)
+        local_file.write_bytes(f"{i}\n".encode() * (i + 1))
+    return dataset_dir
+
+
+def test_list_s3_objects_pages_through_prefix(s3_client):
+    """
+    Every object under the prefix is listed across pages, and only those.
+    """
+    for i in range(7):
+        s3_client.put_object(Bucket="mybucket", Key=f"things/{i}.txt", Body=b"x")
+    s3_client.put_object(Bucket="mybucket", Key="things2/other.txt", Body=b"x")
+
+    keys = [o["Key"] for o in list_s3_objects("mybucket/things", page_size=3)]
+
+    assert keys == [f"things/{i}.txt" for i in range(7)]
+    assert len(list(list_s3_objects("mybucket"))) == 8
+
+
+def test_upload_directory_and_download_prefix(s3_client, dataset_dir, tmp_path):
+    """
+    A directory round-trips through S3, keeping its structure.
+    """
+    keys = upload_directory(dataset_dir, "mybucket/datasets/dataset/")
+    assert len(keys) == 25
+    assert "datasets/dataset/part-1/4.csv" in keys
+
+    output_dir = tmp_path / "output"
+    paths = download_prefix("mybucket/datasets/dataset", output_dir)
+
+    assert len(paths) == 25
+    for local_file in dataset_dir.rglob("*.csv"):
+        copy = output_dir / local_file.relative_to(dataset_dir)
+        assert copy.read_bytes() == local_file.read_bytes()
+
+
+def test_sync_skips_unchanged_files(s3_client, dataset_dir, tmp_path):
+    """
+    Syncing again only transfers what has changed since.
+    """
+    assert len(sync_directory_to_s3(dataset_dir, "mybucket/dataset").transferred) == 25
+    (dataset_dir / "part-0" / "0.csv").write_bytes(b"changed\n")
+    (dataset_dir / "new.csv").write_bytes(b"new\n")
+
+    result = sync_directory_to_s3(dataset_dir, "mybucket/dataset")
+    assert sorted(result.transferred) == ["dataset/new.csv", "dataset/part-0/0.csv"]
+    assert len(result.skipped) == 24
+
+    output_dir = tmp_path / "output"
+    assert len(sync_s3_prefix("mybucket/dataset", output_dir).transferred) == 26
+    (output_dir / "part-2" / "5.csv").write_bytes(b"edited locally\n")
+
+    result = sync_s3_prefix("mybucket/dataset", output_dir)
+    assert result.transferred == ["dataset/part-2/5.csv"]
+    assert len(result.skipped) == 25
+    assert (output_dir / "part-2" / "5.csv").read_bytes() == (
+        dataset_dir / "part-2" / "5.csv"
+    ).read_bytes()
+
+
+def test_matches_multipart_etag(s3_client, tmp_path):
+    """
+    A file uploaded in parts is recognised as unchanged by its multipart ETag.
+    """
+    local_file = tmp_path / "big.bin"
+    local_file.write_bytes(bytes(range(256)) * 45056)
+    upload_local_file_to_s3(
+        local_file, "mybucket/big.bin", part_size=5242880, multipart_threshold=5242880
+    )
+    etag = s3_client.head_object(Bucket="mybucket", Key="big.bin")["ETag"]
+    assert etag.strip('"').endswith("-3")
+
+    assert _matches_etag(local_file, etag)
+    local_file.write_bytes(bytes(range(256)) * 45055 + bytes(256))
+    assert not _matches_etag(local_file, etag)
+
+
+def test_matches_multipart_etag_reads_file_once(s3_client, tmp_path, monkeypatch):
+    """
+    Every part size that gives the ETag's number of parts (4 and 5 MiB for 11 MiB in 3
+    parts) is tried from a single read of the file.
+    """
+    local_file = tmp_path / "big.bin"
+    local_file.write_bytes(bytes(range(256)) * 45056)
+    upload_local_file_to_s3(
+        local_file, "mybucket/big.bin", part_size=5242880, multipart_threshold=5242880
+    )
+    etag = s3_client.head_object(Bucket="mybucket", Key="big.bin")["ETag"]
+    opened = []
+    monkeypatch.setattr(
+        bulk, "open", lambda *args: opened.append(args) or open(*args), raising=False
+    )
+
+    assert _matches_etag(local_file, etag)
+    assert len(opened) == 1
+
+
+def test_sync_compares_files_on_the_pool(s3_client, dataset_dir, monkeypatch):
+    """
+    Local files are compared with their objects by the shared thread pool, not by the
+    thread that called the sync.
+    """
+    sync_directory_to_s3(dataset_dir, "mybucket/dataset")
+    compared_on = []
+
+    def matches_etag(local_file, etag):
+        compared_on.append(threading.current_thread())
+        return _matches_etag(local_file, etag)
+
+    monkeypatch.setattr(bulk, "_matches_etag", matches_etag)
+
+    assert len(sync_directory_to_s3(dataset_dir, "mybucket/dataset").skipped) == 25
+    assert len(compared_on) == 25
+    assert threading.current_thread() not in compared_on
+
+
+def test_download_prefix_refuses_keys_outside_directory(s3_client, tmp_path):
+    s3_client.put_object(Bucket="mybucket", Key="things/../../evil.txt", Body=b"x")
+
+    with pytest.raises(ValueError):
+        download_prefix("mybucket/things", tmp_path / "output")
+    assert not (tmp_path / "evil.txt").exists()
+
+
+def test_failed_transfer_is_raised(s3_client, dataset_dir):
+    """
+    A failure stops the bulk operation and is raised.
+    """
+    set_s3_bulk_max_workers(2)
+    try:
+        with pytest.raises(Exception):
+            upload_directory(dataset_dir, "no-such-bucket/dataset")
+    finally:
+        set_s3_bulk_max_workers(10)
+
+
+def test_head_s3_objects(s3_client, record_s3_requests):
+    """
+    The metadata of many objects is fetched at once, with None for objects that
+    don't exist, and reused by later calls.
+    """
+    for i in range(30):
+        s3_client.put_object(Bucket="mybucket", Key=f"things/{i}.txt", Body=b"x" * i)
+    object_names = [f"mybucket/things/{i}.txt" for i in range(31)]
+    requests = record_s3_requests("HeadObject", "Key")
+
+    metadata = head_s3_objects(object_names)
+
+    assert list(metadata) == object_names
+    assert [m["ContentLength"] for m in list(metadata.values())[:30]] == list(range(30))
+    assert metadata["mybucket/things/30.txt"] is None
+    assert len(requests) == 31
+
+    assert head_s3_objects(object_names[:30]) == {n: metadata[n] for n in object_names[:30]}
+    assert len(requests) == 31
+    # Missing objects aren't cached, nor is anything with max_age=0
+    head_s3_objects(object_names[29:], max_age=0)
+    assert len(requests) == 33
+
+
+def test_head_s3_objects_reuses_listing(s3_client, record_s3_requests):
+    """
+    Objects already seen in a listing need no HEAD request.
+    """
+    for i in range(5):
+        s3_client.put_object(Bucket="mybucket", Key=f"things/{i}.txt", Body=b"x" * i)
+    listed = {o["Key"]: o for o in list_s3_objects("mybucket/things")}
+    requests = record_s3_requests("HeadObject", "Key")
+
+    metadata = head_s3_objects([f"mybucket/things/{i}.txt" for i in range(5)])
+
+    assert requests == []
+    for i in range(5):
+        assert metadata[f"mybucket/things/{i}.txt"]["ContentLength"] == i
+        assert metadata[f"mybucket/things/{i}.txt"]["ETag"] == listed[f"things/{i}.txt"]["ETag"]
+
+
+def test_head_s3_objects_forgets_uploaded_objects(s3_client, tmp_path):
+    """
+    Uploading an object through dpytools drops its cached metadata.
+    """
+    local_file = tmp_path / "data.txt"
+    local_file.write_bytes(b"old")
+    upload_local_file_to_s3(local_file, "mybucket/data.txt")
+    assert head_s3_objects(["mybucket/data.txt"])["mybucket/data.txt"]["ContentLength"] == 3
+
+    local_file.write_bytes(b"newer")
+    upload_local_file_to_s3(local_file, "mybucket/data.txt")
+
+    assert head_s3_objects(["mybucket/data.txt"])["mybucket/data.txt"]["ContentLength"] == 5
+
+
+def test_s3_metadata_cache_forgets_every_profile_and_is_bounded(monkeypatch):
+    """
+    Forgetting an object drops what is cached for it under every profile, and the
+    cache keeps only the most recently fetched objects.
+    """
+    monkeypatch.setattr(basic, "_S3_METADATA_MAX_ENTRIES", 3)
+    for profile_name in (None, "other"):
+        _cache_s3_metadata(profile_name, "mybucket", "a.txt", {"ContentLength": 1})
+    assert _cached_s3_metadata("other", "mybucket", "a.txt", 60) == {"ContentLength": 1}
+
+    _forget_s3_metadata("mybucket", "a.txt")
+    assert _cached_s3_metadata(None, "mybucket", "a.txt", 60) is None
+    assert _cached_s3_metadata("other", "mybucket", "a.txt", 60) is None
+
+    for key in ("b.txt", "c.txt", "d.txt", "b.txt", "e.txt"):
+        _cache_s3_metadata(None, "mybucket", key, {})
+    cached = [
+        key
+        for key in ("b.txt", "c.txt", "d.txt", "e.txt")
+        if _cached_s3_metadata(None, "mybucket", key, 60) is not None
+    ]
+    assert cached == ["b.txt", "d.txt", "e.txt"]
+
+
+def test_sync_requests_are_bounded_by_the_pool(s3_client, tmp_path):
+    """
+    Each file is transferred a request at a time, so no more requests are made at once
+    than the shared pool has workers, including for objects fetched in parts.
+    """
+    for i in range(6):
+        s3_client.put_object(Bucket="mybucket", Key=f"big/{i}.bin", Body=b"x" * 20000000)
+    client = _get_s3_client(None)
+    get_object = client.get_object
+    lock = threading.Lock()
+    in_flight = []
+    most_in_flight = 0
+
+    def counting_get_object(**kwargs):
+        nonlocal most_in_flight
+        with lock:
+            in_flight.append(kwargs)
+            most_in_flight = max(most_in_flight, len(in_flight))
+        try:
+            return get_object(**kwargs)
+        finally:
+            with lock:
+                in_flight.remove(kwargs)
+
+    client.get_object = counting_get_object
+    set_s3_bulk_max_workers(2)
+    try:
+        result = sync_s3_prefix("mybucket/big", tmp_path / "output")
+    finally:
+        set_s3_bulk_max_workers(10)
+
+    assert len(result.transferred) == 6
+    assert most_in_flight <= 2
+    assert sorted(p.name for p in (tmp_path / "output").iterdir()) == [
+        f"{i}.bin" for i in range(6)
+    ]
+
+
+def test_set_s3_bulk_max_workers_while_running():
+    """
+    Resizing the pool doesn't stop operations already running on the old one.
+    """
+
+    def tasks():
+        for i in range(20):
+            if i == 5:
+                set_s3_bulk_max_workers(3)
+            yield (lambda n: n * 2), (i,)
+
+    try:
+        assert _run_on_bulk_pool(tasks()) == [i * 2 for i in range(20)]
+    finally:
+        set_s3_bulk_max_workers(10)
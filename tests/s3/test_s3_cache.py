@@ -0,0 +1,84 @@
+import os
+import time
+
+import pytest
+
+from dpytools.s3.basic import (
+    read_s3_file_content,
+    read_s3_file_content_as_dict,
+)
+from dpytools.s3.cache import S3DiskCache
+
+
+@pytest.fixture(autouse=True)
+def codelist(s3_client):
+    """
+    A small json object in the mocked bucket, for each test to read through a cache
+    """
+    s3_client.put_object(
+        Bucket="mybucket", Key="codelists/sex.json", Body=b'{"codes": ["F", "M"]}'
+    )
+
+
+def test_cache_revalidates_with_etag(s3_client, tmp_path, record_s3_requests):
+    """
+    A cached object is revalidated with a conditional GET, and counted as a hit
+    if it hasn't changed.
+    """
+    cache = S3DiskCache(tmp_path / "cache")
+    requests = record_s3_requests("GetObject", "IfNoneMatch")
+
+    first = read_s3_file_content_as_dict("mybucket/codelists/sex.json", cache=cache)
+    second = read_s3_file_content_as_dict("mybucket/codelists/sex.json", cache=cache)
+
+    assert first == second == {"codes": ["F", "M"]}
+    etag = s3_client.head_object(Bucket="mybucket", Key="codelists/sex.json")["ETag"]
+    assert requests == [None, etag]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_fetches_changed_object(s3_client, tmp_path):
+    cache = S3DiskCache(tmp_path / "cache")
+    read_s3_file_content("mybucket/codelists/sex.json", cache=cache)
+    s3_client.put_object(Bucket="mybucket", Key="codelists/sex.json", Body=b"changed")
+
+    assert read_s3_file_content("mybucket/codelists/sex.json", cache=cache) == b"changed"
+    assert (cache.hits, cache.misses) == (0, 2)
+    # The old version's content is removed
+    assert len(list((tmp_path / "cache").glob("*.bin"))) == 1
+
+
+def test_cache_ttl_skips_round_trip(s3_client, tmp_path, record_s3_requests):
+    """
+    Within the ttl, cached content is used without any request, and it is shared
+    between cache objects (i.e between runs) using the same directory.
+    """
+    read_s3_file_content("mybucket/codelists/sex.json", cache=S3DiskCache(tmp_path / "cache"))
+    requests = record_s3_requests("GetObject", "IfNoneMatch")
+
+    cache = S3DiskCache(tmp_path / "cache", ttl=60)
+    assert read_s3_file_content("mybucket/codelists/sex.json", cache=cache) == b'{"codes": ["F", "M"]}'
+    assert requests == []
+    assert cache.hits == 1
+
+
+def test_cache_evicts_least_recently_used(s3_client, tmp_path):
+    for name in ("a", "b", "c"):
+        s3_client.put_object(Bucket="mybucket", Key=f"{name}.txt", Body=name.encode() * 400)
+    cache = S3DiskCache(tmp_path / "cache", max_size=1000)
+
+    read_s3_file_content("mybucket/a.txt", cache=cache)
+    read_s3_file_content("mybucket/b.txt", cache=cache)
+    # Make "a" the most recently used, well clear of filesystem timestamp granularity
+    content_of_a = next(
+        path for path in (tmp_path / "cache").glob("*.bin") if path.read_bytes()[:1] == b"a"
+    )
+    os.utime(content_of_a, (time.time() + 10, time.time() + 10))
+    read_s3_file_content("mybucket/c.txt", cache=cache)
+
+    cached = sorted(path.read_bytes()[:1] for path in (tmp_path / "cache").glob("*.bin"))
+    assert cached == [b"a", b"c"]
+    assert len(list((tmp_path / "cache").glob("*.json"))) == 2
+
+    cache.clear()
+    assert list((tmp_path / "cache").iterdir()) == []
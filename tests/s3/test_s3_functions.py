@@ -1,4 +1,17 @@
+import base64
+import bz2
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import sys
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.response import StreamingBody
 from moto import mock_aws
 import pytest
 from pathlib import Path
@@ -11,8 +24,17 @@ from dpytools.s3.basic import (
     read_s3_file_content_as_dict,
     download_s3_file_content_to_local,
     upload_local_file_to_s3,
-    decompress_s3_tar
+    decompress_s3_tar,
+    iter_s3_chunks,
+    iter_s3_json_items,
+    iter_s3_lines,
+    iter_s3_object_ranges,
+    read_s3_range,
+    reset_s3_client_cache,
+    set_s3_client_config,
+    _get_s3_client,
 )
+from dpytools.s3.cache import S3DiskCache
 
 # Convenience reference path to the test_cases directory
 this_case_dir = Path(Path(__file__).parent.parent / "test_cases")
@@ -86,6 +108,76 @@ def test_read_s3_file_content_as_dict_raises_without_json_extension():
     assert "Object name must end with '.json'" in str(e.value)
 
 
+@mock_aws
+@pytest.mark.parametrize(
+    "key, compress, extra_args",
+    [
+        ("mykey.json.gz", gzip.compress, {}),
+        ("mykey.json", gzip.compress, {"ContentEncoding": "gzip"}),
+        ("mykey.json.bz2", bz2.compress, {}),
+        ("mykey.json.xz", lzma.compress, {}),
+    ],
+    ids=["gz-extension", "gzip-content-encoding", "bz2-extension", "xz-extension"],
+)
+def test_read_s3_file_content_as_dict_compressed(mock_s3_client, key, compress, extra_args):
+    """
+    Compressed json files are decompressed as they are read.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    content = json.dumps({"key": "value", "items": list(range(1000))}).encode()
+    body = compress(content)
+    mock_s3_client.put_object(Bucket='mybucket', Body=body, Key=key, **extra_args)
+
+    assert read_s3_file_content_as_dict(f'mybucket/{key}') == json.loads(content)
+    assert read_s3_file_content(f'mybucket/{key}', decompress=True) == content
+    assert read_s3_file_content(f'mybucket/{key}') == body
+
+
+@mock_aws
+def test_read_s3_file_content_as_dict_compressed_through_cache(mock_s3_client, tmp_path):
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    mock_s3_client.put_object(Bucket='mybucket', Body=gzip.compress(b'{"key": "value"}'), Key="mykey.json.gz")
+    cache = S3DiskCache(tmp_path)
+
+    for _ in range(2):
+        assert read_s3_file_content_as_dict('mybucket/mykey.json.gz', cache=cache) == {"key": "value"}
+    assert cache.hits == 1
+
+
+@mock_aws
+def test_read_s3_file_content_zstd(mock_s3_client):
+    """
+    Zstandard compressed objects are read with the optional zstandard package.
+    """
+    zstandard = pytest.importorskip("zstandard")
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    compressor = zstandard.ZstdCompressor()
+    body = compressor.compress(b'{"key": ') + compressor.compress(b'"value"}')
+    mock_s3_client.put_object(Bucket='mybucket', Body=body, Key="mykey.json.zst")
+
+    assert read_s3_file_content_as_dict('mybucket/mykey.json.zst') == {"key": "value"}
+
+
+@mock_aws
+def test_read_s3_file_content_zstd_without_zstandard(mock_s3_client, monkeypatch):
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    mock_s3_client.put_object(Bucket='mybucket', Body=b"", Key="mykey.json.zst")
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+
+    with pytest.raises(ImportError) as e:
+        read_s3_file_content_as_dict('mybucket/mykey.json.zst')
+
+    assert "pip install zstandard" in str(e.value)
+
+
 @mock_aws
 def test_download_s3_object_to_local(mock_s3_client, tmp_path):
     mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
@@ -203,3 +295,661 @@ def test_decompress_s3_tar_raises_error_when_file_is_not_tar(mock_s3_client):
 
     assert "This function currently only handles archives using the tar extension" in str(e.value)
 
+
+
+@mock_aws
+def test_iter_s3_object_ranges(mock_s3_client):
+    """
+    iter_s3_object_ranges yields the whole object, in order,
+    in pieces of the requested size.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    content = bytes(range(256)) * 10
+    mock_s3_client.put_object(Bucket='mybucket', Body=content, Key="mykey")
+
+    pieces = list(iter_s3_object_ranges('mybucket/mykey', range_size=1000, max_workers=2))
+    assert [len(piece) for piece in pieces] == [1000, 1000, 560]
+    assert b"".join(pieces) == content
+
+
+@mock_aws
+def test_s3_clients_are_cached():
+    """
+    The same S3 client is reused across calls (and threads) for the same
+    profile, region and endpoint, until the cache is reset.
+    """
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = set(executor.map(lambda _: id(_get_s3_client(None)), range(32)))
+    assert len(clients) == 1
+
+    client = _get_s3_client(None)
+    assert _get_s3_client(None) is client
+    assert _get_s3_client(None, region_name="eu-west-2") is not client
+    assert _get_s3_client(None, endpoint_url="http://localhost:9000") is not client
+
+    reset_s3_client_cache()
+    assert _get_s3_client(None) is not client
+
+
+@mock_aws
+def test_set_s3_client_config():
+    """
+    A botocore Config set with set_s3_client_config is used by new clients.
+    """
+    client = _get_s3_client(None)
+    set_s3_client_config(Config(max_pool_connections=32))
+    try:
+        configured = _get_s3_client(None)
+        assert configured is not client
+        assert configured.meta.config.max_pool_connections == 32
+    finally:
+        set_s3_client_config(None)
+
+
+@mock_aws
+@pytest.mark.parametrize("multipart_threshold", [16777216, 1000])
+def test_download_s3_object_to_local_is_binary_safe(
+    mock_s3_client, tmp_path, multipart_threshold
+):
+    """
+    Downloads write the exact bytes of the object, whether streamed in one
+    request or fetched as ranged parts written at their offsets.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    content = bytes(range(256)) * 20
+    mock_s3_client.put_object(Bucket='mybucket', Body=content, Key="data.bin")
+    local_path = tmp_path / 'data.bin'
+
+    download_s3_file_content_to_local(
+        'mybucket/data.bin',
+        local_path,
+        part_size=1000,
+        max_workers=3,
+        multipart_threshold=multipart_threshold,
+        buffer_size=300,
+    )
+
+    assert local_path.read_bytes() == content
+
+
+@mock_aws
+def test_download_s3_object_to_local_removes_partial_file(mock_s3_client, tmp_path):
+    """
+    A failed download doesn't leave a partly written file behind.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    mock_s3_client.put_object(Bucket='mybucket', Body=b"x" * 5000, Key="data.bin")
+    local_path = tmp_path / 'data.bin'
+
+    client = _get_s3_client(None)
+    get_object = client.get_object
+
+    def fail_ranged_gets(**kwargs):
+        if "Range" in kwargs and kwargs["Range"].startswith("bytes=3000"):
+            raise ConnectionError("connection reset")
+        return get_object(**kwargs)
+
+    client.get_object = fail_ranged_gets
+    with pytest.raises(ConnectionError):
+        download_s3_file_content_to_local(
+            'mybucket/data.bin', local_path, part_size=1000, multipart_threshold=1000
+        )
+    assert list(tmp_path.iterdir()) == []
+
+
+@mock_aws
+def test_download_s3_object_to_local_keeps_existing_file(mock_s3_client, tmp_path):
+    """
+    A download that fails, before or after any content arrives, leaves a file already
+    at the local path as it was.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    mock_s3_client.put_object(Bucket='mybucket', Body=b"x" * 5000, Key="data.bin")
+    local_path = tmp_path / 'data.bin'
+    local_path.write_bytes(b"existing")
+
+    with pytest.raises(ClientError):
+        download_s3_file_content_to_local('mybucket/missing.bin', local_path)
+    assert local_path.read_bytes() == b"existing"
+
+    client = _get_s3_client(None)
+    get_object = client.get_object
+
+    def fail_ranged_gets(**kwargs):
+        if kwargs["Range"].startswith("bytes=3000"):
+            raise ConnectionError("connection reset")
+        return get_object(**kwargs)
+
+    client.get_object = fail_ranged_gets
+    with pytest.raises(ConnectionError):
+        download_s3_file_content_to_local(
+            'mybucket/data.bin', local_path, part_size=1000, multipart_threshold=1000
+        )
+    assert list(tmp_path.iterdir()) == [local_path]
+    assert local_path.read_bytes() == b"existing"
+
+
+@mock_aws
+def test_download_s3_object_to_local_does_not_get_whole_large_object(
+    mock_s3_client, tmp_path, record_s3_requests
+):
+    """
+    Objects over the multipart threshold are only fetched as ranged parts.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    mock_s3_client.put_object(Bucket='mybucket', Body=b"x" * 5000, Key="data.bin")
+    ranges = record_s3_requests("GetObject", "Range")
+
+    download_s3_file_content_to_local(
+        'mybucket/data.bin', tmp_path / 'data.bin', part_size=1000, multipart_threshold=1000
+    )
+
+    assert sorted(ranges) == [f"bytes={i}-{i + 999}" for i in range(0, 5000, 1000)]
+
+
+def _corrupt_downloads(client, byte_offset: int):
+    """
+    Flip a byte of what the client receives at `byte_offset` of the object, as though
+    it had been corrupted in transfer.
+    """
+    get_object = client.get_object
+
+    def corrupted_get_object(**kwargs):
+        response = get_object(**kwargs)
+        start = 0
+        if "Range" in kwargs:
+            start = int(kwargs["Range"][len("bytes="):].split("-")[0])
+        content = bytearray(response["Body"].read())
+        if start <= byte_offset < start + len(content):
+            content[byte_offset - start] ^= 0xFF
+        response["Body"] = StreamingBody(io.BytesIO(bytes(content)), len(content))
+        return response
+
+    client.get_object = corrupted_get_object
+
+
+@mock_aws
+@pytest.mark.parametrize("multipart_threshold", [16777216, 1000], ids=["single-get", "ranged-parts"])
+@pytest.mark.parametrize("checksum_algorithm", ["SHA256", "CRC32", None])
+def test_download_s3_object_to_local_verify(
+    mock_s3_client, tmp_path, multipart_threshold, checksum_algorithm
+):
+    """
+    With verify=True, the content is checked against the ETag and any additional
+    checksum as it arrives, and a corrupted download fails without replacing the
+    local file.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    content = bytes(range(256)) * 20
+    extra_args = {"ChecksumAlgorithm": checksum_algorithm} if checksum_algorithm else {}
+    mock_s3_client.put_object(Bucket='mybucket', Body=content, Key="data.bin", **extra_args)
+    local_path = tmp_path / 'data.bin'
+    download_args = dict(part_size=1000, multipart_threshold=multipart_threshold, verify=True)
+
+    download_s3_file_content_to_local('mybucket/data.bin', local_path, **download_args)
+    assert local_path.read_bytes() == content
+
+    _corrupt_downloads(_get_s3_client(None), 4321)
+    with pytest.raises(ValueError) as e:
+        download_s3_file_content_to_local('mybucket/data.bin', local_path, **download_args)
+    assert "does not match its checksums" in str(e.value)
+    assert local_path.read_bytes() == content
+    assert list(tmp_path.iterdir()) == [local_path]
+
+
+@mock_aws
+def test_upload_and_download_multipart_verify(
+    mock_s3_client, tmp_path, eleven_mib_file, record_s3_requests
+):
+    """
+    Multipart uploads are verified against their ETag, and keep an additional
+    checksum, both of which a download in different sized parts checks.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    sent_md5s = record_s3_requests("UploadPart", "ContentMD5")
+
+    upload_local_file_to_s3(
+        eleven_mib_file,
+        'mybucket/data.bin',
+        part_size=5242880,
+        multipart_threshold=5242880,
+        verify=True,
+        checksum_algorithm="SHA256",
+    )
+    assert len(sent_md5s) == 3 and all(sent_md5s)
+    result = mock_s3_client.get_object(Bucket='mybucket', Key='data.bin', ChecksumMode="ENABLED")
+    assert result["ChecksumSHA256"].endswith("-3")
+
+    local_path = tmp_path / 'downloaded.bin'
+    download_args = dict(part_size=1048576, multipart_threshold=1048576, verify=True)
+    download_s3_file_content_to_local('mybucket/data.bin', local_path, **download_args)
+    assert local_path.read_bytes() == eleven_mib_file.read_bytes()
+
+    _corrupt_downloads(_get_s3_client(None), 7340032)
+    with pytest.raises(ValueError) as e:
+        download_s3_file_content_to_local('mybucket/data.bin', local_path, **download_args)
+    # Both the ETag and the additional checksum are checked
+    assert "MD5" in str(e.value) and "SHA256" in str(e.value)
+
+
+@mock_aws
+def test_upload_local_file_to_s3_verify_etag(mock_s3_client, tmp_path):
+    """
+    With verify=True, a PUT is sent with the md5 of the file, and an ETag that doesn't
+    match that md5 is an error.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    local_file = tmp_path / 'data.txt'
+    local_file.write_bytes(b"myvalue")
+    client = _get_s3_client(None)
+    put_object = client.put_object
+    sent = []
+
+    def record_put_object(**kwargs):
+        sent.append(kwargs)
+        return put_object(**kwargs)
+
+    client.put_object = record_put_object
+    upload_local_file_to_s3(local_file, 'mybucket/data.txt', verify=True)
+    assert sent[0]["ContentMD5"] == base64.b64encode(hashlib.md5(b"myvalue").digest()).decode()
+
+    def wrong_etag(**kwargs):
+        response = put_object(**kwargs)
+        response["ETag"] = '"00000000000000000000000000000000"'
+        return response
+
+    client.put_object = wrong_etag
+    with pytest.raises(ValueError):
+        upload_local_file_to_s3(local_file, 'mybucket/data.txt', verify=True)
+
+
+@mock_aws
+def test_upload_local_file_to_s3_retries_bad_digest(mock_s3_client, eleven_mib_file):
+    """
+    A part that S3 rejects because it was corrupted on the way is sent again.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    client = _get_s3_client(None)
+    upload_part = client.upload_part
+    attempts = []
+
+    def bad_digest_first_time(**kwargs):
+        attempts.append(kwargs["PartNumber"])
+        if attempts.count(1) == 1 and kwargs["PartNumber"] == 1:
+            raise ClientError(
+                {
+                    "Error": {"Code": "BadDigest", "Message": "The Content-MD5 you specified did not match what we received."},
+                    "ResponseMetadata": {"HTTPStatusCode": 400},
+                },
+                "UploadPart",
+            )
+        return upload_part(**kwargs)
+
+    client.upload_part = bad_digest_first_time
+    upload_local_file_to_s3(
+        eleven_mib_file,
+        'mybucket/data.bin',
+        part_size=5242880,
+        multipart_threshold=5242880,
+        verify=True,
+    )
+
+    assert sorted(attempts) == [1, 1, 2, 3]
+
+
+@pytest.fixture
+def eleven_mib_file(tmp_path):
+    """
+    A binary file that splits into three parts of S3's minimum part size
+    """
+    local_file = tmp_path / 'data.bin'
+    local_file.write_bytes(bytes(range(256)) * 45056)
+    return local_file
+
+
+@mock_aws
+def test_upload_local_file_to_s3_multipart(mock_s3_client, eleven_mib_file):
+    """
+    Files over the multipart threshold are uploaded in parts, byte for byte,
+    reporting progress as each part is sent.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    progress = []
+
+    upload_local_file_to_s3(
+        eleven_mib_file,
+        'mybucket/data.bin',
+        part_size=5242880,
+        max_workers=2,
+        multipart_threshold=5242880,
+        progress_callback=progress.append,
+    )
+
+    result = mock_s3_client.get_object(Bucket='mybucket', Key='data.bin')
+    assert result["Body"].read() == eleven_mib_file.read_bytes()
+    # Multipart ETags end with the number of parts
+    assert result["ETag"].strip('"').endswith("-3")
+    assert sorted(progress) == [1048576, 5242880, 5242880]
+
+
+@mock_aws
+def test_upload_local_file_to_s3_aborts_failed_multipart(mock_s3_client, eleven_mib_file):
+    """
+    A part that can't be uploaded aborts the multipart upload.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    client = _get_s3_client(None)
+    upload_part = client.upload_part
+
+    def deny_second_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ClientError(
+                {
+                    "Error": {"Code": "AccessDenied", "Message": "Access Denied"},
+                    "ResponseMetadata": {"HTTPStatusCode": 403},
+                },
+                "UploadPart",
+            )
+        return upload_part(**kwargs)
+
+    client.upload_part = deny_second_part
+    with pytest.raises(ClientError):
+        upload_local_file_to_s3(
+            eleven_mib_file,
+            'mybucket/data.bin',
+            part_size=5242880,
+            multipart_threshold=5242880,
+        )
+
+    assert "Uploads" not in mock_s3_client.list_multipart_uploads(Bucket='mybucket')
+    assert "Contents" not in mock_s3_client.list_objects_v2(Bucket='mybucket')
+
+
+@mock_aws
+def test_upload_local_file_to_s3_retries_failed_part(mock_s3_client, eleven_mib_file):
+    """
+    A part that fails with a transient error is retried on its own.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    client = _get_s3_client(None)
+    upload_part = client.upload_part
+    attempts = []
+
+    def drop_first_attempt_at_part_two(**kwargs):
+        attempts.append(kwargs["PartNumber"])
+        if attempts.count(2) == 1 and kwargs["PartNumber"] == 2:
+            raise EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+        return upload_part(**kwargs)
+
+    client.upload_part = drop_first_attempt_at_part_two
+    upload_local_file_to_s3(
+        eleven_mib_file,
+        'mybucket/data.bin',
+        part_size=5242880,
+        multipart_threshold=5242880,
+    )
+
+    assert sorted(attempts) == [1, 2, 2, 3]
+    result = mock_s3_client.get_object(Bucket='mybucket', Key='data.bin')
+    assert result["Body"].read() == eleven_mib_file.read_bytes()
+
+
+@mock_aws
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize(
+    "extension, mode",
+    [(".tar", "w"), (".tar.gz", "w:gz"), (".tgz", "w:gz"), (".tar.bz2", "w:bz2"), (".tar.xz", "w:xz")],
+)
+def test_decompress_s3_tar_compressed(
+    mock_s3_client, tmp_path, path_to_mostly_empty_csv, path_to_mostly_empty_json, stream, extension, mode
+):
+    """
+    Compressed tar archives can be decompressed, with or without streaming.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    tar_file = tmp_path / f"s3{extension}"
+    with tarfile.open(tar_file, mode) as tar:
+        tar.add(path_to_mostly_empty_csv, arcname=path_to_mostly_empty_csv.name)
+        tar.add(path_to_mostly_empty_json, arcname=f"nested/{path_to_mostly_empty_json.name}")
+    upload_local_file_to_s3(tar_file, f"mybucket/s3{extension}")
+
+    output_dir = tmp_path / "output"
+    decompress_s3_tar(f"mybucket/s3{extension}", output_dir, stream=stream)
+
+    assert (output_dir / path_to_mostly_empty_csv.name).read_bytes() == path_to_mostly_empty_csv.read_bytes()
+    assert (output_dir / "nested" / path_to_mostly_empty_json.name).read_bytes() == path_to_mostly_empty_json.read_bytes()
+
+
+@mock_aws
+def test_decompress_s3_tar_stream_reads_every_gzip_member(mock_s3_client, tmp_path, path_to_mostly_empty_csv):
+    """
+    A streamed .tar.gz made of several concatenated gzip members is extracted in full.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    tar_file = tmp_path / "s3.tar"
+    with tarfile.open(tar_file, "w") as tar:
+        for i in range(3):
+            tar.add(path_to_mostly_empty_csv, arcname=f"{i}.csv")
+    content = tar_file.read_bytes()
+    third = len(content) // 3
+    body = b"".join(
+        gzip.compress(content[start:end])
+        for start, end in [(0, third), (third, 2 * third), (2 * third, len(content))]
+    )
+    mock_s3_client.put_object(Bucket='mybucket', Key='s3.tar.gz', Body=body)
+
+    output_dir = tmp_path / "output"
+    decompress_s3_tar("mybucket/s3.tar.gz", output_dir, stream=True)
+
+    assert sorted(p.name for p in output_dir.iterdir()) == ["0.csv", "1.csv", "2.csv"]
+
+
+def _put_tar(s3_client, key, members):
+    """
+    Put a tar archive of {name: content} (content None for a directory, a
+    ("symlink", target) or ("hardlink", target) pair for a link, or a TarInfo
+    for a member without content) in mybucket
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            if isinstance(content, tarfile.TarInfo):
+                tar.addfile(content)
+            elif content is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            elif isinstance(content, tuple):
+                info.type = tarfile.SYMTYPE if content[0] == "symlink" else tarfile.LNKTYPE
+                info.linkname = content[1]
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    s3_client.put_object(Bucket='mybucket', Key=key, Body=buffer.getvalue())
+
+
+@mock_aws
+@pytest.mark.parametrize("stream", [False, True])
+def test_decompress_s3_tar_pattern_and_workers(mock_s3_client, tmp_path, stream):
+    """
+    Only members matching the pattern are extracted, written by a pool of threads.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    members = {"data": None}
+    members.update({f"data/{i}.csv": f"{i}\n".encode() * 1000 for i in range(50)})
+    members["data/metadata.json"] = b"{}"
+    _put_tar(mock_s3_client, "s3.tar", members)
+
+    output_dir = tmp_path / "output"
+    decompress_s3_tar(
+        "mybucket/s3.tar", output_dir, stream=stream, pattern=r"\.csv$", max_workers=4
+    )
+
+    extracted = sorted(p.name for p in (output_dir / "data").iterdir())
+    assert extracted == sorted(f"{i}.csv" for i in range(50))
+    assert (output_dir / "data" / "7.csv").read_bytes() == members["data/7.csv"]
+
+
+@mock_aws
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_decompress_s3_tar_read_only_directory(mock_s3_client, tmp_path, stream, max_workers):
+    """
+    A read-only directory is extracted into before its mode and time are set, as
+    TarFile.extractall() does, so its files can be written and it keeps its time.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    read_only = tarfile.TarInfo("ro")
+    read_only.type = tarfile.DIRTYPE
+    read_only.mode = 0o555
+    read_only.mtime = 1000000000
+    _put_tar(mock_s3_client, "s3.tar", {"ro": read_only, "ro/f.txt": b"content"})
+
+    output_dir = tmp_path / "output"
+    decompress_s3_tar("mybucket/s3.tar", output_dir, stream=stream, max_workers=max_workers)
+
+    assert (output_dir / "ro" / "f.txt").read_bytes() == b"content"
+    assert (output_dir / "ro").stat().st_mode & 0o777 == 0o555
+    assert (output_dir / "ro").stat().st_mtime == 1000000000
+    (output_dir / "ro").chmod(0o755)
+
+
+@mock_aws
+@pytest.mark.parametrize("stream", [False, True])
+def test_decompress_s3_tar_hard_link_with_workers(mock_s3_client, tmp_path, stream):
+    """
+    A hard link is only made once the file it links to has been written by the pool,
+    so a streamed archive never has to seek back for it.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    _put_tar(mock_s3_client, "h.tar", {"a.txt": b"a" * 100000, "b.txt": ("hardlink", "a.txt")})
+
+    output_dir = tmp_path / "output"
+    decompress_s3_tar("mybucket/h.tar", output_dir, stream=stream, max_workers=4)
+
+    assert (output_dir / "b.txt").read_bytes() == b"a" * 100000
+    assert (output_dir / "b.txt").samefile(output_dir / "a.txt")
+
+
+@mock_aws
+@pytest.mark.parametrize(
+    "members",
+    [
+        {"../evil.txt": b"evil"},
+        {"/tmp/evil.txt": b"evil"},
+        {"link": ("symlink", "/etc"), "link/evil.txt": b"evil"},
+        {"innocent": None, "innocent/link": ("symlink", "../../evil")},
+    ],
+    ids=["parent-dir", "absolute", "symlink-absolute", "symlink-relative"],
+)
+def test_decompress_s3_tar_rejects_path_traversal(mock_s3_client, tmp_path, members):
+    """
+    Members that would be written, or link, outside of the directory are refused.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    _put_tar(mock_s3_client, "s3.tar", members)
+    output_dir = tmp_path / "nested" / "output"
+
+    with pytest.raises(ValueError):
+        decompress_s3_tar("mybucket/s3.tar", output_dir, stream=True)
+
+    assert not (tmp_path / "nested" / "evil.txt").exists()
+    assert not (tmp_path / "evil").exists()
+
+
+@mock_aws
+def test_read_s3_range(mock_s3_client):
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    content = bytes(range(256))
+    mock_s3_client.put_object(Bucket='mybucket', Body=content, Key="data.bin")
+
+    assert read_s3_range('mybucket/data.bin', 10, 20) == content[10:20]
+    assert read_s3_range('mybucket/data.bin', 250) == content[250:]
+    assert read_s3_range('mybucket/data.bin', 20, 20) == b""
+
+
+@mock_aws
+@pytest.mark.parametrize(
+    "key, compress, extra_args",
+    [
+        ("data.csv", lambda b: b, {}),
+        ("data.csv.gz", gzip.compress, {}),
+        ("data.csv", gzip.compress, {"ContentEncoding": "gzip"}),
+        ("data.csv.bz2", bz2.compress, {}),
+    ],
+    ids=["plain", "gz-extension", "gzip-content-encoding", "bz2-extension"],
+)
+def test_iter_s3_lines(mock_s3_client, key, compress, extra_args):
+    """
+    Lines are streamed in small chunks, decompressed if asked, with line endings
+    and multi-byte characters split across chunks handled.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    lines = [f"{i},Café à la crème,{'x' * i}" for i in range(100)]
+    content = ("\r\n".join(lines[:50]) + "\n" + "\n".join(lines[50:])).encode("utf-8")
+    mock_s3_client.put_object(Bucket='mybucket', Body=compress(content), Key=key, **extra_args)
+
+    assert list(iter_s3_lines(f'mybucket/{key}', decompress=True, chunk_size=7)) == lines
+    chunks = list(iter_s3_chunks(f'mybucket/{key}', chunk_size=64, decompress=True))
+    assert max(len(chunk) for chunk in chunks) <= 64
+    assert b"".join(chunks) == content
+
+
+
+@mock_aws
+def test_iter_s3_json_items(mock_s3_client):
+    """
+    The items of an array within a (compressed) json object are yielded as it is
+    streamed in small chunks.
+    """
+    mock_s3_client.create_bucket(Bucket='mybucket', CreateBucketConfiguration={
+        'LocationConstraint': "eu-west-1"
+    })
+    observations = [{"time": str(2000 + i), "value": i * 1.5, "label": "Café"} for i in range(200)]
+    content = json.dumps({"id": "cpih", "observations": observations}).encode("utf-8")
+    mock_s3_client.put_object(Bucket='mybucket', Body=gzip.compress(content), Key='data.json.gz')
+
+    items = iter_s3_json_items('mybucket/data.json.gz', "/observations", decompress=True, chunk_size=64)
+
+    assert list(items) == observations
@@ -0,0 +1,166 @@
+import gzip
+import io
+import os
+import tarfile
+import zlib
+
+import pytest
+
+from dpytools.s3.basic import decompress_s3_tar
+from dpytools.s3.tar import (
+    build_s3_tar_index,
+    compress_directory_to_s3,
+    read_s3_tar_member,
+)
+
+LONG_NAME = "a/" + "very-long-directory-name/" * 6 + "metadata.json"
+
+
+@pytest.fixture
+def s3_tar(s3_client):
+    """
+    An uncompressed tar archive in a mocked bucket, holding a large file, a file with
+    a name too long for a plain tar header, an empty file and a directory
+    """
+    contents = {
+        "data/big.csv": b"0123456789\n" * 100000,
+        LONG_NAME: b'{"key": "value"}',
+        "empty.txt": b"",
+    }
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        directory = tarfile.TarInfo("data")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, content in contents.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    s3_client.put_object(Bucket="mybucket", Key="archive.tar", Body=buffer.getvalue())
+    return s3_client, contents
+
+
+def test_build_s3_tar_index(s3_tar, record_s3_requests):
+    """
+    The index records the offset and size of every file, reading only the headers.
+    """
+    s3_client, contents = s3_tar
+    requests = record_s3_requests("GetObject", "Range")
+
+    index = build_s3_tar_index("mybucket/archive.tar", buffer_size=4096)
+
+    assert set(index.members) == set(contents)
+    archive = s3_client.get_object(Bucket="mybucket", Key="archive.tar")["Body"].read()
+    for name, (offset, size) in index.members.items():
+        assert archive[offset : offset + size] == contents[name]
+    # The headers are read without reading through the 1.1MB file
+    assert len(requests) < 10
+
+
+def test_read_s3_tar_member_is_one_ranged_get(s3_tar, record_s3_requests):
+    """
+    With an index, a file is read with a single ranged GET.
+    """
+    _, contents = s3_tar
+    index = build_s3_tar_index("mybucket/archive.tar")
+    requests = record_s3_requests("GetObject", "Range")
+
+    assert read_s3_tar_member("mybucket/archive.tar", LONG_NAME, index=index) == contents[LONG_NAME]
+    assert read_s3_tar_member("mybucket/archive.tar", "empty.txt", index=index) == b""
+    assert len(requests) == 1
+    with pytest.raises(KeyError):
+        read_s3_tar_member("mybucket/archive.tar", "missing.txt", index=index)
+
+
+def test_s3_tar_index_is_cached_in_sidecar(s3_tar, record_s3_requests):
+    """
+    With cache=True the index is saved next to the archive, reused while the
+    archive is unchanged, and rebuilt once it changes.
+    """
+    s3_client, contents = s3_tar
+    index = build_s3_tar_index("mybucket/archive.tar", cache=True)
+    assert s3_client.head_object(Bucket="mybucket", Key="archive.tar.index.json")
+
+    requests = record_s3_requests("GetObject", "Range")
+    assert build_s3_tar_index("mybucket/archive.tar", cache=True) == index
+    # Only the sidecar is fetched
+    assert requests == [None]
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("new.txt")
+        info.size = 3
+        tar.addfile(info, io.BytesIO(b"new"))
+    s3_client.put_object(Bucket="mybucket", Key="archive.tar", Body=buffer.getvalue())
+
+    assert read_s3_tar_member("mybucket/archive.tar", "new.txt", cache=True) == b"new"
+
+
+def test_build_s3_tar_index_rejects_compressed_archives():
+    with pytest.raises(NotImplementedError):
+        build_s3_tar_index("mybucket/archive.tar.gz")
+
+
+@pytest.fixture
+def output_directory(tmp_path):
+    """
+    A directory of files to compress, including a nested and an empty directory
+    """
+    directory = tmp_path / "output"
+    (directory / "data" / "nested").mkdir(parents=True)
+    (directory / "empty").mkdir()
+    (directory / "metadata.json").write_text('{"id": "cpih"}')
+    (directory / "data" / "observations.csv").write_bytes(os.urandom(300000) * 3)
+    (directory / "data" / "nested" / "codes.csv").write_text("code,label\nK02,UK\n")
+    return directory
+
+
+@pytest.mark.parametrize("extension", [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz"])
+@pytest.mark.parametrize("compress_workers", [1, 3])
+def test_compress_directory_to_s3(
+    s3_client, tmp_path, output_directory, extension, compress_workers
+):
+    """
+    A directory is archived and compressed to s3, and extracted again unchanged.
+    """
+    compress_directory_to_s3(
+        output_directory,
+        f"mybucket/output{extension}",
+        compress_workers=compress_workers,
+        block_size=65536,
+    )
+    decompress_s3_tar(f"mybucket/output{extension}", tmp_path / "extracted", stream=True)
+
+    extracted = tmp_path / "extracted"
+    assert (extracted / "empty").is_dir()
+    for path in output_directory.rglob("*"):
+        if path.is_file():
+            copy = extracted / path.relative_to(output_directory)
+            assert copy.read_bytes() == path.read_bytes()
+
+
+def test_compress_directory_to_s3_parallel_gzip_members(s3_client, output_directory):
+    """
+    With several compress_workers, each block is its own gzip member, and the
+    members together are a valid gzip file.
+    """
+    compress_directory_to_s3(
+        output_directory, "mybucket/output.tar.gz", compress_workers=4, block_size=65536
+    )
+    content = s3_client.get_object(Bucket="mybucket", Key="output.tar.gz")["Body"].read()
+
+    with tarfile.open(fileobj=io.BytesIO(gzip.decompress(content))) as tar:
+        assert "data/observations.csv" in tar.getnames()
+
+    members = 0
+    while content:
+        decompressor = zlib.decompressobj(wbits=31)
+        decompressor.decompress(content)
+        content = decompressor.unused_data
+        members += 1
+    assert members > 10
+
+
+def test_compress_directory_to_s3_rejects_other_extensions(output_directory):
+    with pytest.raises(NotImplementedError):
+        compress_directory_to_s3(output_directory, "mybucket/output.zip")
@@ -0,0 +1,149 @@
+import csv
+import io
+import threading
+import time
+
+from botocore.exceptions import ClientError
+import pytest
+
+from dpytools.s3.basic import _get_s3_client
+from dpytools.s3.writer import open_s3_writer
+
+PART_SIZE = 5242880
+
+
+def _denied(operation_name: str) -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": "AccessDenied", "Message": "Access Denied"},
+            "ResponseMetadata": {"HTTPStatusCode": 403},
+        },
+        operation_name,
+    )
+
+
+def test_open_s3_writer_small_object(s3_client):
+    """
+    Content smaller than a part is sent with a single PUT when the writer is closed.
+    """
+    with open_s3_writer("mybucket/data.txt", content_type="text/plain") as f:
+        f.write(b"hello ")
+        f.write(bytearray(b"world"))
+        assert f.tell() == 11
+        # Nothing is visible until the writer is closed
+        assert "Contents" not in s3_client.list_objects_v2(Bucket="mybucket")
+
+    result = s3_client.get_object(Bucket="mybucket", Key="data.txt")
+    assert result["Body"].read() == b"hello world"
+    assert result["ContentType"] == "text/plain"
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket="mybucket")
+
+
+def test_open_s3_writer_empty_object(s3_client):
+    with open_s3_writer("mybucket/empty.txt"):
+        pass
+
+    assert s3_client.get_object(Bucket="mybucket", Key="empty.txt")["Body"].read() == b""
+
+
+def test_open_s3_writer_multipart(s3_client):
+    """
+    Content larger than a part is sent as a multipart upload, whatever the size of
+    the individual writes.
+    """
+    content = bytes(range(256)) * 45056
+    with open_s3_writer("mybucket/data.bin", part_size=PART_SIZE, max_workers=2) as f:
+        for i in range(0, len(content), 100000):
+            f.write(content[i : i + 100000])
+
+    result = s3_client.get_object(Bucket="mybucket", Key="data.bin")
+    assert result["Body"].read() == content
+    # Multipart ETags end with the number of parts
+    assert result["ETag"].strip('"').endswith("-3")
+
+
+def test_open_s3_writer_bounds_parts_in_flight(s3_client):
+    """
+    Once every worker is busy, writes wait, so only max_workers parts are being
+    uploaded (and held in memory) at once.
+    """
+    client = _get_s3_client(None)
+    upload_part = client.upload_part
+    lock = threading.Lock()
+    in_flight = []
+    most_in_flight = []
+
+    def slow_upload_part(**kwargs):
+        with lock:
+            in_flight.append(kwargs["PartNumber"])
+            most_in_flight.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    client.upload_part = slow_upload_part
+    with open_s3_writer("mybucket/data.bin", part_size=PART_SIZE, max_workers=2) as f:
+        for _ in range(6):
+            f.write(b"x" * PART_SIZE)
+
+    assert max(most_in_flight) == 2
+    result = s3_client.get_object(Bucket="mybucket", Key="data.bin")
+    assert result["ContentLength"] == 6 * PART_SIZE
+
+
+def test_open_s3_writer_text(s3_client):
+    """
+    Text (here a csv) can be written by wrapping the writer in a TextIOWrapper.
+    """
+    rows = [["time", "geography", "value"]] + [["2024", "K02000001", i] for i in range(10)]
+    with open_s3_writer("mybucket/data.csv") as f:
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+        csv.writer(text).writerows(rows)
+
+    content = s3_client.get_object(Bucket="mybucket", Key="data.csv")["Body"].read()
+    assert list(csv.reader(io.StringIO(content.decode()))) == [
+        [str(cell) for cell in row] for row in rows
+    ]
+
+
+def test_open_s3_writer_aborts_on_error(s3_client):
+    """
+    Leaving the with block because of an error aborts the upload, rather than
+    creating a partly written object.
+    """
+    with pytest.raises(RuntimeError):
+        with open_s3_writer("mybucket/data.bin", part_size=PART_SIZE) as f:
+            f.write(b"x" * (PART_SIZE + 1))
+            raise RuntimeError("The producer failed")
+
+    assert f.closed
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket="mybucket")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket="mybucket")
+
+
+def test_open_s3_writer_failed_part(s3_client):
+    """
+    A part that can't be uploaded aborts the upload, and its error is raised.
+    """
+    client = _get_s3_client(None)
+    upload_part = client.upload_part
+
+    def deny_second_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise _denied("UploadPart")
+        return upload_part(**kwargs)
+
+    client.upload_part = deny_second_part
+    with pytest.raises(ClientError):
+        with open_s3_writer("mybucket/data.bin", part_size=PART_SIZE) as f:
+            for _ in range(4):
+                f.write(b"x" * PART_SIZE)
+
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket="mybucket")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket="mybucket")
+
+
+def test_open_s3_writer_rejects_small_parts():
+    with pytest.raises(ValueError):
+        open_s3_writer("mybucket/data.bin", part_size=1024)
@@ -1,8 +1,10 @@
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from requests import HTTPError, Response
+from dpytools.http.async_base import AsyncHttpClient
 from dpytools.http.base import BaseHttpClient
-from dpytools.slack.slack import SlackMessenger
+from dpytools.slack.slack import AsyncSlackMessenger, SlackMessenger
 
 
 @patch.object(BaseHttpClient, "post")
@@ -35,3 +37,29 @@ def test_msg_str(mock_post):
     notifier.msg_str("Test message")
 
     mock_post.assert_called_once_with(webhook_url, json={"text": "Test message"})
+
+
+@patch.object(BaseHttpClient, "close")
+def test_context_manager_closes_http_client(mock_close):
+    """
+    Test that leaving the context manager closes the pooled http client
+    """
+    with SlackMessenger("http://example.com") as notifier:
+        assert isinstance(notifier.http_client, BaseHttpClient)
+    mock_close.assert_called_once()
+
+
+@patch.object(AsyncHttpClient, "post", new_callable=AsyncMock)
+def test_async_msg_str(mock_post):
+    """
+    Test that the async msg_str method sends a POST request with a string message
+    """
+    webhook_url = "http://example.com"
+
+    async def run():
+        async with AsyncSlackMessenger(webhook_url) as notifier:
+            await notifier.msg_str("Test message")
+
+    asyncio.run(run())
+
+    mock_post.assert_awaited_once_with(webhook_url, json={"text": "Test message"})
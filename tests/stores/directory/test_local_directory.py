@@ -267,4 +267,32 @@ def test_get_lone_file_matching_json_dict():
 
     assert local_file_json_dict["schema"] == "airflow.schemas.ingress.sdmx.v1.schema.json"
     assert local_file_json_dict["priority"] == 1
-    assert local_file_json_dict["pipeline"] == "default"
\ No newline at end of file
+    assert local_file_json_dict["pipeline"] == "default"
+
+
+def test_iter_lone_matching_json_items():
+    """
+    Ensures a LocalDirectoryStore can stream the items of an array (or the key, value
+    pairs of an object) within its lone matching json file.
+    """
+
+    test_path = Path("tests/test_cases/test_local_store/local_directory_folders/local_directory_lone_file")
+    test_local_directory_store = LocalDirectoryStore(test_path)
+
+    contacts = test_local_directory_store.iter_lone_matching_json_items(".json", "/contact")
+    assert list(contacts) == ["jobloggs@ons.gov.uk"]
+
+    items = dict(test_local_directory_store.iter_lone_matching_json_items(".json"))
+    assert items == test_local_directory_store.get_lone_matching_json_as_dict(".json")
+
+
+def test_iter_lone_matching_json_items_no_match():
+    """
+    Ensures iterating the items of a json file raises if no file matches the pattern.
+    """
+
+    test_path = Path("tests/test_cases/test_local_store/local_directory_folders/local_directory_lone_file")
+    test_local_directory_store = LocalDirectoryStore(test_path)
+
+    with pytest.raises(FileNotFoundError):
+        list(test_local_directory_store.iter_lone_matching_json_items(".csv"))